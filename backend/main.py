@@ -1,21 +1,33 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, Dict, List, Any
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ConfigDict
+from typing import Optional, Dict, List, Any, Tuple, Callable
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
-from datetime import datetime, timedelta
+import re
+import sys
+import orjson
+import urllib.parse
+from openai import AsyncOpenAI
+from datetime import datetime, date
 import pytz
 import logging
 import uuid
 import asyncio
+from contextlib import asynccontextmanager
+from types import MappingProxyType
+from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict
 
 # Import our services
 from services.amadeus_service import AmadeusService
 from services.intent_detector import IntentDetector
 from services.cache_manager import CacheManager
+from services.flight_formatter import format_flight_for_dashboard
+from services.iata_codes import get_iata_code
 
 
 # Configure logging
@@ -34,7 +46,8 @@ if not api_key:
     raise RuntimeError("OPENAI_API_KEY missing in environment variables")
 
 print(f"OpenAI API key loaded: {api_key[:10]}..." if api_key else "No API key found")
-client = OpenAI(api_key=api_key)
+# Async client: completions are awaited so a slow LLM call doesn't block the event loop
+client = AsyncOpenAI(api_key=api_key)
 
 # Initialize services
 try:
@@ -58,10 +71,31 @@ except Exception as e:
     print(f"Error initializing CacheManager: {e}")
     cache_manager = None
 
+# Shared pool for fanning out blocking Amadeus calls within a request (multi-airport flight
+# searches, airport resolution, hotel rating batches). Sized for Amadeus' per-second rate limit,
+# so concurrent requests share the cap instead of each spinning up its own threads.
+# Only leaf calls run here - nothing submitted to it waits on other work in it.
+AMADEUS_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="amadeus")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the OpenAI clients' HTTP connection pools on shutdown
+    await client.close()
+    if intent_detector:
+        await intent_detector.aclose()
+    AMADEUS_EXECUTOR.shutdown(wait=False)
+    # Closes the persistent geocode store's SQLite connection (in-flight lookups then see a no-op cache)
+    if amadeus_service:
+        amadeus_service.close()
+
+
 app = FastAPI(
     title="Smart Travel Assistant API",
     description="AI-powered travel planning API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration for production
@@ -70,23 +104,27 @@ origins = [
     "http://localhost:3001",
     "https://smart-travel-assistant-946f9.web.app",
     "https://smart-travel-assistant-946f9.firebaseapp.com",
-    # Allow Vercel frontend domains
-    "https://*.vercel.app",
-    # Allow any localhost for development
-    "http://localhost:*",
-    "https://localhost:*"
 ]
+# Vercel frontend deployments (preview URLs vary) and any local dev port - Starlette compiles this once
+CORS_ORIGIN_REGEX = r"https://[a-z0-9-]+\.vercel\.app|https?://(localhost|127\.0\.0\.1)(:\d+)?"
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins for development
+    allow_origins=origins,
+    allow_origin_regex=CORS_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
 
 
+# Request models are read-only once validated (frozen), unknown fields are dropped
+REQUEST_MODEL_CONFIG = ConfigDict(frozen=True, extra="ignore")
+
+
 class UserLocation(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+    
     city: Optional[str] = None
     region: Optional[str] = None
     country: Optional[str] = None
@@ -94,23 +132,32 @@ class UserLocation(BaseModel):
     lon: Optional[float] = None
 
 class Context(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+    
     now_iso: Optional[str] = None
     user_tz: Optional[str] = None
     user_locale: Optional[str] = None
     user_location: Optional[UserLocation] = None
 
 class ChatRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+    
     messages: list  # list of {role, content}
-    context: Context = None
-    session_id: str = None
+    context: Optional[Context] = None
+    session_id: Optional[str] = None
     preferences: Optional[Dict[str, float]] = None  # User preferences from onboarding: {budget, quality, convenience}
+    stream: bool = False  # Stream GPT replies as Server-Sent Events (see _stream_chat_events)
 
 class TripPreferences(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+    
     budget: float
     quality: float
     convenience: float
 
 class OptimalItineraryRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+    
     flights: List[Dict[str, Any]]
     hotels: List[Dict[str, Any]]
     activities: List[Dict[str, Any]]
@@ -137,13 +184,60 @@ def health():
 # Removed diagnostic and test endpoints - not needed for production
 
 
+# datetime.fromisoformat only accepts a trailing "Z" from Python 3.11 (the deployed runtime)
+_ISO_SUPPORTS_Z = sys.version_info >= (3, 11)
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso_datetime(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp, including the "Z" UTC suffix Amadeus/clients send (memoized: segment times repeat across tables)"""
+    if _ISO_SUPPORTS_Z:
+        return datetime.fromisoformat(value)
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+# Amadeus itinerary durations, e.g. "PT3H30M" / "PT45M" / "PT2H"
+_ISO_DURATION_RE = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?')
+
+
+def _iso_duration_hours(value) -> Optional[float]:
+    """Hours in an ISO 8601 "PT#H#M" duration, None if value isn't one"""
+    if not isinstance(value, str):
+        return None
+    match = _ISO_DURATION_RE.match(value)
+    if not match:
+        return None
+    hours, minutes = match.groups(default='0')
+    return int(hours) + int(minutes) / 60.0
+
+
+# Fixed-format date rendering for the parsed trip dates; avoids strftime's format
+# parsing and locale lookup per call (output matches the C-locale strftime format)
+_MONTH_ABBR = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def _format_display_date(dt) -> str:
+    """strftime("%b %d, %Y")"""
+    return f"{_MONTH_ABBR[dt.month - 1]} {dt.day:02d}, {dt.year}"
+
+
+# strftime layout of the local time shown in the system prompt (leading zero stripped after formatting)
+LOCAL_TIME_FORMAT = "%a, %d %b %Y - %I:%M %p"
+
+
+@lru_cache(maxsize=256)
+def _get_timezone(name: str):
+    """pytz.timezone, memoized (it re-validates and normalizes the name on every call; unknown names still raise)"""
+    return pytz.timezone(name)
+
+
 def format_local_time(now_iso, user_tz):
     """Format the current time in the user's timezone with UTC offset"""
     try:
         if not now_iso or not user_tz:
             return now_iso or ""
-        dt = datetime.fromisoformat(now_iso.replace('Z', '+00:00'))
-        user_tz_obj = pytz.timezone(user_tz)
+        dt = _parse_iso_datetime(now_iso)
+        user_tz_obj = _get_timezone(user_tz)
         local_dt = dt.astimezone(user_tz_obj)
         
         # Calculate UTC offset
@@ -155,9 +249,9 @@ def format_local_time(now_iso, user_tz):
             utc_offset_formatted = "UTC+00:00"
         
         # Use ASCII bullet and include UTC offset
-        return local_dt.strftime("%a, %d %b %Y - %I:%M %p").lstrip("0") + f" ({user_tz}, {utc_offset_formatted})"
+        return local_dt.strftime(LOCAL_TIME_FORMAT).lstrip("0") + f" ({user_tz}, {utc_offset_formatted})"
     except Exception as e:
-        logger.error(f"Error formatting local time: {e}")
+        logger.error("Error formatting local time: %s", e)
         return now_iso
 
 def get_location_string(user_location):
@@ -171,8 +265,47 @@ def get_location_string(user_location):
         parts.append(user_location.country)
     return ", ".join(parts) if parts else "Unknown location"
 
-def create_system_prompt(context, amadeus_data=None, origin=None, destination=None, departure_date=None, return_date=None):
-    """Create the Miles travel assistant system prompt with context and real-time data"""
+# Amadeus/validation error categories, checked on the lowercased message in priority order
+# (an error mentioning both "missing" and "api call failed" is a missing-info error)
+_ERROR_CATEGORY_RE = re.compile(r'missing|invalid|api call failed|could not find location coordinates|no flights available')
+_ERROR_CATEGORY_PRIORITY = ('missing', 'invalid', 'api call failed', 'could not find location coordinates', 'no flights available')
+
+
+# The system prompt has no dedicated wording for unknown locations
+_PROMPT_ERROR_CATEGORY_PRIORITY = ('missing', 'invalid', 'api call failed', 'no flights available')
+
+
+def _classify_error(error_msg_lc: str, priority: Tuple[str, ...] = _ERROR_CATEGORY_PRIORITY) -> Optional[str]:
+    """Return the highest-priority error category found in a lowercased error message"""
+    found = set(_ERROR_CATEGORY_RE.findall(error_msg_lc))
+    if not found:
+        return None
+    return next((category for category in priority if category in found), None)
+
+
+def _describe_prompt_error(error_msg: str) -> str:
+    """Turn an amadeus_data error into the ERROR DETAILS line of the system prompt"""
+    error_msg_lc = error_msg.lower()
+    category = _classify_error(error_msg_lc, _PROMPT_ERROR_CATEGORY_PRIORITY)
+    if category == 'missing':
+        if 'origin' in error_msg_lc or 'destination' in error_msg_lc:
+            return "MISSING INFORMATION: Please provide both origin and destination cities (e.g., 'flights from New York to Paris')."
+        if 'date' in error_msg_lc:
+            return "MISSING DATE: Please provide a departure date (e.g., 'November 3rd' or '11/03/2024')."
+        return f"MISSING INFORMATION: {error_msg}"
+    if category == 'invalid':
+        if 'date' in error_msg_lc:
+            return "INVALID DATE FORMAT: Please provide dates in a valid format (e.g., 'November 3rd, 2024', '11/03/2024', or 'Nov 3')."
+        return f"INVALID INPUT: {error_msg}"
+    if category == 'api call failed':
+        return "API ERROR: Unable to fetch flight data. Please check your connection and try again."
+    if category == 'no flights available':
+        return "NO FLIGHTS FOUND: No flights available for the specified route and dates. Please try different dates or destinations."
+    return f"ERROR: {error_msg}"
+
+
+def build_prompt_preamble(context):
+    """Build the static part of the Miles system prompt from the request context"""
     if not context:
         local_time = ""
         location = "Unknown location"
@@ -493,63 +626,105 @@ Input: "What's today's date?"
 Output:
 # Today
 - {local_time}"""
-    
+    return system_prompt
+
+
+# Header and separator rows shared by the outbound and return flight tables
+FLIGHT_TABLE_HEADER = (
+    "| Book Now | Airline | Flight Code | Origin | Destination | Price | Duration | Stops/Layover | Departure | Arrival |\n"
+    "|----------|---------|-------------|--------|-------------|-------|----------|----------------|-----------|----------|\n"
+)
+
+
+# Request dates arrive as YYYY-MM-DD; the prompt spells them out ("November 03, 2026")
+REQUEST_DATE_FORMAT = "%Y-%m-%d"
+PROMPT_DATE_FORMAT = "%B %d, %Y"
+
+
+@lru_cache(maxsize=256)
+def _spell_out_request_date(value: str) -> Optional[str]:
+    """strptime/strftime round trip behind _format_prompt_date, memoized per date string"""
+    try:
+        return datetime.strptime(value, REQUEST_DATE_FORMAT).strftime(PROMPT_DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def _format_prompt_date(value) -> Optional[str]:
+    """Spell out a YYYY-MM-DD request date for the prompt, None if it doesn't parse"""
+    if not isinstance(value, str):
+        return None
+    return _spell_out_request_date(value)
+
+
+def _format_layover_info(segments) -> str:
+    """Stops/Layover suffix for the flight tables: " | AIRPORT (Xh Ym), ..." per connection, or "" if none"""
+    layovers = []
+    for segment, next_segment in zip(segments, segments[1:]):
+        arrival = segment.get('arrival', {})
+        arr_time = arrival.get('time', '')
+        dep_time = next_segment.get('departure', {}).get('time', '')
+        if arr_time and dep_time:
+            try:
+                # timedelta.seconds, so an out-of-order pair still wraps within the day as before
+                seconds = (_parse_iso_datetime(dep_time) - _parse_iso_datetime(arr_time)).seconds
+                layovers.append(f"{arrival.get('airport', '')} ({seconds // 3600}h {seconds % 3600 // 60}m)")
+            except Exception:
+                layovers.append(arrival.get('airport', ''))
+    return " | " + ", ".join(layovers) if layovers else ""
+
+
+def build_prompt_data_section(amadeus_data=None, origin=None, destination=None, departure_date=None, return_date=None):
+    """Build the real-time data (or error) section appended to the system prompt"""
+    parts = []
     # Add real-time data if available
     if amadeus_data and not amadeus_data.get('error'):
-        data_section = "\n\n🚨 CRITICAL: REAL-TIME TRAVEL DATA PROVIDED 🚨\n"
-        data_section += "YOU MUST USE THIS REAL-TIME DATA IN YOUR RESPONSE. DO NOT PROVIDE GENERIC ADVICE.\n"
-        data_section += "PRIORITIZE THIS DATA OVER ANY GENERAL KNOWLEDGE.\n"
-        data_section += "YOUR RESPONSE MUST INCLUDE THE ACTUAL FLIGHT DATA BELOW. DO NOT SAY 'Check out the dashboard' - THE DASHBOARD HAS BEEN REMOVED.\n"
-        data_section += "YOU MUST LIST THE ACTUAL FLIGHTS WITH PRICES, AIRLINES, AND TIMES IN YOUR RESPONSE.\n\n"
+        # Parsed once, used by the flight header and the round-trip instructions
+        dep_display = _format_prompt_date(departure_date) if departure_date else None
+        ret_display = _format_prompt_date(return_date) if return_date else None
+        parts.append("\n\n🚨 CRITICAL: REAL-TIME TRAVEL DATA PROVIDED 🚨\n")
+        parts.append("YOU MUST USE THIS REAL-TIME DATA IN YOUR RESPONSE. DO NOT PROVIDE GENERIC ADVICE.\n")
+        parts.append("PRIORITIZE THIS DATA OVER ANY GENERAL KNOWLEDGE.\n")
+        parts.append("YOUR RESPONSE MUST INCLUDE THE ACTUAL FLIGHT DATA BELOW. DO NOT SAY 'Check out the dashboard' - THE DASHBOARD HAS BEEN REMOVED.\n")
+        parts.append("YOU MUST LIST THE ACTUAL FLIGHTS WITH PRICES, AIRLINES, AND TIMES IN YOUR RESPONSE.\n\n")
         
         if 'flights' in amadeus_data or 'outboundFlights' in amadeus_data:
             # Handle round-trip flight data with best combination
             if 'bestCombination' in amadeus_data:
                 best = amadeus_data['bestCombination']
-                data_section += f"🎯 BEST ROUND-TRIP DEAL (MUST BE HIGHLIGHTED IN YOUR RESPONSE):\n"
-                data_section += f"Outbound: {best['outbound']['airline']} {best['outbound']['flightNumber']} - ${best['outbound']['price']} ({best['outbound']['departure']} - {best['outbound']['arrival']})\n"
-                data_section += f"Return: {best['return']['airline']} {best['return']['flightNumber']} - ${best['return']['price']} ({best['return']['departure']} - {best['return']['arrival']})\n"
-                data_section += f"Total Price: ${best['totalPrice']} ({best['savings']})\n\n"
-                data_section += f"CRITICAL: You MUST use EXACTLY these flights in your response!\n"
-                data_section += f"MANDATORY FORMAT: Start with '# Best Round-Trip Deal\\n\\n**Outbound:** {best['outbound']['airline']} {best['outbound']['flightNumber']} - ${best['outbound']['price']} ({best['outbound']['departure']} - {best['outbound']['arrival']})\\n**Return:** {best['return']['airline']} {best['return']['flightNumber']} - ${best['return']['price']} ({best['return']['departure']} - {best['return']['arrival']})\\n**Total:** ${best['totalPrice']} ({best['savings']})\\n\\n## Other Options\\nThen show other flight options below.'\n"
-                data_section += f"DO NOT calculate your own totals - use the EXACT total of ${best['totalPrice']}!\n\n"
+                parts.append(f"🎯 BEST ROUND-TRIP DEAL (MUST BE HIGHLIGHTED IN YOUR RESPONSE):\n")
+                parts.append(f"Outbound: {best['outbound']['airline']} {best['outbound']['flightNumber']} - ${best['outbound']['price']} ({best['outbound']['departure']} - {best['outbound']['arrival']})\n")
+                parts.append(f"Return: {best['return']['airline']} {best['return']['flightNumber']} - ${best['return']['price']} ({best['return']['departure']} - {best['return']['arrival']})\n")
+                parts.append(f"Total Price: ${best['totalPrice']} ({best['savings']})\n\n")
+                parts.append(f"CRITICAL: You MUST use EXACTLY these flights in your response!\n")
+                parts.append(f"MANDATORY FORMAT: Start with '# Best Round-Trip Deal\\n\\n**Outbound:** {best['outbound']['airline']} {best['outbound']['flightNumber']} - ${best['outbound']['price']} ({best['outbound']['departure']} - {best['outbound']['arrival']})\\n**Return:** {best['return']['airline']} {best['return']['flightNumber']} - ${best['return']['price']} ({best['return']['departure']} - {best['return']['arrival']})\\n**Total:** ${best['totalPrice']} ({best['savings']})\\n\\n## Other Options\\nThen show other flight options below.'\n")
+                parts.append(f"DO NOT calculate your own totals - use the EXACT total of ${best['totalPrice']}!\n\n")
             
             # Show individual flight options in table format
             if 'outboundFlights' in amadeus_data:
                 # Use provided origin/destination or fallback to defaults
                 origin_display = origin or "origin"
                 destination_display = destination or "destination"
-                data_section += f"# Flights from {origin_display} to {destination_display}\n"
+                parts.append(f"# Flights from {origin_display} to {destination_display}\n")
                 
                 # Add requested dates if available
                 if departure_date:
-                    try:
-                        dep_date = datetime.strptime(departure_date, "%Y-%m-%d")
-                        dep_display = dep_date.strftime("%B %d, %Y")
-                        data_section += f"**Requested Departure Date: {dep_display}**\n"
-                    except:
-                        data_section += f"**Requested Departure Date: {departure_date}**\n"
+                    parts.append(f"**Requested Departure Date: {dep_display or departure_date}**\n")
                 if return_date:
-                    try:
-                        ret_date = datetime.strptime(return_date, "%Y-%m-%d")
-                        ret_display = ret_date.strftime("%B %d, %Y")
-                        data_section += f"**Requested Return Date: {ret_display}**\n"
-                    except:
-                        data_section += f"**Requested Return Date: {return_date}**\n"
+                    parts.append(f"**Requested Return Date: {ret_display or return_date}**\n")
                 
                 # Check if multiple airports were searched
                 if amadeus_data.get('_multi_airport_search'):
                     origin_airports = amadeus_data.get('_origin_airports', [])
                     dest_airports = amadeus_data.get('_destination_airports', [])
                     if origin_airports and len(origin_airports) > 1:
-                        data_section += f"\n**Note: Flights from multiple airports are included: {', '.join(origin_airports)}**\n"
+                        parts.append(f"\n**Note: Flights from multiple airports are included: {', '.join(origin_airports)}**\n")
                     if dest_airports and len(dest_airports) > 1:
-                        data_section += f"**Note: Flights to multiple airports are included: {', '.join(dest_airports)}**\n"
+                        parts.append(f"**Note: Flights to multiple airports are included: {', '.join(dest_airports)}**\n")
                 
-                data_section += "\n"
-                data_section += f"## Outbound Flights\n"
-                data_section += f"| Book Now | Airline | Flight Code | Origin | Destination | Price | Duration | Stops/Layover | Departure | Arrival |\n"
-                data_section += f"|----------|---------|-------------|--------|-------------|-------|----------|----------------|-----------|----------|\n"
+                parts.append("\n")
+                parts.append(f"## Outbound Flights\n")
+                parts.append(FLIGHT_TABLE_HEADER)
                 
                 # Filter out placeholder rows with '---' values before rendering
                 def is_placeholder_value(value):
@@ -600,25 +775,7 @@ Output:
                     # Add layover information if available
                     layover_info = ""
                     if stops > 0 and 'segments' in flight:
-                        segments = flight.get('segments', [])
-                        if len(segments) > 1:
-                            layovers = []
-                            for i in range(len(segments) - 1):
-                                arr_time = segments[i].get('arrival', {}).get('time', '')
-                                dep_time = segments[i+1].get('departure', {}).get('time', '')
-                                layover_airport = segments[i].get('arrival', {}).get('airport', '')
-                                if arr_time and dep_time:
-                                    try:
-                                        arr_dt = datetime.fromisoformat(arr_time.replace('Z', '+00:00'))
-                                        dep_dt = datetime.fromisoformat(dep_time.replace('Z', '+00:00'))
-                                        layover_duration = dep_dt - arr_dt
-                                        hours = layover_duration.seconds // 3600
-                                        minutes = (layover_duration.seconds % 3600) // 60
-                                        layovers.append(f"{layover_airport} ({hours}h {minutes}m)")
-                                    except:
-                                        layovers.append(layover_airport)
-                            if layovers:
-                                layover_info = " | " + ", ".join(layovers)
+                        layover_info = _format_layover_info(flight.get('segments', []))
                     
                     # Format departure time with date
                     departure_time = flight.get('departure', '')
@@ -628,12 +785,11 @@ Output:
                     price = flight.get('price', 0)
                     price_display = f"${price}"
                     
-                    data_section += f"| [Book Now]({booking_link}) | {flight.get('airline', 'Unknown')} | {flight_code} | {origin_airport} | {dest_airport} | {price_display} | {flight.get('duration', 'N/A')} | {stops_display}{layover_info} | {departure_time} | {arrival_time} |\n"
+                    parts.append(f"| [Book Now]({booking_link}) | {flight.get('airline', 'Unknown')} | {flight_code} | {origin_airport} | {dest_airport} | {price_display} | {flight.get('duration', 'N/A')} | {stops_display}{layover_info} | {departure_time} | {arrival_time} |\n")
                 
                 if 'returnFlights' in amadeus_data and amadeus_data['returnFlights']:
-                    data_section += f"\n## Return Flights\n"
-                    data_section += f"| Book Now | Airline | Flight Code | Origin | Destination | Price | Duration | Stops/Layover | Departure | Arrival |\n"
-                    data_section += f"|----------|---------|-------------|--------|-------------|-------|----------|----------------|-----------|----------|\n"
+                    parts.append(f"\n## Return Flights\n")
+                    parts.append(FLIGHT_TABLE_HEADER)
                     
                     # Filter out placeholder flights (reuse the helper functions defined above)
                     valid_return_flights = [f for f in amadeus_data.get('returnFlights', []) if not is_placeholder_flight(f)]
@@ -655,25 +811,7 @@ Output:
                         # Add layover information if available
                         layover_info = ""
                         if stops > 0 and 'segments' in flight:
-                            segments = flight.get('segments', [])
-                            if len(segments) > 1:
-                                layovers = []
-                                for i in range(len(segments) - 1):
-                                    arr_time = segments[i].get('arrival', {}).get('time', '')
-                                    dep_time = segments[i+1].get('departure', {}).get('time', '')
-                                    layover_airport = segments[i].get('arrival', {}).get('airport', '')
-                                    if arr_time and dep_time:
-                                        try:
-                                            arr_dt = datetime.fromisoformat(arr_time.replace('Z', '+00:00'))
-                                            dep_dt = datetime.fromisoformat(dep_time.replace('Z', '+00:00'))
-                                            layover_duration = dep_dt - arr_dt
-                                            hours = layover_duration.seconds // 3600
-                                            minutes = (layover_duration.seconds % 3600) // 60
-                                            layovers.append(f"{layover_airport} ({hours}h {minutes}m)")
-                                        except:
-                                            layovers.append(layover_airport)
-                                if layovers:
-                                    layover_info = " | " + ", ".join(layovers)
+                            layover_info = _format_layover_info(flight.get('segments', []))
                         
                         return_departure = flight.get('departure', '')
                         return_arrival = flight.get('arrival', '')
@@ -682,21 +820,21 @@ Output:
                         price = flight.get('price', 0)
                         price_display = f"${price}"
                         
-                        data_section += f"| [Book Now]({booking_link}) | {flight.get('airline', 'Unknown')} | {flight_code} | {return_origin_airport} | {return_dest_airport} | {price_display} | {flight.get('duration', 'N/A')} | {stops_display}{layover_info} | {return_departure} | {return_arrival} |\n"
+                        parts.append(f"| [Book Now]({booking_link}) | {flight.get('airline', 'Unknown')} | {flight_code} | {return_origin_airport} | {return_dest_airport} | {price_display} | {flight.get('duration', 'N/A')} | {stops_display}{layover_info} | {return_departure} | {return_arrival} |\n")
             else:
                 # Fallback for old format
-                data_section += f"FLIGHTS ({amadeus_data.get('count', 0)} found):\n"
+                parts.append(f"FLIGHTS ({amadeus_data.get('count', 0)} found):\n")
                 for i, flight in enumerate(amadeus_data['flights'][:3], 1):
                     price = flight.get('price', 'N/A')
                     currency = flight.get('currency', 'USD')
-                    data_section += f"{i}. Price: {price} {currency}\n"
+                    parts.append(f"{i}. Price: {price} {currency}\n")
                 
         elif 'hotels' in amadeus_data:
-            data_section += f"HOTELS ({amadeus_data.get('count', 0)} found):\n"
-            data_section += "\n🚨 CRITICAL: When displaying hotel prices, you MUST use the format 'From $X/night - Compare prices on booking sites'\n"
-            data_section += "Example: 'From $280/night - Compare prices on booking sites'\n"
-            data_section += "If price_range exists: 'From $215/night (range: $215 - $257) - Compare prices on booking sites'\n"
-            data_section += "NEVER use '$280/night' or '$280 / night' without the 'From' prefix!\n\n"
+            parts.append(f"HOTELS ({amadeus_data.get('count', 0)} found):\n")
+            parts.append("\n🚨 CRITICAL: When displaying hotel prices, you MUST use the format 'From $X/night - Compare prices on booking sites'\n")
+            parts.append("Example: 'From $280/night - Compare prices on booking sites'\n")
+            parts.append("If price_range exists: 'From $215/night (range: $215 - $257) - Compare prices on booking sites'\n")
+            parts.append("NEVER use '$280/night' or '$280 / night' without the 'From' prefix!\n\n")
             for i, hotel in enumerate(amadeus_data['hotels'][:3], 1):
                 name = hotel.get('name', 'N/A')
                 # Use price_per_night if available, otherwise use total price
@@ -708,7 +846,6 @@ Output:
                 rating = hotel.get('rating', 'N/A')
                 
                 # Generate booking links for hotels
-                import urllib.parse
                 hotel_name_encoded = urllib.parse.quote_plus(name) if name != 'N/A' else ''
                 location_encoded = urllib.parse.quote_plus(location) if location else ''
                 
@@ -758,26 +895,26 @@ Output:
                         price_display += f" (for {nights} nights)"
                     price_display += " - Compare prices on booking sites"
                 
-                data_section += f"{i}. {name}\n"
-                data_section += f"   Price: {price_display}\n"
+                parts.append(f"{i}. {name}\n")
+                parts.append(f"   Price: {price_display}\n")
                 if rating and rating != 'N/A':
-                    data_section += f"   Rating: {rating}\n"
-                data_section += f"   Location: {location}\n"
-                data_section += f"   Booking: [Booking.com]({booking_com_link}) | [Expedia]({expedia_link}) | [Hotels.com]({hotels_com_link})\n"
-                data_section += "\n"
-                data_section += "🚨 MANDATORY PRICE FORMATTING RULES:\n"
-                data_section += "1. IN TABLES (Top Recommendations): Use 'From $X/night' in Price/night column\n"
-                data_section += "   ✅ CORRECT: 'From $300/night'\n"
-                data_section += "   ❌ WRONG: '$300 / night' or '$300/night' (missing 'From')\n"
-                data_section += "2. IN TEXT: Use 'From $X/night - Compare prices on booking sites'\n"
-                data_section += "   ✅ CORRECT: 'From $280/night - Compare prices on booking sites'\n"
-                data_section += "   ❌ WRONG: '$280/night' or '$280 / night' (missing 'From')\n"
-                data_section += "3. If price_range exists: 'From $215/night (range: $215 - $257) - Compare prices on booking sites'\n"
-                data_section += "4. NEVER use '$X / night' or '$X/night' without the 'From' prefix - THIS IS WRONG!\n"
-                data_section += "\n"
+                    parts.append(f"   Rating: {rating}\n")
+                parts.append(f"   Location: {location}\n")
+                parts.append(f"   Booking: [Booking.com]({booking_com_link}) | [Expedia]({expedia_link}) | [Hotels.com]({hotels_com_link})\n")
+                parts.append("\n")
+                parts.append("🚨 MANDATORY PRICE FORMATTING RULES:\n")
+                parts.append("1. IN TABLES (Top Recommendations): Use 'From $X/night' in Price/night column\n")
+                parts.append("   ✅ CORRECT: 'From $300/night'\n")
+                parts.append("   ❌ WRONG: '$300 / night' or '$300/night' (missing 'From')\n")
+                parts.append("2. IN TEXT: Use 'From $X/night - Compare prices on booking sites'\n")
+                parts.append("   ✅ CORRECT: 'From $280/night - Compare prices on booking sites'\n")
+                parts.append("   ❌ WRONG: '$280/night' or '$280 / night' (missing 'From')\n")
+                parts.append("3. If price_range exists: 'From $215/night (range: $215 - $257) - Compare prices on booking sites'\n")
+                parts.append("4. NEVER use '$X / night' or '$X/night' without the 'From' prefix - THIS IS WRONG!\n")
+                parts.append("\n")
                 
         elif 'activities' in amadeus_data:
-            data_section += f"ACTIVITIES ({amadeus_data.get('count', 0)} found):\n"
+            parts.append(f"ACTIVITIES ({amadeus_data.get('count', 0)} found):\n")
             for i, activity in enumerate(amadeus_data['activities'][:5], 1):
                 name = activity.get('name', 'N/A')
                 short_desc = activity.get('shortDescription', '')
@@ -791,233 +928,318 @@ Output:
                 pictures = activity.get('pictures', [])
                 geo_code = activity.get('geoCode', {})
                 
-                data_section += f"{i}. {name}\n"
+                parts.append(f"{i}. {name}\n")
                 if short_desc:
-                    data_section += f"   Description: {short_desc}\n"
+                    parts.append(f"   Description: {short_desc}\n")
                 if description and description != short_desc:
-                    data_section += f"   Full Description: {description}\n"
+                    parts.append(f"   Full Description: {description}\n")
                 if price_amount and price_amount != 'N/A':
                     price_str = f"{price_amount} {currency}".strip()
-                    data_section += f"   Price: {price_str}\n"
+                    parts.append(f"   Price: {price_str}\n")
                 if rating and rating != 'N/A':
-                    data_section += f"   Rating: {rating}\n"
+                    parts.append(f"   Rating: {rating}\n")
                 if duration:
-                    data_section += f"   Duration: {duration}\n"
+                    parts.append(f"   Duration: {duration}\n")
                 if booking_link:
-                    data_section += f"   Booking: {booking_link}\n"
+                    parts.append(f"   Booking: {booking_link}\n")
                 if geo_code and isinstance(geo_code, dict):
                     lat = geo_code.get('latitude')
                     lon = geo_code.get('longitude')
                     if lat and lon:
-                        data_section += f"   Location: {lat}, {lon}\n"
+                        parts.append(f"   Location: {lat}, {lon}\n")
                 if pictures:
-                    data_section += f"   Images: {len(pictures)} picture(s) available\n"
-                data_section += "\n"
+                    parts.append(f"   Images: {len(pictures)} picture(s) available\n")
+                parts.append("\n")
             
-            data_section += "\n⚠️ IMPORTANT: You are a travel assistant helping users find things to do and activities in their destination.\n"
-            data_section += "1. Start by saying 'I found the following activities for you:' or similar friendly greeting\n"
-            data_section += "2. Present the activities in a clear, organized format (use markdown tables or lists)\n"
-            data_section += "3. Include activity name, description, price, rating, and duration when available\n"
-            data_section += "4. If booking links are available, mention them (e.g., 'Book now' with link)\n"
-            data_section += "5. Be enthusiastic and helpful - these are real activities users can book!\n"
-            data_section += "6. If there are pictures available, mention that photos are available\n"
-            data_section += "7. Make recommendations based on ratings and user preferences if mentioned\n"
-            data_section += "8. Use friendly, engaging language - this is about helping users discover amazing experiences!\n"
+            parts.append("\n⚠️ IMPORTANT: You are a travel assistant helping users find things to do and activities in their destination.\n")
+            parts.append("1. Start by saying 'I found the following activities for you:' or similar friendly greeting\n")
+            parts.append("2. Present the activities in a clear, organized format (use markdown tables or lists)\n")
+            parts.append("3. Include activity name, description, price, rating, and duration when available\n")
+            parts.append("4. If booking links are available, mention them (e.g., 'Book now' with link)\n")
+            parts.append("5. Be enthusiastic and helpful - these are real activities users can book!\n")
+            parts.append("6. If there are pictures available, mention that photos are available\n")
+            parts.append("7. Make recommendations based on ratings and user preferences if mentioned\n")
+            parts.append("8. Use friendly, engaging language - this is about helping users discover amazing experiences!\n")
                 
         elif 'destinations' in amadeus_data:
-            data_section += f"FLIGHT DESTINATIONS ({amadeus_data.get('count', 0)} found):\n"
+            parts.append(f"FLIGHT DESTINATIONS ({amadeus_data.get('count', 0)} found):\n")
             for i, dest in enumerate(amadeus_data['destinations'][:3], 1):
                 destination = dest.get('destination', 'N/A')
                 price = dest.get('price', 'N/A')
-                data_section += f"{i}. {destination} - {price}\n"
+                parts.append(f"{i}. {destination} - {price}\n")
         
-        data_section += f"\nData fetched at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        data_section += "\n🚨 MANDATORY RESPONSE FORMAT 🚨\n"
+        parts.append(f"\nData fetched at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        parts.append("\n🚨 MANDATORY RESPONSE FORMAT 🚨\n")
         
         # Check if this is a round-trip flight (has returnFlights)
         has_return_flights = 'returnFlights' in amadeus_data and amadeus_data.get('returnFlights')
         
         if has_return_flights:
-            data_section += "⚠️ IMPORTANT: This is a ROUND-TRIP flight search. You MUST display BOTH outbound AND return flights separately.\n"
-            if departure_date:
-                try:
-                    dep_date = datetime.strptime(departure_date, "%Y-%m-%d")
-                    dep_display = dep_date.strftime("%B %d, %Y")
-                    data_section += f"⚠️ CRITICAL: The user requested departure date is {dep_display}. You MUST show flights that depart on this date (or very close to it).\n"
-                except:
-                    pass
-            if return_date:
-                try:
-                    ret_date = datetime.strptime(return_date, "%Y-%m-%d")
-                    ret_display = ret_date.strftime("%B %d, %Y")
-                    data_section += f"⚠️ CRITICAL: The user requested return date is {ret_date.strftime('%B %d, %Y')}. You MUST show flights that depart on this date (or very close to it).\n"
-                except:
-                    pass
-            data_section += "1. Start by saying 'I found the following round-trip flight options for you:'\n"
-            data_section += "2. FIRST, display the OUTBOUND flights (from origin to destination) in a clear section titled '## Outbound Flights'\n"
-            data_section += "3. THEN, display the RETURN flights (from destination back to origin) in a separate section titled '## Return Flights'\n"
-            data_section += "4. Include airline names, flight numbers, prices, departure/arrival times, and duration for EACH flight\n"
-            data_section += "5. Use markdown tables to display the flights clearly\n"
-            data_section += "6. CRITICAL: Display the ACTUAL dates from the flight data in the table. The departure and arrival dates shown in the flight data MUST match the dates the user requested.\n"
-            data_section += "7. DO NOT mention 'dashboard' or 'check out the dashboard' - the dashboard has been removed\n"
-            data_section += "8. Make sure to show both outbound and return flights - this is a round-trip, so both directions are required!\n"
+            parts.append("⚠️ IMPORTANT: This is a ROUND-TRIP flight search. You MUST display BOTH outbound AND return flights separately.\n")
+            if dep_display:
+                parts.append(f"⚠️ CRITICAL: The user requested departure date is {dep_display}. You MUST show flights that depart on this date (or very close to it).\n")
+            if ret_display:
+                parts.append(f"⚠️ CRITICAL: The user requested return date is {ret_display}. You MUST show flights that depart on this date (or very close to it).\n")
+            parts.append("1. Start by saying 'I found the following round-trip flight options for you:'\n")
+            parts.append("2. FIRST, display the OUTBOUND flights (from origin to destination) in a clear section titled '## Outbound Flights'\n")
+            parts.append("3. THEN, display the RETURN flights (from destination back to origin) in a separate section titled '## Return Flights'\n")
+            parts.append("4. Include airline names, flight numbers, prices, departure/arrival times, and duration for EACH flight\n")
+            parts.append("5. Use markdown tables to display the flights clearly\n")
+            parts.append("6. CRITICAL: Display the ACTUAL dates from the flight data in the table. The departure and arrival dates shown in the flight data MUST match the dates the user requested.\n")
+            parts.append("7. DO NOT mention 'dashboard' or 'check out the dashboard' - the dashboard has been removed\n")
+            parts.append("8. Make sure to show both outbound and return flights - this is a round-trip, so both directions are required!\n")
         else:
-            data_section += "1. Start by saying 'I found the following flight options for you:'\n"
-            data_section += "2. List the actual flights from the data above in a clear format\n"
-            data_section += "3. Include airline names, flight numbers, prices, departure/arrival times, and duration\n"
-            data_section += "4. DO NOT mention 'dashboard' or 'check out the dashboard' - the dashboard has been removed\n"
-            data_section += "5. Present the information in a clear, user-friendly format using markdown tables or lists\n"
-        
-        system_prompt += data_section
+            parts.append("1. Start by saying 'I found the following flight options for you:'\n")
+            parts.append("2. List the actual flights from the data above in a clear format\n")
+            parts.append("3. Include airline names, flight numbers, prices, departure/arrival times, and duration\n")
+            parts.append("4. DO NOT mention 'dashboard' or 'check out the dashboard' - the dashboard has been removed\n")
+            parts.append("5. Present the information in a clear, user-friendly format using markdown tables or lists\n")
     elif amadeus_data and amadeus_data.get('error'):
         # Handle API errors with specific, actionable error messages
         error_msg = amadeus_data.get('error', 'Unknown error')
         
         # Generate specific error message based on error type
-        if 'Missing' in error_msg or 'missing' in error_msg.lower():
-            if 'origin' in error_msg.lower() or 'destination' in error_msg.lower():
-                specific_error = "MISSING INFORMATION: Please provide both origin and destination cities (e.g., 'flights from New York to Paris')."
-            elif 'date' in error_msg.lower():
-                specific_error = "MISSING DATE: Please provide a departure date (e.g., 'November 3rd' or '11/03/2024')."
-            else:
-                specific_error = f"MISSING INFORMATION: {error_msg}"
-        elif 'Invalid' in error_msg or 'invalid' in error_msg.lower():
-            if 'date' in error_msg.lower():
-                specific_error = "INVALID DATE FORMAT: Please provide dates in a valid format (e.g., 'November 3rd, 2024', '11/03/2024', or 'Nov 3')."
-            else:
-                specific_error = f"INVALID INPUT: {error_msg}"
-        elif 'API call failed' in error_msg:
-            specific_error = "API ERROR: Unable to fetch flight data. Please check your connection and try again."
-        elif 'No flights available' in error_msg:
-            specific_error = "NO FLIGHTS FOUND: No flights available for the specified route and dates. Please try different dates or destinations."
-        else:
-            specific_error = f"ERROR: {error_msg}"
+        specific_error = _describe_prompt_error(error_msg)
         
-        system_prompt += f"\n\n⚠️ IMPORTANT: There was an error processing your flight search request.\n"
-        system_prompt += f"ERROR DETAILS: {specific_error}\n\n"
-        system_prompt += "YOUR RESPONSE MUST:\n"
-        system_prompt += "1. Clearly state what went wrong (e.g., 'I couldn't find flights because [specific reason]')\n"
-        system_prompt += "2. Tell the user exactly what information is missing or incorrect\n"
-        system_prompt += "3. Provide a helpful example of the correct format\n"
-        system_prompt += "4. Be friendly and helpful, not technical\n\n"
-        system_prompt += "Example: 'I couldn't find flights because the departure date wasn't provided. Please try again with a date, like: \"flights from New York to Paris on November 15th\"'\n"
-    
-    return system_prompt
+        parts.append(f"\n\n⚠️ IMPORTANT: There was an error processing your flight search request.\n")
+        parts.append(f"ERROR DETAILS: {specific_error}\n\n")
+        parts.append("YOUR RESPONSE MUST:\n")
+        parts.append("1. Clearly state what went wrong (e.g., 'I couldn't find flights because [specific reason]')\n")
+        parts.append("2. Tell the user exactly what information is missing or incorrect\n")
+        parts.append("3. Provide a helpful example of the correct format\n")
+        parts.append("4. Be friendly and helpful, not technical\n\n")
+        parts.append("Example: 'I couldn't find flights because the departure date wasn't provided. Please try again with a date, like: \"flights from New York to Paris on November 15th\"'\n")
+    
+    return "".join(parts)
+
+
+# Fallback booking search, also used for airlines without a known site
+DEFAULT_BOOKING_URL = "https://www.google.com/search?q=flight+booking"
+
+# Airline name -> booking site
+AIRLINE_BOOKING_URLS = MappingProxyType({
+    "Air France": "https://www.airfrance.com",
+    "Delta Airlines": "https://www.delta.com",
+    "American Airlines": "https://www.aa.com",
+    "United Airlines": "https://www.united.com",
+    "Lufthansa": "https://www.lufthansa.com",
+    "British Airways": "https://www.britishairways.com",
+    "KLM": "https://www.klm.com",
+    "Iberia": "https://www.iberia.com",
+    "Alitalia": "https://www.alitalia.com",
+    "Swiss": "https://www.swiss.com",
+    "Austrian": "https://www.austrian.com",
+    "SAS": "https://www.sas.se",
+    "TAP Air Portugal": "https://www.flytap.com",
+    "Virgin Atlantic": "https://www.virgin-atlantic.com",
+    "Emirates": "https://www.emirates.com",
+    "Qatar Airways": "https://www.qatarairways.com",
+    "Turkish Airlines": "https://www.turkishairlines.com",
+    "Aeroflot": "https://www.aeroflot.com",
+    "Air Canada": "https://www.aircanada.com",
+    "WestJet": "https://www.westjet.com",
+    "JetBlue": "https://www.jetblue.com",
+    "Southwest": "https://www.southwest.com",
+    "Alaska Airlines": "https://www.alaskaair.com",
+    "Hawaiian Airlines": "https://www.hawaiianairlines.com",
+    "Spirit Airlines": "https://www.spirit.com",
+    "Frontier Airlines": "https://www.flyfrontier.com",
+    "Allegiant Air": "https://www.allegiantair.com"
+})
+
 
 def _generate_booking_link(airline_name, flight_code):
     """Generate booking link for a flight based on airline and flight code"""
     if not airline_name or not flight_code:
-        return "https://www.google.com/search?q=flight+booking"
-    
-    # Map airline names to their booking URLs
-    airline_booking_urls = {
-        "Air France": "https://www.airfrance.com",
-        "Delta Airlines": "https://www.delta.com",
-        "American Airlines": "https://www.aa.com",
-        "United Airlines": "https://www.united.com",
-        "Lufthansa": "https://www.lufthansa.com",
-        "British Airways": "https://www.britishairways.com",
-        "KLM": "https://www.klm.com",
-        "Iberia": "https://www.iberia.com",
-        "Alitalia": "https://www.alitalia.com",
-        "Swiss": "https://www.swiss.com",
-        "Austrian": "https://www.austrian.com",
-        "SAS": "https://www.sas.se",
-        "TAP Air Portugal": "https://www.flytap.com",
-        "Virgin Atlantic": "https://www.virgin-atlantic.com",
-        "Emirates": "https://www.emirates.com",
-        "Qatar Airways": "https://www.qatarairways.com",
-        "Turkish Airlines": "https://www.turkishairlines.com",
-        "Aeroflot": "https://www.aeroflot.com",
-        "Air Canada": "https://www.aircanada.com",
-        "WestJet": "https://www.westjet.com",
-        "JetBlue": "https://www.jetblue.com",
-        "Southwest": "https://www.southwest.com",
-        "Alaska Airlines": "https://www.alaskaair.com",
-        "Hawaiian Airlines": "https://www.hawaiianairlines.com",
-        "Spirit Airlines": "https://www.spirit.com",
-        "Frontier Airlines": "https://www.flyfrontier.com",
-        "Allegiant Air": "https://www.allegiantair.com"
-    }
-    
-    # Get the base URL for the airline
-    base_url = airline_booking_urls.get(airline_name, "https://www.google.com/search?q=flight+booking")
+        return DEFAULT_BOOKING_URL
     
     # For most airlines, we'll use the base URL and let users search for the specific flight
     # Some airlines have specific flight search patterns, but for simplicity, we'll use the base URL
-    return base_url
+    return AIRLINE_BOOKING_URLS.get(airline_name, DEFAULT_BOOKING_URL)
 
-def clean_markdown_formatting(text):
-    """Remove excessive markdown formatting like __ and clean up ** patterns"""
-    import re
-    
+# (pattern, replacement) cleanups applied in order by clean_markdown_formatting
+_MARKDOWN_CLEANUP_RULES = tuple((re.compile(pattern), repl) for pattern, repl in (
     # Remove __ patterns (excessive underscores)
-    text = re.sub(r'__+', '', text)
-    
+    (r'__+', ''),
     # Clean up excessive ** patterns (remove triple or more asterisks)
-    text = re.sub(r'\*{3,}', '**', text)
-    
+    (r'\*{3,}', '**'),
     # Remove standalone ** patterns (where there's no content between)
-    text = re.sub(r'\*\*\s*\*\*', '', text)
-    
+    (r'\*\*\s*\*\*', ''),
     # Fix patterns like **__text__** to just **text**
-    text = re.sub(r'\*\*__([^*]+)__\*\*', r'**\1**', text)
-    
+    (r'\*\*__([^*]+)__\*\*', r'**\1**'),
     # Fix patterns where closing ** appears at wrong places (e.g., "**Name** Text**")
     # This handles cases like "**Gothic Quarter** Walking Tour**"
-    text = re.sub(r'\*\*([^*]+)\*\*([^*]+?)\*\*(\s|$|\.|,|;|:|\|)', r'**\1**\2\3', text)
-    
+    (r'\*\*([^*]+)\*\*([^*]+?)\*\*(\s|$|\.|,|;|:|\|)', r'**\1**\2\3'),
     # Remove orphaned ** at end of text, words, or after punctuation
-    text = re.sub(r'\*\*(\s|$|\.|,|;|:|\|)', r'\1', text)
-    
+    (r'\*\*(\s|$|\.|,|;|:|\|)', r'\1'),
     # Fix patterns where ** appears multiple times incorrectly (e.g., "**Name** **Text**")
     # Only if there's text between them that shouldn't be bold
-    text = re.sub(r'\*\*([^*\s]+)\*\*\s+\*\*([^*\s]+)\*\*', r'**\1** \2', text)
-    
+    (r'\*\*([^*\s]+)\*\*\s+\*\*([^*\s]+)\*\*', r'**\1** \2'),
+))
+
+
+def clean_markdown_formatting(text):
+    """Remove excessive markdown formatting like __ and clean up ** patterns"""
+    for pattern, repl in _MARKDOWN_CLEANUP_RULES:
+        text = pattern.sub(repl, text)
     return text
 
+# Place names bolded in GPT replies: specific landmarks first so they win over the generic
+# "<Name> Museum"-style patterns at the same position
+_PLACE_NAME_PATTERNS = (
+    # Barcelona attractions
+    r'Sagrada Familia', r'Park Güell', r'Gothic Quarter', r'Casa Batlló',
+    r'La Rambla', r'Montjuïc', r'Barceloneta Beach', r'Picasso Museum',
+    r'Born District', r'Casa Milà', r'Las Ramblas', r'Barri Gòtic',
+    r'El Born', r'Montserrat', r'Camp Nou', r'Parc de la Ciutadella',
+    r'Plaça de Catalunya', r'Plaça Reial', r'Passeig de Gràcia',
+    
+    # General patterns for museums, churches, parks, etc.
+    r'[A-Z][a-z]+ Museum', r'[A-Z][a-z]+ Cathedral', r'[A-Z][a-z]+ Church',
+    r'[A-Z][a-z]+ Park', r'[A-Z][a-z]+ Beach', r'[A-Z][a-z]+ District',
+    r'[A-Z][a-z]+ Quarter', r'[A-Z][a-z]+ Square', r'[A-Z][a-z]+ Palace',
+    
+    # Restaurant patterns
+    r'[A-Z][a-z]+ Restaurant', r'[A-Z][a-z]+ Bar', r'[A-Z][a-z]+ Café',
+    r'[A-Z][a-z]+ Tapas', r'[A-Z][a-z]+ Market'
+)
+_PLACE_NAME_RE = re.compile(r'\b(?:' + '|'.join(_PLACE_NAME_PATTERNS) + r')\b')
+
+
+def _bold_place_name(match: re.Match) -> str:
+    text = match.string
+    start, end = match.span()
+    # Leave names that are already bolded
+    if text[max(0, start - 2):start] == '**' and text[end:end + 2] == '**':
+        return match.group(0)
+    return f'**{match.group(0)}**'
+
+
 def format_place_names(text):
     """Format place names in text with bold formatting (single bold, no underscores)"""
-    import re
-    
     # First, clean any existing excessive markdown formatting
     text = clean_markdown_formatting(text)
     
-    # Common place names and patterns to format
-    place_patterns = [
-        # Barcelona attractions
-        r'\bSagrada Familia\b', r'\bPark Güell\b', r'\bGothic Quarter\b', r'\bCasa Batlló\b',
-        r'\bLa Rambla\b', r'\bMontjuïc\b', r'\bBarceloneta Beach\b', r'\bPicasso Museum\b',
-        r'\bBorn District\b', r'\bCasa Milà\b', r'\bLas Ramblas\b', r'\bBarri Gòtic\b',
-        r'\bEl Born\b', r'\bMontserrat\b', r'\bCamp Nou\b', r'\bParc de la Ciutadella\b',
-        r'\bPlaça de Catalunya\b', r'\bPlaça Reial\b', r'\bPasseig de Gràcia\b',
-        
-        # General patterns for museums, churches, parks, etc.
-        r'\b[A-Z][a-z]+ Museum\b', r'\b[A-Z][a-z]+ Cathedral\b', r'\b[A-Z][a-z]+ Church\b',
-        r'\b[A-Z][a-z]+ Park\b', r'\b[A-Z][a-z]+ Beach\b', r'\b[A-Z][a-z]+ District\b',
-        r'\b[A-Z][a-z]+ Quarter\b', r'\b[A-Z][a-z]+ Square\b', r'\b[A-Z][a-z]+ Palace\b',
-        
-        # Restaurant patterns
-        r'\b[A-Z][a-z]+ Restaurant\b', r'\b[A-Z][a-z]+ Bar\b', r'\b[A-Z][a-z]+ Café\b',
-        r'\b[A-Z][a-z]+ Tapas\b', r'\b[A-Z][a-z]+ Market\b'
-    ]
-    
-    for pattern in place_patterns:
-        # Find all matches and format them
-        matches = re.findall(pattern, text)
-        for match in matches:
-            # Only format if not already formatted with ** (avoid double formatting)
-            escaped_match = re.escape(match)
-            # Check if already formatted (with word boundaries to avoid partial matches)
-            if not re.search(r'\*\*' + escaped_match + r'\*\*', text):
-                # Replace the match with formatted version
-                text = text.replace(match, f'**{match}**')
+    # One pass over the reply for all place patterns
+    text = _PLACE_NAME_RE.sub(_bold_place_name, text)
     
     # Final cleanup to ensure no excessive formatting
     text = clean_markdown_formatting(text)
     
     return text
 
+@lru_cache(maxsize=2048)
+def _normalize_preference_weights(budget: float, quality: float, convenience: float) -> Tuple[float, float, float]:
+    """Scale budget/quality/convenience weights to sum to 1 (equal thirds when the total isn't positive or is NaN)"""
+    total_weight = budget + quality + convenience
+    if not total_weight > 0:
+        return 1 / 3, 1 / 3, 1 / 3
+    return budget / total_weight, quality / total_weight, convenience / total_weight
+
+
+def _flight_option_metrics(flight: Dict[str, Any]) -> Tuple[float, float, float]:
+    """(price, duration in hours, rating) of a flight option"""
+    # Extract price (handle different formats)
+    price = flight.get('price', 0)
+    if isinstance(price, dict):
+        price = price.get('total', price.get('amount', 0))
+    
+    # Extract duration (convert ISO duration to hours), else try the first itinerary
+    duration = _iso_duration_hours(flight.get('duration', 'PT0H'))
+    if duration is None:
+        itineraries = flight.get('itineraries', [])
+        if itineraries:
+            duration = _iso_duration_hours(itineraries[0].get('duration', 'PT0H'))
+    
+    # Extract rating (flights typically don't have ratings, use 4.0 default)
+    rating = flight.get('rating', 4.0)
+    return (
+        float(price) if price else 0,
+        8.0 if duration is None else duration,  # Default 8 hours
+        float(rating) if rating else 4.0
+    )
+
+
+def _hotel_option_metrics(hotel: Dict[str, Any]) -> Tuple[float, float, float]:
+    """(price per night, distance from city center in km, rating) of a hotel option"""
+    # Extract price - prefer price_per_night for comparison, fallback to total price
+    price = hotel.get('price_per_night')
+    if not price:
+        price = hotel.get('price', 0)
+    if isinstance(price, dict):
+        price = price.get('total', price.get('amount', 0))
+    
+    # Extract distance (default to 5km if not available)
+    distance = hotel.get('distance', hotel.get('distanceFromCenter', 5.0))
+    rating = hotel.get('rating', 3.0)
+    return (
+        float(price) if price else 0,
+        float(distance) if distance else 5.0,
+        float(rating) if rating else 3.0
+    )
+
+
+def _activity_option_metrics(activity: Dict[str, Any]) -> Tuple[float, float, float]:
+    """(price, duration in hours, rating) of an activity option"""
+    price_info = activity.get('price', {})
+    if isinstance(price_info, dict):
+        price = price_info.get('amount', price_info.get('total', 0))
+    else:
+        price = price_info if price_info else 0
+    
+    duration_str = activity.get('minimumDuration', activity.get('duration', 'PT2H'))
+    duration = _iso_duration_hours(duration_str)
+    if duration is None:
+        duration = float(duration_str) if isinstance(duration_str, (int, float)) else 2.0  # Default 2 hours
+    
+    rating = activity.get('rating', 4.0)
+    return (
+        float(price) if price else 0,
+        duration,
+        float(rating) if rating else 4.0
+    )
+
+
+def _score_itinerary_options(options: List[Dict[str, Any]], extract_metrics: Callable[[Dict[str, Any]], Tuple[float, float, float]],
+                             metric_key: str, weights: Tuple[float, float, float]) -> List[Dict[str, Any]]:
+    """
+    Score itinerary options on a 0-1 scale per category and weight them into _category_score
+    
+    Budget is 1 - price / max price, quality is rating / 5 and convenience is 1 - metric / max metric,
+    where extract_metrics(option) returns (price, metric, rating) and the metric is stored under metric_key.
+    The scores are written onto the option dicts in place (they are request-owned) and the same list is returned.
+    """
+    if not options:
+        return []
+    
+    budget_weight, quality_weight, convenience_weight = weights
+    prices, metrics, ratings = zip(*map(extract_metrics, options))
+    max_price = max(prices)
+    max_metric = max(metrics)
+    
+    # Score column by column, then weight each option's scores
+    budget_scores = [1 - (price / max_price) for price in prices] if max_price > 0 else [0.5] * len(prices)
+    quality_scores = [rating / 5.0 for rating in ratings]
+    convenience_scores = [1 - (metric / max_metric) for metric in metrics] if max_metric > 0 else [0.5] * len(metrics)
+    category_scores = [
+        budget_weight * budget_score + quality_weight * quality_score + convenience_weight * convenience_score
+        for budget_score, quality_score, convenience_score in zip(budget_scores, quality_scores, convenience_scores)
+    ]
+    
+    for option, price, metric, rating, budget_score, quality_score, convenience_score, category_score in zip(
+        options, prices, metrics, ratings, budget_scores, quality_scores, convenience_scores, category_scores
+    ):
+        option['_budget_score'] = budget_score
+        option['_quality_score'] = quality_score
+        option['_convenience_score'] = convenience_score
+        option['_category_score'] = category_score
+        option['_price'] = price
+        option['_rating'] = rating
+        option[metric_key] = metric
+    
+    return options
+
+
 def generateOptimalItinerary(flights: List[Dict[str, Any]], hotels: List[Dict[str, Any]], 
                               activities: List[Dict[str, Any]], preferences: Dict[str, float],
                               userBudget: float) -> Dict[str, Any]:
@@ -1040,242 +1262,17 @@ def generateOptimalItinerary(flights: List[Dict[str, Any]], hotels: List[Dict[st
     convenience_weight = preferences.get('convenience', 0.34)
     
     # Normalize weights to ensure they sum to 1
-    total_weight = budget_weight + quality_weight + convenience_weight
-    if total_weight > 0:
-        budget_weight /= total_weight
-        quality_weight /= total_weight
-        convenience_weight /= total_weight
-    else:
-        budget_weight = quality_weight = convenience_weight = 1/3
+    budget_weight, quality_weight, convenience_weight = _normalize_preference_weights(
+        budget_weight, quality_weight, convenience_weight
+    )
     
     logger.info(f"[OPTIMAL_ITINERARY] Weights: budget={budget_weight:.3f}, quality={quality_weight:.3f}, convenience={convenience_weight:.3f}")
     
     # Normalize metrics on 0-1 scale for each category
-    def normalize_flight_metrics(flight_list):
-        """Extract and normalize flight metrics"""
-        if not flight_list:
-            return []
-        
-        # Extract prices, durations, and ratings
-        prices = []
-        durations = []  # in hours
-        ratings = []
-        
-        for flight in flight_list:
-            # Extract price (handle different formats)
-            price = flight.get('price', 0)
-            if isinstance(price, dict):
-                price = price.get('total', price.get('amount', 0))
-            prices.append(float(price) if price else 0)
-            
-            # Extract duration (convert ISO duration to hours)
-            duration_str = flight.get('duration', 'PT0H')
-            if isinstance(duration_str, str) and duration_str.startswith('PT'):
-                duration_str = duration_str[2:]
-                hours = 0
-                minutes = 0
-                if 'H' in duration_str:
-                    hours = int(duration_str.split('H')[0])
-                    duration_str = duration_str.split('H')[1]
-                if 'M' in duration_str:
-                    minutes = int(duration_str.split('M')[0])
-                durations.append(hours + minutes / 60.0)
-            else:
-                # Try to extract from itineraries
-                itineraries = flight.get('itineraries', [])
-                if itineraries:
-                    dur_str = itineraries[0].get('duration', 'PT0H')
-                    if isinstance(dur_str, str) and dur_str.startswith('PT'):
-                        dur_str = dur_str[2:]
-                        h = int(dur_str.split('H')[0]) if 'H' in dur_str else 0
-                        m = int(dur_str.split('H')[1].split('M')[0]) if 'H' in dur_str and 'M' in dur_str.split('H')[1] else (int(dur_str.split('M')[0]) if 'M' in dur_str else 0)
-                        durations.append(h + m / 60.0)
-                    else:
-                        durations.append(8.0)  # Default
-                else:
-                    durations.append(8.0)  # Default
-            
-            # Extract rating (flights typically don't have ratings, use 4.0 default)
-            rating = flight.get('rating', 4.0)
-            if rating is None:
-                rating = 4.0
-            ratings.append(float(rating) if rating else 4.0)
-        
-        # Find max values for normalization
-        max_price = max(prices) if prices else 1
-        max_duration = max(durations) if durations else 1
-        max_rating = max(ratings) if ratings else 5
-        
-        # Normalize each flight
-        normalized_flights = []
-        for i, flight in enumerate(flight_list):
-            price = prices[i]
-            duration = durations[i]
-            rating = ratings[i]
-            
-            # Budget score: 1 - (price / maxPrice) - lower price is better
-            budget_score = 1 - (price / max_price) if max_price > 0 else 0.5
-            
-            # Quality score: rating / 5 - higher rating is better
-            quality_score = rating / 5.0
-            
-            # Convenience score: 1 - (duration / maxDuration) - shorter duration is better
-            convenience_score = 1 - (duration / max_duration) if max_duration > 0 else 0.5
-            
-            # Calculate category score
-            category_score = (
-                budget_weight * budget_score +
-                quality_weight * quality_score +
-                convenience_weight * convenience_score
-            )
-            
-            normalized_flights.append({
-                **flight,
-                '_budget_score': budget_score,
-                '_quality_score': quality_score,
-                '_convenience_score': convenience_score,
-                '_category_score': category_score,
-                '_price': price,
-                '_duration': duration,
-                '_rating': rating
-            })
-        
-        return normalized_flights
-    
-    def normalize_hotel_metrics(hotel_list):
-        """Extract and normalize hotel metrics"""
-        if not hotel_list:
-            return []
-        
-        prices = []
-        ratings = []
-        distances = []  # distance from city center (km)
-        
-        for hotel in hotel_list:
-            # Extract price - prefer price_per_night for comparison, fallback to total price
-            price = hotel.get('price_per_night')
-            if not price:
-                price = hotel.get('price', 0)
-            if isinstance(price, dict):
-                price = price.get('total', price.get('amount', 0))
-            prices.append(float(price) if price else 0)
-            
-            # Extract rating
-            rating = hotel.get('rating', 3.0)
-            if rating is None:
-                rating = 3.0
-            ratings.append(float(rating) if rating else 3.0)
-            
-            # Extract distance (default to 5km if not available)
-            distance = hotel.get('distance', hotel.get('distanceFromCenter', 5.0))
-            distances.append(float(distance) if distance else 5.0)
-        
-        max_price = max(prices) if prices else 1
-        max_rating = max(ratings) if ratings else 5
-        max_distance = max(distances) if distances else 1
-        
-        normalized_hotels = []
-        for i, hotel in enumerate(hotel_list):
-            price = prices[i]
-            rating = ratings[i]
-            distance = distances[i]
-            
-            budget_score = 1 - (price / max_price) if max_price > 0 else 0.5
-            quality_score = rating / 5.0
-            convenience_score = 1 - (distance / max_distance) if max_distance > 0 else 0.5
-            
-            category_score = (
-                budget_weight * budget_score +
-                quality_weight * quality_score +
-                convenience_weight * convenience_score
-            )
-            
-            normalized_hotels.append({
-                **hotel,
-                '_budget_score': budget_score,
-                '_quality_score': quality_score,
-                '_convenience_score': convenience_score,
-                '_category_score': category_score,
-                '_price': price,
-                '_rating': rating,
-                '_distance': distance
-            })
-        
-        return normalized_hotels
-    
-    def normalize_activity_metrics(activity_list):
-        """Extract and normalize activity metrics"""
-        if not activity_list:
-            return []
-        
-        prices = []
-        ratings = []
-        durations = []  # in hours
-        
-        for activity in activity_list:
-            # Extract price
-            price_info = activity.get('price', {})
-            if isinstance(price_info, dict):
-                price = price_info.get('amount', price_info.get('total', 0))
-            else:
-                price = price_info if price_info else 0
-            prices.append(float(price) if price else 0)
-            
-            # Extract rating
-            rating = activity.get('rating', 4.0)
-            if rating is None:
-                rating = 4.0
-            ratings.append(float(rating) if rating else 4.0)
-            
-            # Extract duration
-            duration_str = activity.get('minimumDuration', activity.get('duration', 'PT2H'))
-            if isinstance(duration_str, str) and duration_str.startswith('PT'):
-                duration_str = duration_str[2:]
-                hours = int(duration_str.split('H')[0]) if 'H' in duration_str else 0
-                minutes = int(duration_str.split('H')[1].split('M')[0]) if 'H' in duration_str and 'M' in duration_str.split('H')[1] else (int(duration_str.split('M')[0]) if 'M' in duration_str else 0)
-                durations.append(hours + minutes / 60.0)
-            elif isinstance(duration_str, (int, float)):
-                durations.append(float(duration_str))
-            else:
-                durations.append(2.0)  # Default 2 hours
-        
-        max_price = max(prices) if prices else 1
-        max_rating = max(ratings) if ratings else 5
-        max_duration = max(durations) if durations else 1
-        
-        normalized_activities = []
-        for i, activity in enumerate(activity_list):
-            price = prices[i]
-            rating = ratings[i]
-            duration = durations[i]
-            
-            budget_score = 1 - (price / max_price) if max_price > 0 else 0.5
-            quality_score = rating / 5.0
-            convenience_score = 1 - (duration / max_duration) if max_duration > 0 else 0.5
-            
-            category_score = (
-                budget_weight * budget_score +
-                quality_weight * quality_score +
-                convenience_weight * convenience_score
-            )
-            
-            normalized_activities.append({
-                **activity,
-                '_budget_score': budget_score,
-                '_quality_score': quality_score,
-                '_convenience_score': convenience_score,
-                '_category_score': category_score,
-                '_price': price,
-                '_rating': rating,
-                '_duration': duration
-            })
-        
-        return normalized_activities
-    
-    # Normalize all categories
-    normalized_flights = normalize_flight_metrics(flights)
-    normalized_hotels = normalize_hotel_metrics(hotels)
-    normalized_activities = normalize_activity_metrics(activities)
+    weights = (budget_weight, quality_weight, convenience_weight)
+    normalized_flights = _score_itinerary_options(flights, _flight_option_metrics, '_duration', weights)
+    normalized_hotels = _score_itinerary_options(hotels, _hotel_option_metrics, '_distance', weights)
+    normalized_activities = _score_itinerary_options(activities, _activity_option_metrics, '_duration', weights)
     
     logger.info(f"[OPTIMAL_ITINERARY] Normalized: {len(normalized_flights)} flights, {len(normalized_hotels)} hotels, {len(normalized_activities)} activities")
     
@@ -1322,36 +1319,46 @@ def generateOptimalItinerary(flights: List[Dict[str, Any]], hotels: List[Dict[st
     
     logger.info(f"[OPTIMAL_ITINERARY] Evaluating {total_combinations} combinations...")
     
-    for flight in normalized_flights:
-        for hotel in normalized_hotels:
-            for activity in normalized_activities:
-                # Calculate total price
-                total_price = flight['_price'] + hotel['_price'] + activity['_price']
-                
+    # Pull the per-option score and price out once so the combination loop only does float math.
+    # The budget filter is skipped whenever the hotel or activity is a dummy entry.
+    hotel_rows = [(hotel['_category_score'], hotel['_price'], hotel.get('id') == 'dummy-hotel') for hotel in normalized_hotels]
+    activity_rows = [(activity['_category_score'], activity['_price'], activity.get('id') == 'dummy-activity') for activity in normalized_activities]
+    best_indices = None
+    
+    for fi, flight in enumerate(normalized_flights):
+        flight_score = flight['_category_score']
+        flight_price = flight['_price']
+        for hi, (hotel_score, hotel_price, hotel_is_dummy) in enumerate(hotel_rows):
+            flight_hotel_score = flight_score + hotel_score
+            flight_hotel_price = flight_price + hotel_price
+            for ai, (activity_score, activity_price, activity_is_dummy) in enumerate(activity_rows):
                 # Filter out if exceeds budget (but allow if hotels/activities are dummy with 0 price)
-                if total_price > userBudget and hotel.get('id') != 'dummy-hotel' and activity.get('id') != 'dummy-activity':
+                if flight_hotel_price + activity_price > userBudget and not hotel_is_dummy and not activity_is_dummy:
                     continue
                 
                 # Calculate total combined score (average of three category scores)
-                total_score = (
-                    flight['_category_score'] +
-                    hotel['_category_score'] +
-                    activity['_category_score']
-                ) / 3.0
+                total_score = (flight_hotel_score + activity_score) / 3.0
                 
                 # Update best if this is better
                 if total_score > best_total_score:
                     best_total_score = total_score
-                    best_combination = {
-                        'flight': flight,
-                        'hotel': hotel,
-                        'activity': activity,
-                        'total_price': total_price,
-                        'total_score': total_score,
-                        'flight_score': flight['_category_score'],
-                        'hotel_score': hotel['_category_score'],
-                        'activity_score': activity['_category_score']
-                    }
+                    best_indices = (fi, hi, ai)
+    
+    if best_indices is not None:
+        fi, hi, ai = best_indices
+        flight = normalized_flights[fi]
+        hotel = normalized_hotels[hi]
+        activity = normalized_activities[ai]
+        best_combination = {
+            'flight': flight,
+            'hotel': hotel,
+            'activity': activity,
+            'total_price': flight['_price'] + hotel['_price'] + activity['_price'],
+            'total_score': best_total_score,
+            'flight_score': flight['_category_score'],
+            'hotel_score': hotel['_category_score'],
+            'activity_score': activity['_category_score']
+        }
     
     if not best_combination:
         return {
@@ -1456,13 +1463,9 @@ def apply_preference_weights_to_hotels(hotels: List[Dict[str, Any]], preferences
         budget_weight = float(preferences.get('budget', 0.33))
         quality_weight = float(preferences.get('quality', 0.33))
         convenience_weight = float(preferences.get('convenience', 0.34))
-        total_weight = budget_weight + quality_weight + convenience_weight
-        if total_weight <= 0:
-            budget_weight = quality_weight = convenience_weight = 1 / 3
-        else:
-            budget_weight /= total_weight
-            quality_weight /= total_weight
-            convenience_weight /= total_weight
+        budget_weight, quality_weight, convenience_weight = _normalize_preference_weights(
+            budget_weight, quality_weight, convenience_weight
+        )
         
         def _safe_float(value):
             try:
@@ -1573,6 +1576,14 @@ def apply_intent_overrides(message: str, intent_type: str) -> str:
     return intent_type
 
 
+def _trip_duration_days(start_date: str, end_date: str) -> int:
+    """
+    Days between two YYYY-MM-DD strings.
+    date.fromisoformat is a C fast path (no strptime format/locale parsing); raises ValueError/TypeError.
+    """
+    return (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days
+
+
 def apply_preference_filters_to_activities(
     activities: List[Dict[str, Any]], 
     preferences: Optional[Dict[str, float]] = None,
@@ -1653,13 +1664,6 @@ def apply_preference_filters_to_activities(
             
             return None
         
-        def _extract_duration_days(duration_str):
-            """Extract duration in days from duration string or number"""
-            hours = _extract_duration_hours(duration_str)
-            if hours is None:
-                return None
-            return hours / 24.0
-        
         # Normalize preferences and log incoming weights
         if preferences:
             raw_budget = float(preferences.get('budget', 0.33))
@@ -1671,12 +1675,10 @@ def apply_preference_filters_to_activities(
             logger.info(f"[ACTIVITY_SCORE] Raw weights: budget={raw_budget:.3f}, quality={raw_quality:.3f}, convenience={raw_convenience:.3f}, total={total_weight:.3f}")
             
             if total_weight <= 0:
-                budget_weight = quality_weight = convenience_weight = 1 / 3
                 logger.warning(f"[ACTIVITY_SCORE] Invalid preferences total weight ({total_weight}), using default 1/3 each")
-            else:
-                budget_weight = raw_budget / total_weight
-                quality_weight = raw_quality / total_weight
-                convenience_weight = raw_convenience / total_weight
+            budget_weight, quality_weight, convenience_weight = _normalize_preference_weights(
+                raw_budget, raw_quality, raw_convenience
+            )
             
             logger.info(f"[ACTIVITY_SCORE] Normalized weights: budget={budget_weight:.3f} ({budget_weight*100:.1f}%), quality={quality_weight:.3f} ({quality_weight*100:.1f}%), convenience={convenience_weight:.3f} ({convenience_weight*100:.1f}%)")
             
@@ -1691,30 +1693,13 @@ def apply_preference_filters_to_activities(
             budget_weight = quality_weight = convenience_weight = 1 / 3
             logger.warning(f"[ACTIVITY_SCORE] ⚠️ No preferences provided (context={context_label}), using default equal weights (1/3 each)")
         
-        # A. Trip-length filter
-        if trip_duration_days is not None:
-            for activity in activities:
-                duration_str = activity.get('minimumDuration') or activity.get('duration')
-                activity_duration_days = _extract_duration_days(duration_str)
-                
-                if activity_duration_days is not None and activity_duration_days > trip_duration_days:
-                    activity['long_tour'] = True
-                    logger.debug(f"[ACTIVITY_SCORE] Marked '{activity.get('name')}' as long_tour: {activity_duration_days:.1f} days > {trip_duration_days} days")
-                else:
-                    activity['long_tour'] = False
-        else:
-            # If no trip duration, mark all as not long_tour
-            for activity in activities:
-                activity['long_tour'] = False
-        
-        # Collect all metrics for normalization
+        # Extract price/rating/duration once per activity; every pass below reuses them
+        metrics = []  # (price, rating, duration_hours) per activity, None when missing
         prices = []
         ratings = []
         durations = []  # in hours
-        distances = []  # in km (if available)
         
         for activity in activities:
-            # Extract price
             price_info = activity.get('price', {})
             if isinstance(price_info, dict):
                 price = _safe_float(price_info.get('amount') or price_info.get('total'))
@@ -1723,24 +1708,31 @@ def apply_preference_filters_to_activities(
             if price is not None and price >= 0:
                 prices.append(price)
             
-            # Extract rating
             rating = _safe_float(activity.get('rating'))
             if rating is not None and rating >= 0:
                 ratings.append(rating)
             
-            # Extract duration
             duration_str = activity.get('minimumDuration') or activity.get('duration')
             duration_hours = _extract_duration_hours(duration_str)
             if duration_hours is not None and duration_hours >= 0:
                 durations.append(duration_hours)
             
-            # Extract distance (if available, from geoCode or distance field)
-            distance = None
-            geo_code = activity.get('geoCode')
-            if geo_code and isinstance(geo_code, dict):
-                # Distance might be in a separate field, or we might need to calculate
-                # For now, we'll use a placeholder - in production, you'd calculate distance from city center
-                pass
+            metrics.append((price, rating, duration_hours))
+        
+        # A. Trip-length filter
+        if trip_duration_days is not None:
+            for activity, (_, _, duration_hours) in zip(activities, metrics):
+                activity_duration_days = duration_hours / 24.0 if duration_hours is not None else None
+                
+                if activity_duration_days is not None and activity_duration_days > trip_duration_days:
+                    activity['long_tour'] = True
+                    logger.debug(f"[ACTIVITY_SCORE] Marked '{activity.get('name')}' as long_tour: {activity_duration_days:.1f} days > {trip_duration_days} days")
+                else:
+                    activity['long_tour'] = False
+        else:
+            # If no trip duration, mark all as not long_tour
+            for activity in activities:
+                activity['long_tour'] = False
         
         # Calculate min/max for normalization
         min_price = min(prices) if prices else None
@@ -1757,6 +1749,19 @@ def apply_preference_filters_to_activities(
         min_duration = min(durations) if durations else None
         max_duration = max(durations) if durations else None
         
+        # Percentiles used by the high-preference penalties/boosts (sorted once, not per activity)
+        p50_price = p75_price = None
+        if prices:
+            sorted_prices = sorted(prices)
+            p75_price = sorted_prices[int(len(sorted_prices) * 0.75)] if len(sorted_prices) > 3 else sorted_prices[-1]
+            p50_price = sorted_prices[len(sorted_prices) // 2] if len(sorted_prices) > 1 else sorted_prices[0]
+        p25_duration = p50_duration = p75_duration = None
+        if durations:
+            sorted_durations = sorted(durations)
+            p25_duration = sorted_durations[int(len(sorted_durations) * 0.25)] if len(sorted_durations) > 3 else sorted_durations[0]
+            p50_duration = sorted_durations[len(sorted_durations) // 2] if len(sorted_durations) > 1 else sorted_durations[0]
+            p75_duration = sorted_durations[int(len(sorted_durations) * 0.75)] if len(sorted_durations) > 3 else sorted_durations[-1]
+        
         # MODIFY: Normalize to 0-1 range (then multiply by weights)
         def inverse_normalize(value, min_val, max_val):
             """Normalize to 0-1, where higher original value = lower score (inverse)"""
@@ -1788,13 +1793,7 @@ def apply_preference_filters_to_activities(
                     mean_price = sum(prices) / len(prices)
                     threshold = mean_price * 1.6
                     
-                    for activity in activities:
-                        price_info = activity.get('price', {})
-                        if isinstance(price_info, dict):
-                            price = _safe_float(price_info.get('amount') or price_info.get('total'))
-                        else:
-                            price = _safe_float(price_info)
-                        
+                    for activity, (price, _, _) in zip(activities, metrics):
                         if price is not None and price > threshold:
                             activity['too_expensive_for_budget'] = True
                             logger.debug(f"[ACTIVITY_SCORE] Marked '{activity.get('name')}' as too_expensive: ${price:.2f} > ${threshold:.2f}")
@@ -1814,9 +1813,7 @@ def apply_preference_filters_to_activities(
             if quality_pref >= 0.6:
                 low_quality_threshold = 3.5
                 
-                for activity in activities:
-                    rating = _safe_float(activity.get('rating'))
-                    
+                for activity, (_, rating, _) in zip(activities, metrics):
                     if rating is not None and rating < low_quality_threshold:
                         activity['low_quality_for_preference'] = True
                         logger.debug(f"[ACTIVITY_SCORE] Marked '{activity.get('name')}' as low_quality: {rating:.1f} < {low_quality_threshold}")
@@ -1827,20 +1824,10 @@ def apply_preference_filters_to_activities(
                     activity['low_quality_for_preference'] = False
         
         # D. Calculate scores for each activity
-        for activity in activities:
-            # Extract values
-            price_info = activity.get('price', {})
-            if isinstance(price_info, dict):
-                price = _safe_float(price_info.get('amount') or price_info.get('total'))
-            else:
-                price = _safe_float(price_info)
-            
-            rating = _safe_float(activity.get('rating'))
+        for activity, (price, rating, duration_hours) in zip(activities, metrics):
             if rating is None:
                 rating = 3.5  # Default rating
             
-            duration_str = activity.get('minimumDuration') or activity.get('duration')
-            duration_hours = _extract_duration_hours(duration_str)
             if duration_hours is None:
                 duration_hours = 2.0  # Default 2 hours
             
@@ -1884,9 +1871,7 @@ def apply_preference_filters_to_activities(
                         if DEBUG_MODE:
                             logger.debug(f"[ACTIVITY_SCORE] 🔴 EXTREME BUDGET MODE: {activity.get('name')[:40]}: price=${price:.2f}, base={base_budget_norm:.3f} → {budget_norm:.3f} (boost_factor={boost_factor:.2f})")
                     # Penalty: exponentially penalize expensive activities
-                    if price is not None and prices and len(prices) > 0:
-                        sorted_prices = sorted(prices)
-                        p75_price = sorted_prices[int(len(sorted_prices) * 0.75)] if len(sorted_prices) > 3 else sorted_prices[-1]
+                    if price is not None and prices:
                         if price > p75_price and max_price > p75_price:
                             # Exponential penalty: (price/max)^2 penalty up to 90%
                             price_ratio = (price - p75_price) / (max_price - p75_price + 0.01)
@@ -1901,9 +1886,7 @@ def apply_preference_filters_to_activities(
                         if DEBUG_MODE:
                             logger.debug(f"[ACTIVITY_SCORE] ⚠️ STRONG BUDGET MODE: {activity.get('name')[:40]}: base={base_budget_norm:.3f} → {budget_norm:.3f}")
                     # Penalty for expensive activities
-                    if price is not None and prices and len(prices) > 0:
-                        sorted_prices = sorted(prices)
-                        p50_price = sorted_prices[len(sorted_prices) // 2] if len(sorted_prices) > 1 else sorted_prices[0]
+                    if price is not None and prices:
                         if price > p50_price and max_price > p50_price:
                             price_ratio = (price - p50_price) / (max_price - p50_price + 0.01)
                             penalty = min(0.7, 0.5 * (price_ratio ** 1.2))
@@ -1938,9 +1921,7 @@ def apply_preference_filters_to_activities(
                 # Convenience-heavy: Exponential boost for short duration activities
                 if convenience_weight >= 0.7:
                     # EXTREME: Exponential transformation for convenience_weight >= 0.7
-                    if duration_hours is not None and durations and len(durations) > 0:
-                        sorted_durations = sorted(durations)
-                        p25_duration = sorted_durations[int(len(sorted_durations) * 0.25)] if len(sorted_durations) > 3 else sorted_durations[0]
+                    if duration_hours is not None and durations:
                         if duration_hours <= p25_duration:
                             # Exponential boost: shorter activities get much higher scores
                             boost_factor = 1.0 + 0.6 * ((convenience_weight - 0.7) / 0.3)
@@ -1951,7 +1932,6 @@ def apply_preference_filters_to_activities(
                                 logger.debug(f"[ACTIVITY_SCORE] 🚀 EXTREME CONVENIENCE BOOST: {activity.get('name')[:40]}: duration={duration_hours:.1f}h <= p25={p25_duration:.1f}h, boost={boost:.3f}, convenience_norm: {base_convenience_norm:.3f} → {convenience_norm:.3f}")
                         else:
                             # Exponential penalty for long activities
-                            p75_duration = sorted_durations[int(len(sorted_durations) * 0.75)] if len(sorted_durations) > 3 else sorted_durations[-1]
                             if duration_hours > p75_duration and max_duration > p75_duration:
                                 duration_ratio = (duration_hours - p75_duration) / (max_duration - p75_duration + 0.1)
                                 penalty = min(0.7, 0.5 * (duration_ratio ** 1.5))
@@ -1960,14 +1940,11 @@ def apply_preference_filters_to_activities(
                                     logger.debug(f"[ACTIVITY_SCORE] 🚀 EXTREME CONVENIENCE PENALTY: {activity.get('name')[:40]}: duration={duration_hours:.1f}h > p75={p75_duration:.1f}h, penalty={penalty:.3f}")
                 elif convenience_weight >= 0.6:
                     # STRONG: Boost for short activities
-                    if duration_hours is not None and durations and len(durations) > 0:
-                        sorted_durations = sorted(durations)
-                        p50_duration = sorted_durations[len(sorted_durations) // 2] if len(sorted_durations) > 1 else sorted_durations[0]
+                    if duration_hours is not None and durations:
                         if duration_hours <= p50_duration:
                             boost = min(0.3, 0.25 * ((p50_duration - duration_hours) / (p50_duration + 0.1)))
                             convenience_norm = min(1.0, base_convenience_norm + boost)
                         else:
-                            p75_duration = sorted_durations[int(len(sorted_durations) * 0.75)] if len(sorted_durations) > 3 else sorted_durations[-1]
                             if duration_hours > p75_duration and max_duration > p75_duration:
                                 penalty = min(0.5, 0.4 * ((duration_hours - p75_duration) / (max_duration - p75_duration + 0.1)))
                                 convenience_norm = max(0.0, base_convenience_norm - penalty)
@@ -2457,7 +2434,7 @@ async def generate_optimal_itinerary_endpoint(req: OptimalItineraryRequest):
         )
         return result
     except Exception as e:
-        logger.error(f"[OPTIMAL_ITINERARY] Error: {e}")
+        logger.error("[OPTIMAL_ITINERARY] Error: %s", e)
         raise HTTPException(status_code=500, detail=f"Error generating optimal itinerary: {str(e)}")
 
 @app.post("/api/fetchItineraryData")
@@ -2472,7 +2449,7 @@ async def fetch_itinerary_data(req: Dict[str, Any]):
         check_out = req.get('checkOut', '')
         adults = req.get('adults', 1)
         
-        logger.info(f"[ITINERARY_DATA] Received request: destinationCode={destination_code}, destinationName={destination_name}, checkIn={check_in}, checkOut={check_out}, adults={adults}")
+        logger.info("[ITINERARY_DATA] Received request: destinationCode=%s, destinationName=%s, checkIn=%s, checkOut=%s, adults=%s", destination_code, destination_name, check_in, check_out, adults)
         
         if not amadeus_service:
             return {
@@ -2488,7 +2465,6 @@ async def fetch_itinerary_data(req: Dict[str, Any]):
         # Fetch hotels - try with destination_code or destination_name
         if check_in and check_out:
             try:
-                from services.iata_codes import get_iata_code
                 # Try to get city code from destination code or name
                 city_code = destination_code
                 
@@ -2497,21 +2473,22 @@ async def fetch_itinerary_data(req: Dict[str, Any]):
                     # Try to get IATA code from destination_name first
                     if destination_name:
                         city_code = get_iata_code(destination_name)
-                        logger.info(f"[ITINERARY_DATA] Converted destination_name '{destination_name}' to IATA code: {city_code}")
+                        logger.info("[ITINERARY_DATA] Converted destination_name '%s' to IATA code: %s", destination_name, city_code)
                     
                     # If still no code, try destination_code (might be a city name)
                     if not city_code and destination_code:
                         city_code = get_iata_code(destination_code)
-                        logger.info(f"[ITINERARY_DATA] Converted destination_code '{destination_code}' to IATA code: {city_code}")
+                        logger.info("[ITINERARY_DATA] Converted destination_code '%s' to IATA code: %s", destination_code, city_code)
                     
                     # If still no code, use destination_code as fallback (might work for some APIs)
                     if not city_code:
                         city_code = destination_code if destination_code else destination_name
-                        logger.warn(f"[ITINERARY_DATA] Could not convert to IATA code, using as-is: {city_code}")
+                        logger.warn("[ITINERARY_DATA] Could not convert to IATA code, using as-is: %s", city_code)
                 
                 if city_code:
-                    logger.info(f"[ITINERARY_DATA] Searching hotels with city_code: {city_code}, destination_name: {destination_name}")
-                    hotel_result = amadeus_service.search_hotels(
+                    logger.info("[ITINERARY_DATA] Searching hotels with city_code: %s, destination_name: %s", city_code, destination_name)
+                    hotel_result = await asyncio.to_thread(
+                        amadeus_service.search_hotels,
                         city_code=city_code,
                         check_in=check_in,
                         check_out=check_out,
@@ -2523,28 +2500,28 @@ async def fetch_itinerary_data(req: Dict[str, Any]):
                         request_preferences = req.get('preferences')
                         if request_preferences:
                             hotels = apply_preference_weights_to_hotels(hotels, request_preferences, context_label="fetch_itinerary")
-                        logger.info(f"[ITINERARY_DATA] Found {len(hotels)} hotels")
+                        logger.info("[ITINERARY_DATA] Found %s hotels", len(hotels))
                     else:
-                        logger.warn(f"[ITINERARY_DATA] Hotel search returned error or no hotels: {hotel_result.get('error', 'No hotels found')}")
+                        logger.warn("[ITINERARY_DATA] Hotel search returned error or no hotels: %s", hotel_result.get('error', 'No hotels found'))
                         # Try fallback: get coordinates and search by location
                         if destination_name:
                             try:
-                                logger.info(f"[ITINERARY_DATA] Attempting fallback: getting coordinates for {destination_name}")
-                                coords = amadeus_service.get_city_coordinates(destination_name)
+                                logger.info("[ITINERARY_DATA] Attempting fallback: getting coordinates for %s", destination_name)
+                                coords = await asyncio.to_thread(amadeus_service.get_city_coordinates, destination_name)
                                 if coords:
                                     latitude, longitude = coords
-                                    logger.info(f"[ITINERARY_DATA] Got coordinates: {latitude}, {longitude}")
+                                    logger.info("[ITINERARY_DATA] Got coordinates: %s, %s", latitude, longitude)
                                     # Note: Amadeus hotel API doesn't support coordinate-based search directly
                                     # But we can log this for future implementation
-                                    logger.info(f"[ITINERARY_DATA] Coordinate-based hotel search not yet implemented in Amadeus API")
+                                    logger.info("[ITINERARY_DATA] Coordinate-based hotel search not yet implemented in Amadeus API")
                             except Exception as coord_error:
-                                logger.warn(f"[ITINERARY_DATA] Could not get coordinates for fallback: {coord_error}")
+                                logger.warn("[ITINERARY_DATA] Could not get coordinates for fallback: %s", coord_error)
                 else:
-                    logger.warn(f"[ITINERARY_DATA] No valid city code found for destination: {destination_name}")
+                    logger.warn("[ITINERARY_DATA] No valid city code found for destination: %s", destination_name)
             except Exception as e:
-                logger.error(f"[ITINERARY_DATA] Error fetching hotels: {e}")
+                logger.error("[ITINERARY_DATA] Error fetching hotels: %s", e)
         else:
-            logger.warn(f"[ITINERARY_DATA] Missing check_in or check_out dates: check_in={check_in}, check_out={check_out}")
+            logger.warn("[ITINERARY_DATA] Missing check_in or check_out dates: check_in=%s, check_out=%s", check_in, check_out)
         
         # Fetch activities - need coordinates for activities
         # For now, we'll return empty activities list and let frontend handle it
@@ -2557,7 +2534,8 @@ async def fetch_itinerary_data(req: Dict[str, Any]):
                 longitude = first_hotel.get('longitude')
                 
                 if latitude and longitude:
-                    activity_result = amadeus_service.search_activities(
+                    activity_result = await asyncio.to_thread(
+                        amadeus_service.search_activities,
                         latitude=float(latitude),
                         longitude=float(longitude),
                         radius=20  # 20km radius
@@ -2571,11 +2549,9 @@ async def fetch_itinerary_data(req: Dict[str, Any]):
                         trip_duration_days = None
                         if check_in and check_out:
                             try:
-                                check_in_dt = datetime.strptime(check_in, "%Y-%m-%d")
-                                check_out_dt = datetime.strptime(check_out, "%Y-%m-%d")
-                                trip_duration_days = (check_out_dt - check_in_dt).days
+                                trip_duration_days = _trip_duration_days(check_in, check_out)
                             except (ValueError, TypeError) as date_error:
-                                logger.debug(f"[ITINERARY_DATA] Could not parse dates for trip duration: {date_error}")
+                                logger.debug("[ITINERARY_DATA] Could not parse dates for trip duration: %s", date_error)
                         
                         # Get preferences from request
                         request_preferences = req.get('preferences')
@@ -2593,9 +2569,9 @@ async def fetch_itinerary_data(req: Dict[str, Any]):
                         activity_result['_header_title'] = f"Top activities in {destination_city}"
                         activity_result['_subtitle'] = "Ranked by how well they match your preferences."
                         
-                        logger.info(f"[ITINERARY_DATA] Found {len(activities)} activities")
+                        logger.info("[ITINERARY_DATA] Found %s activities", len(activities))
         except Exception as e:
-            logger.error(f"[ITINERARY_DATA] Error fetching activities: {e}")
+            logger.error("[ITINERARY_DATA] Error fetching activities: %s", e)
         
         return {
             'ok': True,
@@ -2603,7 +2579,7 @@ async def fetch_itinerary_data(req: Dict[str, Any]):
             'activities': activities
         }
     except Exception as e:
-        logger.error(f"[ITINERARY_DATA] Error: {e}")
+        logger.error("[ITINERARY_DATA] Error: %s", e)
         return {
             'ok': False,
             'error': str(e),
@@ -2698,65 +2674,786 @@ async def optimize_trip(preferences: TripPreferences):
         logger.error(f"[OPTIMIZE_TRIP] Error: {e}")
         raise HTTPException(status_code=500, detail=f"Error optimizing trip: {str(e)}")
 
-@app.post("/api/chat")
-async def chat(req: ChatRequest):
-    try:
-        # ADD: End-to-end trace of preferences from FE → BE
-        logger.info(f"[PREF_TRACE] ═══ PREFERENCES FLOW TRACE (FE → BE) ═══")
-        logger.info(f"[PREF_TRACE] Received request with preferences: {req.preferences}")
-        if req.preferences:
-            logger.info(f"[PREF_TRACE] Preferences type: {type(req.preferences)}, keys: {list(req.preferences.keys()) if isinstance(req.preferences, dict) else 'N/A'}")
-            logger.info(f"[PREF_TRACE] Raw values: budget={req.preferences.get('budget')}, quality={req.preferences.get('quality')}, convenience={req.preferences.get('convenience')}")
-            if isinstance(req.preferences, dict):
-                raw_budget = req.preferences.get('budget', 0)
-                raw_quality = req.preferences.get('quality', 0)
-                raw_convenience = req.preferences.get('convenience', 0)
-                total_raw = raw_budget + raw_quality + raw_convenience
-                logger.info(f"[PREF_TRACE] Sum check: {raw_budget:.3f} + {raw_quality:.3f} + {raw_convenience:.3f} = {total_raw:.3f}")
-        else:
-            logger.warning(f"[PREF_TRACE] ⚠️ No preferences in request body!")
-        
-        # Validate that we have messages
-        if not req.messages or len(req.messages) == 0:
-            raise HTTPException(status_code=400, detail="No messages provided")
-        
-        # Make sure the last message is from the user
-        if req.messages[-1]["role"] != "user":
-            raise HTTPException(status_code=400, detail="Last message must be from user")
-        
-        # Generate session ID if not provided
-        session_id = req.session_id or str(uuid.uuid4())
-        
-        # Get the user's latest message
-        user_message = req.messages[-1]["content"]
-        
-        # Check if message contains activity-related keywords FIRST (before flight keywords)
-        # This is important to prioritize activity context over generic travel keywords
-        activity_keywords = [
-            'activity', 'activities', 'tour', 'tours', 'guided tour', 'walking tour',
-            'attraction', 'attractions', 'things to do', 'sightseeing', 'sightsee',
-            'visit', 'explore', 'see', 'museum', 'museums', 'park', 'beach',
-            'below', 'under', 'cheap', 'affordable', 'budget'
-        ]
-        has_activity_keywords = any(keyword in user_message.lower() for keyword in activity_keywords)
-        logger.info(f"Activity keyword check: {has_activity_keywords}")
-        
-        # Check if message contains flight-related keywords
-        flight_keywords = [
-            'flight', 'flights', 'airline', 'airlines', 'airplane', 'aircraft', 'plane',
-            'ticket', 'tickets', 'booking', 'book', 'reserve', 'reservation',
-            'destination', 'departure', 'arrival', 'airport', 'terminal',
-            'fare', 'fares',
-            'search flights', 'find flights', 'book flights', 'flight search',
-            'airline tickets', 'plane tickets', 'flight booking', 'travel booking'
-        ]
-        
-        has_flight_keywords = any(keyword in user_message.lower() for keyword in flight_keywords)
-        logger.info(f"Flight keyword check: {has_flight_keywords}")
-        
-        # Use intent detection for proper parsing
-        logger.info(f"Processing message for session {session_id}: {user_message[:100]}...")
-        
+# Keywords that route a chat message to activities / flights (plain substring semantics)
+ACTIVITY_KEYWORDS = (
+    'activity', 'activities', 'tour', 'tours', 'guided tour', 'walking tour',
+    'attraction', 'attractions', 'things to do', 'sightseeing', 'sightsee',
+    'visit', 'explore', 'see', 'museum', 'museums', 'park', 'beach',
+    'below', 'under', 'cheap', 'affordable', 'budget'
+)
+FLIGHT_KEYWORDS = (
+    'flight', 'flights', 'airline', 'airlines', 'airplane', 'aircraft', 'plane',
+    'ticket', 'tickets', 'booking', 'book', 'reserve', 'reservation',
+    'destination', 'departure', 'arrival', 'airport', 'terminal',
+    'fare', 'fares',
+    'search flights', 'find flights', 'book flights', 'flight search',
+    'airline tickets', 'plane tickets', 'flight booking', 'travel booking'
+)
+
+
+def _keyword_alternation(keywords) -> str:
+    return '|'.join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+
+
+# One alternation for every signal we read from the user's message, so it is scanned once.
+# The "or less" price form is a lookahead so its trailing "under"/"below" is still seen.
+_MESSAGE_SIGNAL_RE = re.compile(
+    r'(?P<price_dollar>\$(?P<dollar_amount>\d+))'
+    r'|(?P<price_phrase>(?P<price_cue>below|under|less than|cheaper than)\s+(?P<phrase_dollar>\$?)(?P<phrase_amount>\d+))'
+    r'|(?P<price_suffix>(?P<suffix_amount>\d+)(?=\s+(?:or less|or under|or below)))'
+    r'|(?P<flight>' + _keyword_alternation(FLIGHT_KEYWORDS) + r')'
+    r'|(?P<activity>' + _keyword_alternation(ACTIVITY_KEYWORDS) + r')'
+)
+# Price forms in the order they were historically tried ("$20" wins over "under 30")
+_PRICE_SIGNAL_PRIORITY = ('price_dollar', 'price_phrase', 'price_suffix')
+
+
+def _scan_message_signals(message_lower: str) -> Tuple[bool, bool, Optional[int]]:
+    """Return (has_activity_keywords, has_flight_keywords, max_price) for a lowercased message."""
+    has_activity = False
+    has_flight = False
+    prices: Dict[str, int] = {}
+    for match in _MESSAGE_SIGNAL_RE.finditer(message_lower):
+        kind = match.lastgroup
+        if kind == 'flight':
+            has_flight = True
+        elif kind == 'activity':
+            has_activity = True
+        elif kind == 'price_dollar':
+            prices.setdefault(kind, int(match.group('dollar_amount')))
+        elif kind == 'price_phrase':
+            amount = int(match.group('phrase_amount'))
+            # "under"/"below"/"cheaper" are activity keywords consumed by the price match
+            if match.group('price_cue') != 'less than':
+                has_activity = True
+            if match.group('phrase_dollar'):
+                prices.setdefault('price_dollar', amount)
+            prices.setdefault(kind, amount)
+        elif kind == 'price_suffix':
+            prices.setdefault(kind, int(match.group('suffix_amount')))
+    max_price = next((prices[k] for k in _PRICE_SIGNAL_PRIORITY if k in prices), None)
+    return has_activity, has_flight, max_price
+
+
+# ----------------------------------------------------------------------------
+# Amadeus intent handlers for /api/chat
+# Each handler takes the intent params (and the user's preference weights) and
+# returns amadeus_data. They are blocking, so chat() runs them via asyncio.to_thread.
+# ----------------------------------------------------------------------------
+
+def _search_flights_across_airports(origin_airports: List[str], dest_airports: List[str],
+                                    departure_date: str, return_date: Optional[str],
+                                    adults: int, max_price: Optional[Any],
+                                    log_prefix: str = "") -> Tuple[Dict[str, Any], str, str]:
+    """
+    Search flights from all origin airports to all destination airports.
+    Returns (amadeus_data, origin_code, destination_code) where the codes are the first
+    airports, used for display.
+    """
+    all_flights = []
+    total_searches = len(origin_airports) * len(dest_airports)
+
+    if total_searches > 1:
+        logger.info("%sSearching %s airport combinations in parallel...", log_prefix, total_searches)
+        # Parallel API calls on the shared Amadeus pool
+        future_to_route = {}
+        for orig_airport in origin_airports:
+            for dest_airport in dest_airports:
+                future = AMADEUS_EXECUTOR.submit(
+                    amadeus_service.search_flights,
+                    origin=orig_airport,
+                    destination=dest_airport,
+                    departure_date=departure_date,
+                    return_date=return_date,
+                    adults=adults,
+                    max_price=max_price
+                )
+                future_to_route[future] = (orig_airport, dest_airport)
+
+        for future in as_completed(future_to_route):
+            orig_airport, dest_airport = future_to_route[future]
+            try:
+                airport_flights = future.result()
+                if airport_flights and not airport_flights.get('error') and airport_flights.get('flights'):
+                    # Add airport info to each flight for tracking
+                    for flight in airport_flights['flights']:
+                        flight['_origin_airport'] = orig_airport
+                        flight['_destination_airport'] = dest_airport
+                    all_flights.extend(airport_flights['flights'])
+                    logger.info("%sFound %s flights from %s to %s", log_prefix, len(airport_flights['flights']), orig_airport, dest_airport)
+                else:
+                    logger.info("%sNo flights found from %s to %s", log_prefix, orig_airport, dest_airport)
+            except Exception as e:
+                logger.error("%sError searching %s -> %s: %s", log_prefix, orig_airport, dest_airport, e)
+
+        # Use first airport codes for display
+        origin = origin_airports[0]
+        destination = dest_airports[0]
+
+        # Combine all results
+        if all_flights:
+            logger.info("%sCombined results: %s total flights from %s origin(s) to %s destination(s)", log_prefix, len(all_flights), len(origin_airports), len(dest_airports))
+            return {
+                "flights": all_flights,
+                "count": len(all_flights),
+                "_multi_airport_search": True,
+                "_origin_airports": origin_airports,
+                "_destination_airports": dest_airports
+            }, origin, destination
+
+        # Fallback to single search if no results
+        logger.warning("%sNo flights found from any airport combination, using first airports", log_prefix)
+    else:
+        # Single airport search
+        origin = origin_airports[0]
+        destination = dest_airports[0]
+        logger.info("%sCalling Amadeus API: %s -> %s on %s", log_prefix, origin, destination, departure_date)
+
+    amadeus_data = amadeus_service.search_flights(
+        origin=origin,
+        destination=destination,
+        departure_date=departure_date,
+        return_date=return_date,
+        adults=adults,
+        max_price=max_price
+    )
+    return amadeus_data, origin, destination
+
+
+def _handle_flight_search(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling flight search with params: %s", params)
+
+    # Validate required parameters before API call
+    origin = params.get("origin", "")
+    destination = params.get("destination", "")
+    departure_date = params.get("departure_date", "")
+
+    # Check for missing required parameters
+    if not origin or not destination:
+        logger.warning("Missing origin or destination: origin=%s, destination=%s", origin, destination)
+        return {"error": "Missing origin or destination. Please provide both origin and destination cities (e.g., 'flights from New York to Paris')."}
+    if not departure_date:
+        logger.warning("Missing departure date: departure_date=%s", departure_date)
+        return {"error": "Missing departure date. Please provide a departure date (e.g., 'November 3rd' or '11/03/2024')."}
+
+    # Resolve origin and destination airports concurrently (independent lookups)
+    origin_future = AMADEUS_EXECUTOR.submit(_resolve_airport_codes, origin)
+    dest_future = AMADEUS_EXECUTOR.submit(_resolve_airport_codes, destination)
+    origin_airports, dest_airports = origin_future.result(), dest_future.result()
+
+    amadeus_data, origin, destination = _search_flights_across_airports(
+        origin_airports, dest_airports,
+        departure_date=departure_date,
+        return_date=params.get("return_date"),
+        adults=params.get("adults", 1),
+        max_price=params.get("max_price")
+    )
+    logger.info("Amadeus flight search returned count=%s for %s->%s", (amadeus_data or {}).get('count'), origin, destination)
+    return amadeus_data
+
+
+def _handle_hotel_search(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling hotel search with params: %s", params)
+    amadeus_data = amadeus_service.search_hotels(
+        city_code=params["destination"],
+        check_in=params["check_in"],
+        check_out=params["check_out"],
+        adults=params.get("adults", 1),
+        radius=params.get("radius", 50),
+        price_range=params.get("price_range")
+    )
+    if amadeus_data and amadeus_data.get('hotels') and preferences:
+        amadeus_data['hotels'] = apply_preference_weights_to_hotels(
+            amadeus_data['hotels'],
+            preferences,
+            context_label="chat"
+        )
+        amadeus_data['_preference_weights'] = preferences
+    logger.info("Amadeus hotel search returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_activity_search(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling activity search with params: %s", params)
+    # ADD: Log preferences before activity search
+    logger.debug("[PREF_TRACE] Activity search detected. Preferences for scoring: %s", preferences)
+    if preferences:
+        logger.debug("[PREF_TRACE] ✅ Preferences will be applied to activities: budget=%.3f, quality=%.3f, convenience=%.3f",
+                     preferences.get('budget', 0), preferences.get('quality', 0), preferences.get('convenience', 0))
+    else:
+        logger.debug("[PREF_TRACE] ⚠️ No preferences available for activity scoring!")
+
+    if "latitude" in params and "longitude" in params:
+        # Direct coordinate search
+        amadeus_data = amadeus_service.search_activities(
+            latitude=float(params["latitude"]),
+            longitude=float(params["longitude"]),
+            radius=params.get("radius", 1)
+        )
+    elif "destination" in params:
+        # City-based search - convert city name to coordinates
+        city_name = params["destination"]
+        logger.info("[ACTIVITY_SEARCH] Converting city name '%s' to coordinates", city_name)
+        coordinates = amadeus_service.get_city_coordinates(city_name)
+
+        if coordinates:
+            lat, lon = coordinates
+            logger.info("[ACTIVITY_SEARCH] Found coordinates for %s: %s, %s", city_name, lat, lon)
+            amadeus_data = amadeus_service.search_activities(
+                latitude=lat,
+                longitude=lon,
+                radius=params.get("radius", 1)
+            )
+        else:
+            logger.error("[ACTIVITY_SEARCH] Could not find coordinates for city: %s", city_name)
+            logger.error("[ACTIVITY_SEARCH] Intent params: %s", params)
+            amadeus_data = {"error": f"Could not find location coordinates for {city_name}"}
+    else:
+        logger.warning("Activity search requires coordinates or destination city")
+        amadeus_data = {"error": "Activity search requires location coordinates or a destination city name"}
+
+    # Apply preference filters to activities
+    if amadeus_data and amadeus_data.get('activities'):
+        # ADD: Log before passing to scoring function
+        logger.debug("[PREF_TRACE] Passing %d activities to scoring function with preferences: %s", len(amadeus_data['activities']), preferences)
+
+        # Calculate trip duration from dates if available
+        trip_duration_days = None
+
+        # Try to get dates from intent params (check_in/check_out or departure_date/return_date)
+        check_in = params.get("check_in")
+        check_out = params.get("check_out")
+        departure_date = params.get("departure_date")
+        return_date = params.get("return_date")
+
+        try:
+            if check_in and check_out:
+                trip_duration_days = _trip_duration_days(check_in, check_out)
+            elif departure_date and return_date:
+                trip_duration_days = _trip_duration_days(departure_date, return_date)
+        except (ValueError, TypeError) as date_error:
+            logger.debug("[ACTIVITY_FILTER] Could not parse dates for trip duration: %s", date_error)
+
+        # Apply filters and scoring
+        logger.info("[ACTIVITY_SEARCH] Applying preference filters. Activities count before: %s, preferences: %s", len(amadeus_data['activities']), preferences)
+        amadeus_data['activities'] = apply_preference_filters_to_activities(
+            amadeus_data['activities'],
+            preferences=preferences,
+            trip_duration_days=trip_duration_days,
+            context_label="chat"
+        )
+        logger.info("[ACTIVITY_SEARCH] After preference filtering. Activities count: %s", len(amadeus_data['activities']))
+
+        if preferences:
+            amadeus_data['_preference_weights'] = preferences
+            logger.info("[ACTIVITY_SEARCH] Preference weights saved: %s", preferences)
+        else:
+            logger.warning("[ACTIVITY_SEARCH] ⚠️ No preferences in request! preferences = %s", preferences)
+        if trip_duration_days is not None:
+            amadeus_data['_trip_duration_days'] = trip_duration_days
+
+        # Generate fixed header template (not from GPT)
+        destination_city = params.get("destination", "your destination")
+        amadeus_data['_header_title'] = f"Top activities in {destination_city}"
+        amadeus_data['_subtitle'] = "Ranked by how well they match your preferences."
+
+    logger.info("Amadeus activity search returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_flight_inspiration(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling flight inspiration with params: %s", params)
+    amadeus_data = amadeus_service.get_flight_inspiration(
+        origin=params["origin"],
+        max_price=params.get("max_price"),
+        departure_date=params.get("departure_date")
+    )
+    logger.info("Amadeus flight inspiration returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_location_search(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling location search with params: %s", params)
+    amadeus_data = amadeus_service.get_airport_city_search(
+        keyword=params["keyword"]
+    )
+    logger.info("Amadeus location search returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_travel_recommendations(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling travel recommendations with params: %s", params)
+    amadeus_data = amadeus_service.get_travel_recommendations(
+        origin=params.get("origin", ""),
+        destination=params.get("destination")
+    )
+    logger.info("Amadeus travel recommendations returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_travel_restrictions(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling travel restrictions with params: %s", params)
+    amadeus_data = amadeus_service.get_travel_restrictions(
+        origin=params.get("origin", ""),
+        destination=params.get("destination", "")
+    )
+    logger.info("Amadeus travel restrictions returned")
+    return amadeus_data
+
+
+def _handle_flight_status(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling flight status with params: %s", params)
+    amadeus_data = amadeus_service.get_on_demand_flight_status(
+        carrier_code=params.get("carrier_code", ""),
+        flight_number=params.get("flight_number", ""),
+        scheduled_departure_date=params.get("scheduled_departure_date", "")
+    )
+    logger.info("Amadeus flight status returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_airport_performance(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling airport performance with params: %s", params)
+    amadeus_data = amadeus_service.get_airport_on_time_performance(
+        airport_code=params.get("airport_code", ""),
+        date=params.get("date", "")
+    )
+    logger.info("Amadeus airport performance returned")
+    return amadeus_data
+
+
+# points_of_interest categories never forwarded to Amadeus
+EXCLUDED_POI_CATEGORIES = frozenset({"PRIVATE_CAR"})
+
+
+def _handle_points_of_interest(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling points of interest with params: %s", params)
+    # For GENERAL_ACTIVITIES or general activity searches, use activity_search API instead
+    # This avoids PRIVATE_CAR category restriction and uses the standard activities API
+    if "latitude" in params and "longitude" in params:
+        # Use activity_search API instead of points_of_interest for general activities
+        amadeus_data = amadeus_service.search_activities(
+            latitude=float(params["latitude"]),
+            longitude=float(params["longitude"]),
+            radius=params.get("radius", 1)
+        )
+        # Generate fixed header template (use destination if available, otherwise generic)
+        if amadeus_data and not amadeus_data.get('error'):
+            destination_city = params.get("destination", "your destination")
+            amadeus_data['_header_title'] = f"Top activities in {destination_city}"
+            amadeus_data['_subtitle'] = "Ranked by how well they match your preferences."
+        logger.info("Using activity_search API instead of points_of_interest (GENERAL_ACTIVITIES)")
+    elif "destination" in params:
+        # City-based search - convert city name to coordinates
+        city_name = params["destination"]
+        logger.info("Converting city name '%s' to coordinates for activity search", city_name)
+        coordinates = amadeus_service.get_city_coordinates(city_name)
+
+        if coordinates:
+            lat, lon = coordinates
+            logger.info("Found coordinates for %s: %s, %s", city_name, lat, lon)
+            amadeus_data = amadeus_service.search_activities(
+                latitude=lat,
+                longitude=lon,
+                radius=params.get("radius", 1)
+            )
+        else:
+            logger.warning("Could not find coordinates for city: %s", city_name)
+            amadeus_data = {"error": f"Could not find location coordinates for {city_name}"}
+    else:
+        # Fallback to original points_of_interest API (but exclude PRIVATE_CAR)
+        categories = params.get("categories") or []
+        if isinstance(categories, str):
+            categories = (c.strip() for c in categories.split(","))
+        # Exclude PRIVATE_CAR category (single pass over the split/strip)
+        categories = [c for c in categories if c and c.upper() not in EXCLUDED_POI_CATEGORIES]
+        amadeus_data = amadeus_service.get_points_of_interest(
+            latitude=float(params.get("latitude", 0)),
+            longitude=float(params.get("longitude", 0)),
+            radius=params.get("radius", 2),
+            categories=categories if categories else None
+        )
+    logger.info("Amadeus activity search returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_most_booked_destinations(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling most booked destinations with params: %s", params)
+    amadeus_data = amadeus_service.get_flight_most_booked_destinations(
+        origin=params.get("origin", ""),
+        period=params.get("period", "2024")
+    )
+    logger.info("Amadeus most booked destinations returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_most_traveled_destinations(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling most traveled destinations with params: %s", params)
+    amadeus_data = amadeus_service.get_flight_most_traveled_destinations(
+        origin=params.get("origin", ""),
+        period=params.get("period", "2024")
+    )
+    logger.info("Amadeus most traveled destinations returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_busiest_period(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling busiest period with params: %s", params)
+    amadeus_data = amadeus_service.get_flight_busiest_traveling_period(
+        origin=params.get("origin", ""),
+        destination=params.get("destination", ""),
+        period=params.get("period", "2024")
+    )
+    logger.info("Amadeus busiest period returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_trip_purpose(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling trip purpose prediction with params: %s", params)
+    amadeus_data = amadeus_service.get_trip_purpose_prediction(
+        origin=params.get("origin", ""),
+        destination=params.get("destination", ""),
+        departure_date=params.get("departure_date", "")
+    )
+    logger.info("Amadeus trip purpose prediction returned")
+    return amadeus_data
+
+
+def _handle_airline_lookup(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling airline lookup with params: %s", params)
+    amadeus_data = amadeus_service.get_airline_code_lookup(
+        airline_code=params.get("airline_code"),
+        airline_name=params.get("airline_name")
+    )
+    logger.info("Amadeus airline lookup returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_airport_routes(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling airport routes with params: %s", params)
+    amadeus_data = amadeus_service.get_airport_routes(
+        airport_code=params.get("airport_code", "")
+    )
+    logger.info("Amadeus airport routes returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+# Amadeus hotel-sentiments accepts at most 3 hotel IDs per request
+HOTEL_RATINGS_BATCH_SIZE = 3
+
+
+def _handle_hotel_ratings(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling hotel ratings with params: %s", params)
+    hotel_ids = params.get("hotel_ids", [])
+    if isinstance(hotel_ids, str):
+        hotel_ids = hotel_ids.split(",")
+    # Normalize and de-duplicate (order-preserving) so repeated IDs don't cost extra quota
+    hotel_ids = list(dict.fromkeys(h.strip().upper() for h in hotel_ids if h and h.strip()))
+    batches = [hotel_ids[i:i + HOTEL_RATINGS_BATCH_SIZE] for i in range(0, len(hotel_ids), HOTEL_RATINGS_BATCH_SIZE)]
+
+    if len(batches) <= 1:
+        amadeus_data = amadeus_service.get_hotel_ratings(hotel_ids)
+    else:
+        results = list(AMADEUS_EXECUTOR.map(amadeus_service.get_hotel_ratings, batches))
+
+        ratings = [rating for result in results if not result.get('error') for rating in result.get('ratings', [])]
+        errors = [result['error'] for result in results if result.get('error')]
+        if errors:
+            logger.warning("Hotel ratings failed for %d of %d batches: %s", len(errors), len(batches), errors[0])
+        if errors and not ratings:
+            amadeus_data = {"error": errors[0], "ratings": []}
+        else:
+            amadeus_data = {"ratings": ratings, "count": len(ratings)}
+    logger.info("Amadeus hotel ratings returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+def _handle_transfer_search(params: Dict[str, Any], preferences: Optional[Dict[str, float]]) -> Dict[str, Any]:
+    logger.info("Calling transfer search with params: %s", params)
+    amadeus_data = amadeus_service.search_transfers(
+        origin_lat=float(params.get("origin_lat", 0)),
+        origin_lon=float(params.get("origin_lon", 0)),
+        destination_lat=float(params.get("destination_lat", 0)),
+        destination_lon=float(params.get("destination_lon", 0)),
+        departure_date=params.get("departure_date", ""),
+        adults=params.get("adults", 1)
+    )
+    logger.info("Amadeus transfer search returned count=%s", (amadeus_data or {}).get('count'))
+    return amadeus_data
+
+
+# Intent type -> handler(params, preferences) -> amadeus_data
+INTENT_HANDLERS: Dict[str, Callable[[Dict[str, Any], Optional[Dict[str, float]]], Dict[str, Any]]] = {
+    "flight_search": _handle_flight_search,
+    "hotel_search": _handle_hotel_search,
+    "activity_search": _handle_activity_search,
+    "flight_inspiration": _handle_flight_inspiration,
+    "location_search": _handle_location_search,
+    "travel_recommendations": _handle_travel_recommendations,
+    "travel_restrictions": _handle_travel_restrictions,
+    "flight_status": _handle_flight_status,
+    "airport_performance": _handle_airport_performance,
+    "points_of_interest": _handle_points_of_interest,
+    "most_booked_destinations": _handle_most_booked_destinations,
+    "most_traveled_destinations": _handle_most_traveled_destinations,
+    "busiest_period": _handle_busiest_period,
+    "trip_purpose": _handle_trip_purpose,
+    "airline_lookup": _handle_airline_lookup,
+    "airport_routes": _handle_airport_routes,
+    "hotel_ratings": _handle_hotel_ratings,
+    "transfer_search": _handle_transfer_search,
+}
+
+# GPT reply budgets: generation time grows with output tokens, so intents with naturally short
+# answers get a tighter cap. Anything not listed (general chat, itineraries) keeps the default.
+DEFAULT_MAX_TOKENS = 1000
+MAX_TOKENS_BY_INTENT: Dict[str, int] = {
+    "airline_lookup": 150,
+    "location_search": 200,
+    "flight_status": 200,
+    "airport_performance": 200,
+    "trip_purpose": 200,
+    "hotel_ratings": 250,
+    "airport_routes": 300,
+    "busiest_period": 300,
+    "travel_restrictions": 400,
+    "most_booked_destinations": 400,
+    "most_traveled_destinations": 400,
+    "transfer_search": 500,
+    "flight_inspiration": 600,
+    "travel_recommendations": 600,
+    "points_of_interest": 900,
+    "activity_search": 900,
+    "hotel_search": 900,
+    "flight_search": 900,
+}
+
+
+# User-facing chat replies for amadeus_data errors, keyed by (intent_type, category).
+# "*" is the fallback for any intent. Categories come from _classify_error ("other" when
+# none matched), refined by _ERROR_DETAIL_KEYWORDS. Placeholders: {error_msg}, {detail}.
+ERROR_REPLIES: Dict[Tuple[str, str], str] = {
+    ("activity_search", "missing_location"): "I'd be happy to help you find activities! Please tell me which city you'd like to explore. For example:\n- 'What activities are available in Paris?'\n- 'Things to do in Barcelona'\n- 'Activities in Tokyo'",
+    ("activity_search", "missing"): "I need more information to find activities for you. {detail}",
+    ("hotel_search", "missing_destination"): "I'd be happy to help you find hotels! Please tell me which city you'd like to stay in. For example:\n- 'Hotels in Paris'\n- 'Accommodations in New York'",
+    ("hotel_search", "missing_date"): "I need check-in and check-out dates to search for hotels. For example:\n- 'Hotels in Paris from December 1 to December 5'\n- 'Hotels in New York from November 15 to November 20'",
+    ("hotel_search", "missing"): "I need more information to find hotels for you. {detail}",
+    ("flight_search", "missing_route"): "I'd be happy to help you find flights! Please provide both your departure and destination cities. For example:\n- 'Flights from New York to Paris'\n- 'Flights from Los Angeles to Tokyo'",
+    ("flight_search", "missing_date"): "I need a departure date to search for flights. For example:\n- 'Flights from New York to Paris on November 15th'\n- 'Flights from LA to Tokyo on December 1'",
+    ("flight_search", "missing"): "I need more information to find flights for you. {detail}",
+    ("*", "missing"): "I need more information. {detail}",
+    ("*", "invalid_date"): "Please provide dates in a valid format. For example:\n- 'November 15th, 2024'\n- '12/15/2024'\n- 'Dec 15'",
+    ("*", "invalid"): "Please check your input: {detail}",
+    ("activity_search", "api call failed"): "I'm having trouble connecting to the activities database right now. Please try again in a moment, or try asking about a different city.",
+    ("hotel_search", "api call failed"): "I'm having trouble connecting to the hotel database right now. Please try again in a moment.",
+    ("*", "api call failed"): "I'm having trouble connecting to the travel database right now. Please check your connection and try again.",
+    ("*", "could not find location coordinates"): "I couldn't find that location. Please try:\n- Using the full city name (e.g., 'Paris' instead of 'Par')\n- Specifying the city and country (e.g., 'Paris, France')\n- Asking about a different city",
+    ("*", "no flights available"): "I couldn't find any flights for that route and dates. Please try:\n- Different dates\n- Different destinations\n- A nearby airport",
+    ("activity_search", "other"): "I couldn't find activities right now. {error_msg}. Please try asking about a specific city, like 'activities in Paris' or 'things to do in Barcelona'.",
+    ("hotel_search", "other"): "I couldn't find hotels right now. {error_msg}. Please try asking with specific dates and a city name.",
+    ("flight_search", "other"): "I couldn't find flights right now. {error_msg}. Please try rephrasing your request with specific dates and locations.",
+    ("*", "other"): "I encountered an issue: {error_msg}. Please try rephrasing your request.",
+}
+
+# (intent_type, category) -> ordered (detailed category, keywords); first keyword hit wins
+_ERROR_DETAIL_KEYWORDS = {
+    ("activity_search", "missing"): (("missing_location", ("location", "city")),),
+    ("hotel_search", "missing"): (("missing_destination", ("destination",)), ("missing_date", ("date",))),
+    ("flight_search", "missing"): (("missing_route", ("origin", "destination")), ("missing_date", ("date",))),
+    ("*", "invalid"): (("invalid_date", ("date",)),),
+}
+
+# The category word stripped from the message for {detail}
+_ERROR_DETAIL_STRIP_RE = {
+    "missing": re.compile(r'Missing|missing'),
+    "invalid": re.compile(r'Invalid|invalid'),
+}
+
+
+def build_error_reply(intent_type: str, error_msg: str) -> str:
+    """User-facing chat reply for an amadeus_data error (returned without calling GPT)"""
+    error_msg_lc = error_msg.lower()
+    category = _classify_error(error_msg_lc) or "other"
+    
+    strip_re = _ERROR_DETAIL_STRIP_RE.get(category)
+    detail = strip_re.sub('', error_msg).strip() if strip_re else error_msg
+    
+    detailed = category
+    for scope in (intent_type, "*"):
+        rules = _ERROR_DETAIL_KEYWORDS.get((scope, category))
+        if rules:
+            detailed = next(
+                (name for name, keywords in rules if any(k in error_msg_lc for k in keywords)),
+                category
+            )
+            break
+    
+    template = ERROR_REPLIES.get((intent_type, detailed)) or ERROR_REPLIES[("*", detailed)]
+    return template.format(error_msg=error_msg, detail=detail)
+
+
+def _analytics_score(item: Dict[str, Any], metric: str) -> Any:
+    return ((item.get("analytics") or {}).get(metric) or {}).get("score", "N/A")
+
+
+def _format_location_row(location: Dict[str, Any]) -> str:
+    row = f"**{location.get('name') or 'Unknown'}** ({location.get('code') or 'N/A'}, {(location.get('type') or 'location').lower()})"
+    place = ", ".join(p for p in (location.get('city'), location.get('country')) if p)
+    return f"{row} - {place}" if place else row
+
+
+# Listing intents whose reply is a plain enumeration of the Amadeus result, so they're
+# answered from a template instead of a GPT round-trip.
+# intent_type -> (result list key, heading, empty-result reply, row formatter);
+# heading / empty reply are formatted with the intent params
+LISTING_REPLY_TEMPLATES: Dict[str, Tuple[str, str, str, Callable[[Dict[str, Any]], str]]] = {
+    "airline_lookup": (
+        "airlines",
+        "Here's the airline information I found:",
+        "I couldn't find an airline matching that name or code. Please check the spelling or try the 2-letter airline code (e.g., 'AA').",
+        lambda a: f"**{a.get('name') or a.get('code') or 'Unknown'}** ({a.get('code') or 'N/A'})",
+    ),
+    "airport_routes": (
+        "routes",
+        "Here are the direct destinations from {airport_code}:",
+        "I couldn't find any direct routes from {airport_code}. Please check the airport code and try again.",
+        lambda r: f"**{r.get('destination_name') or r.get('destination')}** ({r.get('destination') or 'N/A'})",
+    ),
+    "location_search": (
+        "locations",
+        "Here are the airports and cities matching \"{keyword}\":",
+        "I couldn't find any airports or cities matching \"{keyword}\". Please try a different name or spelling.",
+        _format_location_row,
+    ),
+    "most_booked_destinations": (
+        "destinations",
+        "Here are the most booked destinations from {origin}:",
+        "I couldn't find booking statistics for {origin}. Please try a different origin city code (e.g., 'NYC').",
+        lambda d: f"**{d.get('destination') or 'Unknown'}** - flights score {_analytics_score(d, 'flights')}, travelers score {_analytics_score(d, 'travelers')}",
+    ),
+    "most_traveled_destinations": (
+        "destinations",
+        "Here are the most traveled destinations from {origin}:",
+        "I couldn't find travel statistics for {origin}. Please try a different origin city code (e.g., 'NYC').",
+        lambda d: f"**{d.get('destination') or 'Unknown'}** - flights score {_analytics_score(d, 'flights')}, travelers score {_analytics_score(d, 'travelers')}",
+    ),
+    "hotel_ratings": (
+        "ratings",
+        "Here are the hotel ratings I found:",
+        "I couldn't find ratings for those hotels. Please check the hotel IDs and try again.",
+        lambda h: f"**{h.get('hotelId') or 'Unknown'}** - overall rating {h.get('overallRating', 'N/A')}/100",
+    ),
+}
+LISTING_REPLY_LIMIT = 10
+
+
+def build_listing_reply(intent_type: str, params: Dict[str, Any], amadeus_data: Dict[str, Any]) -> str:
+    """Templated chat reply for a successful listing intent (returned without calling GPT)"""
+    list_key, heading, empty_reply, format_row = LISTING_REPLY_TEMPLATES[intent_type]
+    fields = defaultdict(str, params)
+    items = amadeus_data.get(list_key) or []
+    if not items:
+        return empty_reply.format_map(fields)
+
+    lines = [f"{i}. {format_row(item)}" for i, item in enumerate(items[:LISTING_REPLY_LIMIT], 1)]
+    if len(items) > LISTING_REPLY_LIMIT:
+        lines.append(f"...and {len(items) - LISTING_REPLY_LIMIT} more.")
+    return heading.format_map(fields) + "\n\n" + "\n".join(lines)
+
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event (serialized with orjson)"""
+    return f"event: {event}\ndata: {orjson.dumps(jsonable_encoder(data), option=orjson.OPT_NON_STR_KEYS).decode()}\n\n"
+
+
+async def _stream_chat_events(meta: Dict[str, Any], system_prompt: str, messages: list, max_tokens: int = DEFAULT_MAX_TOKENS):
+    """
+    SSE stream for /api/chat when req.stream is set:
+    - meta:  session_id / intent_detected / data_fetched / amadeus_data (sent before the LLM starts)
+    - delta: raw text chunks as the completion arrives
+    - done:  the full reply with place-name formatting applied (clients replace the streamed text)
+    - error: the completion failed mid-stream
+    """
+    yield _sse_event("meta", meta)
+    parts = []
+    try:
+        completion = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                *messages
+            ],
+            temperature=0.7,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        async for chunk in completion:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                parts.append(content)
+                yield _sse_event("delta", {"content": content})
+    except Exception as e:
+        logger.error("OpenAI streaming error: %s", e)
+        yield _sse_event("error", {"reply": "I'm sorry, I'm having trouble processing your request right now. Please try again."})
+        return
+    
+    reply = "".join(parts)
+    logger.info("Generated reply (streamed): %s...", reply[:100])
+    yield _sse_event("done", {"reply": format_place_names(reply)})
+
+
+@app.post("/api/chat")
+async def chat(req: ChatRequest):
+    preamble_task = None
+    try:
+        
+        # Normalize preference weights once per request: a key-ordered tuple is the canonical
+        # form (stable cache key), the dict view is what the scoring helpers take
+        pref_vec = tuple(sorted((k, float(v)) for k, v in req.preferences.items())) if req.preferences else ()
+        preferences = dict(pref_vec) if pref_vec else None
+        
+        # ADD: End-to-end trace of preferences from FE → BE
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PREF_TRACE] ═══ PREFERENCES FLOW TRACE (FE → BE) ═══")
+            logger.debug("[PREF_TRACE] Received request with preferences: %s", preferences)
+            if preferences:
+                logger.debug("[PREF_TRACE] Preferences keys: %s", list(preferences))
+                raw_budget = preferences.get('budget', 0)
+                raw_quality = preferences.get('quality', 0)
+                raw_convenience = preferences.get('convenience', 0)
+                total_raw = raw_budget + raw_quality + raw_convenience
+                logger.debug("[PREF_TRACE] Raw values: budget=%s, quality=%s, convenience=%s", raw_budget, raw_quality, raw_convenience)
+                logger.debug("[PREF_TRACE] Sum check: %.3f + %.3f + %.3f = %.3f", raw_budget, raw_quality, raw_convenience, total_raw)
+            else:
+                logger.debug("[PREF_TRACE] ⚠️ No preferences in request body!")
+        
+        # Validate that we have messages
+        if not req.messages or len(req.messages) == 0:
+            raise HTTPException(status_code=400, detail="No messages provided")
+        
+        # Make sure the last message is from the user
+        if req.messages[-1]["role"] != "user":
+            raise HTTPException(status_code=400, detail="Last message must be from user")
+        
+        # The context-only part of the system prompt doesn't depend on intent detection or the
+        # Amadeus fetch, so build it in a worker thread while those run
+        preamble_task = asyncio.create_task(asyncio.to_thread(build_prompt_preamble, req.context))
+        
+        # Generate session ID if not provided
+        session_id = req.session_id or str(uuid.uuid4())
+        
+        # Get the user's latest message
+        user_message = req.messages[-1]["content"]
+        
+        # Check activity keywords, flight keywords and any price cap in a single pass.
+        # Activity context is prioritized over generic travel keywords downstream.
+        has_activity_keywords, has_flight_keywords, message_max_price = _scan_message_signals(user_message.lower())
+        logger.info("Activity keyword check: %s", has_activity_keywords)
+        logger.info("Flight keyword check: %s", has_flight_keywords)
+        
+        # Use intent detection for proper parsing
+        logger.info("Processing message for session %s: %s...", session_id, user_message[:100])
+        
         # Extract context variables from request
         now_iso = req.context.now_iso if req.context else None
         user_tz = req.context.user_tz if req.context else None
@@ -2783,8 +3480,8 @@ async def chat(req: ChatRequest):
                     'user_location': user_location
                 }
                 raw_intent_data = await intent_detector.analyze_message(user_message, req.messages, context)
-                logger.info(f"Raw intent detection result: type={raw_intent_data['type']}, confidence={raw_intent_data['confidence']}, has_required_params={raw_intent_data['has_required_params']}")
-                logger.info(f"Extracted parameters: {raw_intent_data['params']}")
+                logger.info("Raw intent detection result: type=%s, confidence=%s, has_required_params=%s", raw_intent_data['type'], raw_intent_data['confidence'], raw_intent_data['has_required_params'])
+                logger.info("Extracted parameters: %s", raw_intent_data['params'])
                 
                 # Apply intent overrides to ensure correct routing
                 raw_intent_type = raw_intent_data['type']
@@ -2792,18 +3489,17 @@ async def chat(req: ChatRequest):
                 
                 # Update intent type if override was applied
                 if final_intent_type != raw_intent_type:
-                    logger.info(f"[INTENT_OVERRIDE] Changed intent from '{raw_intent_type}' to '{final_intent_type}'")
+                    logger.info("[INTENT_OVERRIDE] Changed intent from '%s' to '%s'", raw_intent_type, final_intent_type)
                     raw_intent_data['type'] = final_intent_type
                 
                 intent = raw_intent_data
-                logger.info(f"Final intent after overrides: type={intent['type']}, confidence={intent['confidence']}, has_required_params={intent['has_required_params']}")
+                logger.info("Final intent after overrides: type=%s, confidence=%s, has_required_params=%s", intent['type'], intent['confidence'], intent['has_required_params'])
                 
                 # Check conversation context to override incorrect intent detection
                 # Priority: If activity keywords are present OR previous context is about activities
                 should_override_to_activity = False
                 destination = None
                 max_price = None
-                import re
                 
                 if len(req.messages) >= 2:
                     previous_assistant_msg = None
@@ -2835,7 +3531,7 @@ async def chat(req: ChatRequest):
                     if (previous_context_is_activity and has_activity_refinement) or has_activity_keywords:
                         if intent["type"] != "activity_search" or not intent.get("has_required_params"):
                             should_override_to_activity = True
-                            logger.info(f"[MAIN] Should override to activity_search - previous_context: {previous_context_is_activity}, has_activity_refinement: {has_activity_refinement}, has_activity_keywords: {has_activity_keywords}")
+                            logger.info("[MAIN] Should override to activity_search - previous_context: %s, has_activity_refinement: %s, has_activity_keywords: %s", previous_context_is_activity, has_activity_refinement, has_activity_keywords)
                     
                     if should_override_to_activity:
                         # Try to extract destination from previous assistant message
@@ -2877,17 +3573,8 @@ async def chat(req: ChatRequest):
                                     if destination:
                                         break
                         
-                        # Extract max_price if mentioned (handle both $20 and "below $20", "under 20")
-                        price_patterns = [
-                            r'\$(\d+)',
-                            r'(?:below|under|less than|cheaper than)\s+\$?(\d+)',
-                            r'\$?(\d+)\s+(?:or less|or under|or below)'
-                        ]
-                        for pattern in price_patterns:
-                            price_match = re.search(pattern, user_message.lower())
-                            if price_match:
-                                max_price = int(price_match.group(1))
-                                break
+                        # max_price comes from the signal scan ("$20", "below $20", "under 20", "20 or less")
+                        max_price = message_max_price
                         
                         # Always set has_required_params to True since we have a default destination
                         final_destination = destination or "Barcelona"
@@ -2900,14 +3587,20 @@ async def chat(req: ChatRequest):
                             },
                             "has_required_params": True  # Always True since we have destination (default or extracted)
                         }
-                        logger.info(f"[MAIN] Overridden intent to activity_search: destination={final_destination}, max_price={max_price}, has_required_params=True")
+                        logger.info("[MAIN] Overridden intent to activity_search: destination=%s, max_price=%s, has_required_params=True", final_destination, max_price)
             except Exception as e:
-                logger.error(f"Intent detection failed: {e}")
+                logger.error("Intent detection failed: %s", e)
                 intent = {"type": "general", "confidence": 0.0, "has_required_params": False, "params": {}}
         else:
             intent = {"type": "general", "confidence": 0.0, "has_required_params": False, "params": {}}
         
+        params = intent["params"]
+        itype = intent["type"]
+        
         amadeus_data = None
+        # Set only when amadeus_data comes from this intent's INTENT_HANDLERS entry (fresh or cached);
+        # the flight-keyword branch can fill amadeus_data with flight results for any intent
+        from_intent_handler = False
         
         # Initialize route variables for system prompt
         route_origin = None
@@ -2918,18 +3611,18 @@ async def chat(req: ChatRequest):
         # Always fetch flight data if flight keywords are detected, regardless of intent detection
         # BUT skip if we've determined it should be activity_search
         route_info_extracted = None  # Store extracted route info for fallback
-        if has_flight_keywords and intent.get("type") != "activity_search":
+        if has_flight_keywords and itype != "activity_search":
             logger.info("Flight keywords detected - using intent detection for route and dates")
             
             # Use intent detection results if available, otherwise fallback to extraction
-            if intent["type"] == "flight_search" and intent["has_required_params"]:
+            if itype == "flight_search" and intent["has_required_params"]:
                 logger.info("Using intent detection results for flight search")
-                origin = intent["params"].get("origin", "")
-                destination = intent["params"].get("destination", "")
-                departure_date = intent["params"].get("departure_date", "")
-                return_date = intent["params"].get("return_date")
-                adults = intent["params"].get("adults", 1)
-                max_price = intent["params"].get("max_price")
+                origin = params.get("origin", "")
+                destination = params.get("destination", "")
+                departure_date = params.get("departure_date", "")
+                return_date = params.get("return_date")
+                adults = params.get("adults", 1)
+                max_price = params.get("max_price")
                 
                 # Store for system prompt
                 route_origin = origin
@@ -2940,11 +3633,11 @@ async def chat(req: ChatRequest):
                 logger.info("Intent detection incomplete - falling back to message extraction")
                 # Extract route information from the user's message
                 route_info_extracted = extract_route_from_message(user_message)
-                logger.info(f"Extracted route info: {route_info_extracted}")
+                logger.info("Extracted route info: %s", route_info_extracted)
                 
                 # Extract dates from the user's message
                 date_info = extract_dates_from_message(user_message)
-                logger.info(f"Extracted date info: {date_info}")
+                logger.info("Extracted date info: %s", date_info)
                 
                 # Combine route and date information
                 if route_info_extracted:
@@ -2968,147 +3661,50 @@ async def chat(req: ChatRequest):
                 try:
                     # Validate dates before API call
                     try:
-                        parsed_date = datetime.strptime(departure_date, "%Y-%m-%d")
+                        parsed_date = datetime.strptime(departure_date, REQUEST_DATE_FORMAT)
                         if parsed_date < datetime.now():
-                            logger.warning(f"[MAIN] ⚠️ Departure date {departure_date} is in the past! This will cause API error.")
+                            logger.warning("[MAIN] ⚠️ Departure date %s is in the past! This will cause API error.", departure_date)
                     except ValueError:
-                        logger.warning(f"[MAIN] ⚠️ Invalid departure date format: {departure_date}")
-                    
-                    # Check if origin needs airport code conversion and find all airports
-                    origin_airports = []
-                    if not _is_iata_code(origin):
-                        logger.info(f"[MAIN] Converting origin '{origin}' to IATA code(s)")
-                        location_result = amadeus_service.get_airport_city_search(keyword=origin)
-                        if location_result and not location_result.get('error') and location_result.get('locations'):
-                            airports = [loc for loc in location_result['locations'] if loc.get('type') == 'AIRPORT']
-                            if airports:
-                                origin_airports = [a.get('code') for a in airports if a.get('code')]
-                                logger.info(f"[MAIN] Found {len(origin_airports)} airports for {origin}: {origin_airports}")
-                            else:
-                                # No airports found, use first location
-                                origin_airports = [location_result['locations'][0].get('code', origin)]
-                    else:
-                        origin_airports = [origin]
+                        logger.warning("[MAIN] ⚠️ Invalid departure date format: %s", departure_date)
                     
-                    # Check if destination needs airport code conversion and find all airports
-                    dest_airports = []
-                    if not _is_iata_code(destination):
-                        logger.info(f"[MAIN] Converting destination '{destination}' to IATA code(s)")
-                        location_result = amadeus_service.get_airport_city_search(keyword=destination)
-                        if location_result and not location_result.get('error') and location_result.get('locations'):
-                            airports = [loc for loc in location_result['locations'] if loc.get('type') == 'AIRPORT']
-                            if airports:
-                                dest_airports = [a.get('code') for a in airports if a.get('code')]
-                                logger.info(f"[MAIN] Found {len(dest_airports)} airports for {destination}: {dest_airports}")
-                            else:
-                                dest_airports = [location_result['locations'][0].get('code', destination)]
-                    else:
-                        dest_airports = [destination]
+                    # Resolve origin and destination airports concurrently (independent lookups)
+                    origin_airports, dest_airports = await asyncio.gather(
+                        asyncio.to_thread(_resolve_airport_codes, origin),
+                        asyncio.to_thread(_resolve_airport_codes, destination)
+                    )
                     
                     # Search flights from all origin airports to all destination airports
-                    all_flights = []
-                    total_searches = len(origin_airports) * len(dest_airports)
-                    
-                    if total_searches > 1:
-                        logger.info(f"[MAIN] Searching {total_searches} airport combinations in parallel...")
-                        # Use ThreadPoolExecutor for parallel API calls
-                        with ThreadPoolExecutor(max_workers=min(6, total_searches)) as executor:
-                            future_to_route = {}
-                            for orig_airport in origin_airports:
-                                for dest_airport in dest_airports:
-                                    future = executor.submit(
-                                        amadeus_service.search_flights,
-                                        origin=orig_airport,
-                                        destination=dest_airport,
-                                        departure_date=departure_date,
-                                        return_date=return_date,
-                                        adults=adults,
-                                        max_price=max_price
-                                    )
-                                    future_to_route[future] = (orig_airport, dest_airport)
-                            
-                            for future in as_completed(future_to_route):
-                                orig_airport, dest_airport = future_to_route[future]
-                                try:
-                                    airport_flights = future.result()
-                                    if airport_flights and not airport_flights.get('error') and airport_flights.get('flights'):
-                                        # Add airport info to each flight for tracking
-                                        for flight in airport_flights['flights']:
-                                            flight['_origin_airport'] = orig_airport
-                                            flight['_destination_airport'] = dest_airport
-                                        all_flights.extend(airport_flights['flights'])
-                                        logger.info(f"[MAIN] Found {len(airport_flights['flights'])} flights from {orig_airport} to {dest_airport}")
-                                    else:
-                                        logger.info(f"[MAIN] No flights found from {orig_airport} to {dest_airport}")
-                                except Exception as e:
-                                    logger.error(f"[MAIN] Error searching {orig_airport} -> {dest_airport}: {e}")
-                        
-                        # Combine all results
-                        if all_flights:
-                            amadeus_data = {
-                                "flights": all_flights,
-                                "count": len(all_flights),
-                                "_multi_airport_search": True,
-                                "_origin_airports": origin_airports,
-                                "_destination_airports": dest_airports
-                            }
-                            # Use first airport codes for display
-                            origin = origin_airports[0]
-                            destination = dest_airports[0]
-                            logger.info(f"[MAIN] Combined results: {len(all_flights)} total flights from {len(origin_airports)} origin(s) to {len(dest_airports)} destination(s)")
-                        else:
-                            # Fallback to single search if no results
-                            logger.warning(f"[MAIN] No flights found from any airport combination, using first airports")
-                            origin = origin_airports[0]
-                            destination = dest_airports[0]
-                            amadeus_data = amadeus_service.search_flights(
-                                origin=origin,
-                                destination=destination,
-                                departure_date=departure_date,
-                                return_date=return_date,
-                                adults=adults,
-                                max_price=max_price
-                            )
-                    else:
-                        # Single airport search
-                        origin = origin_airports[0]
-                        destination = dest_airports[0]
-                        logger.info(f"[MAIN] Calling Amadeus API: {origin} -> {destination} on {departure_date}")
-                        amadeus_data = amadeus_service.search_flights(
-                            origin=origin,
-                            destination=destination,
-                            departure_date=departure_date,
-                            return_date=return_date,
-                            adults=adults,
-                            max_price=max_price
-                        )
+                    amadeus_data, origin, destination = await asyncio.to_thread(
+                        _search_flights_across_airports,
+                        origin_airports, dest_airports,
+                        departure_date, return_date, adults, max_price, "[MAIN] "
+                    )
                     
-                    logger.info(f"[MAIN] Amadeus API returned: {amadeus_data.get('count', 0) if amadeus_data else 0} flights")
+                    logger.info("[MAIN] Amadeus API returned: %s flights", amadeus_data.get('count', 0) if amadeus_data else 0)
                     
                     # Log whether we got real data or error
                     if amadeus_data and not amadeus_data.get('error'):
-                        logger.info(f"[MAIN] ✅ Using REAL Amadeus data - {len(amadeus_data.get('flights', []))} flights")
+                        logger.info("[MAIN] ✅ Using REAL Amadeus data - %s flights", len(amadeus_data.get('flights', [])))
                         if amadeus_data.get('flights'):
                             first_flight = amadeus_data['flights'][0]
-                            logger.info(f"[MAIN] First flight sample: Price={first_flight.get('price')}, Currency={first_flight.get('currency')}")
+                            logger.info("[MAIN] First flight sample: Price=%s, Currency=%s", first_flight.get('price'), first_flight.get('currency'))
                         
                         # Convert flights format to outboundFlights/returnFlights format if needed
                         if 'flights' in amadeus_data and 'outboundFlights' not in amadeus_data:
                             logger.info("[MAIN] Converting flights format to outboundFlights/returnFlights format")
-                            from services.flight_formatter import format_flight_for_dashboard
                             
                             # Get city names for display
                             origin_city = route_info_extracted.get('departure', origin) if route_info_extracted else origin
                             destination_city = route_info_extracted.get('destination', destination) if route_info_extracted else destination
                             
                             # Get user preferences if available
-                            user_prefs = req.preferences if req.preferences else None
+                            user_prefs = preferences
                             if user_prefs:
-                                logger.info(f"[MAIN] Using user preferences for sorting: {user_prefs}")
-                                logger.info(f"[MAIN] Preferences type: {type(user_prefs)}, keys: {user_prefs.keys() if isinstance(user_prefs, dict) else 'N/A'}")
-                                logger.info(f"[MAIN] Preferences values: budget={user_prefs.get('budget') if isinstance(user_prefs, dict) else 'N/A'}, quality={user_prefs.get('quality') if isinstance(user_prefs, dict) else 'N/A'}, convenience={user_prefs.get('convenience') if isinstance(user_prefs, dict) else 'N/A'}")
+                                logger.info("[MAIN] Using user preferences for sorting: %s", user_prefs)
+                                logger.info("[MAIN] Preferences type: %s, keys: %s", type(user_prefs), user_prefs.keys() if isinstance(user_prefs, dict) else 'N/A')
+                                logger.info("[MAIN] Preferences values: budget=%s, quality=%s, convenience=%s", user_prefs.get('budget') if isinstance(user_prefs, dict) else 'N/A', user_prefs.get('quality') if isinstance(user_prefs, dict) else 'N/A', user_prefs.get('convenience') if isinstance(user_prefs, dict) else 'N/A')
                             else:
-                                logger.warning(f"[MAIN] ⚠️ No user preferences provided! req.preferences = {req.preferences}")
+                                logger.warning("[MAIN] ⚠️ No user preferences provided!")
                             
                             try:
                                 formatted_data = format_flight_for_dashboard(
@@ -3125,17 +3721,17 @@ async def chat(req: ChatRequest):
                                 # Update amadeus_data with formatted data
                                 amadeus_data['outboundFlights'] = formatted_data.get('outboundFlights', [])
                                 amadeus_data['returnFlights'] = formatted_data.get('returnFlights', [])
-                                logger.info(f"[MAIN] Converted to {len(amadeus_data['outboundFlights'])} outbound and {len(amadeus_data.get('returnFlights', []))} return flights")
+                                logger.info("[MAIN] Converted to %s outbound and %s return flights", len(amadeus_data['outboundFlights']), len(amadeus_data.get('returnFlights', [])))
                             except Exception as e:
-                                logger.error(f"[MAIN] Error converting flight data format: {e}")
+                                logger.error("[MAIN] Error converting flight data format: %s", e)
                                 # Keep original format if conversion fails
                         
                         # Mark that we have real data to prevent mock data generation
                         amadeus_data['_is_real_data'] = True
                     else:
-                        logger.warning(f"[MAIN] ⚠️ Amadeus API returned error: {amadeus_data.get('error', 'Unknown error')}")
+                        logger.warning("[MAIN] ⚠️ Amadeus API returned error: %s", amadeus_data.get('error', 'Unknown error'))
                 except Exception as e:
-                    logger.error(f"[MAIN] Amadeus API call failed: {e}")
+                    logger.error("[MAIN] Amadeus API call failed: %s", e)
                     amadeus_data = {"error": f"API call failed: {str(e)}"}
             else:
                 logger.warning("[MAIN] Missing required parameters for Amadeus API call")
@@ -3147,422 +3743,44 @@ async def chat(req: ChatRequest):
                 else:
                     amadeus_data = {"error": "Missing required parameters. Please provide origin, destination, and departure date."}
         # If travel intent detected and has required parameters, fetch data
-        elif intent["type"] != "general" and intent["has_required_params"] and intent["confidence"] > 0.5:
-            logger.info(f"Detected {intent['type']} intent with confidence {intent['confidence']}")
+        elif itype != "general" and intent["has_required_params"] and intent["confidence"] > 0.5:
+            logger.info("Detected %s intent with confidence %s", itype, intent['confidence'])
             
             # Check cache first
-            cache_key_params = intent["params"].copy()
-            cache_key_params["type"] = intent["type"]
+            cache_key_params = params.copy()
+            cache_key_params["type"] = itype
+            # Hotel/activity results are re-ranked by preference weights, so they are part of the key
+            cache_key_params["preferences"] = pref_vec
             
-            cached_data = cache_manager.get(session_id, intent["type"], cache_key_params)
+            cached_data = cache_manager.get(session_id, itype, cache_key_params)
             
             if cached_data:
                 logger.info("Using cached data")
                 amadeus_data = cached_data
+                from_intent_handler = True
             else:
                 logger.info("Fetching fresh data from Amadeus API")
                 try:
-                    # Call appropriate Amadeus API based on intent
-                    if intent["type"] == "flight_search":
-                        logger.info(f"Calling flight search with params: {intent['params']}")
-                        
-                        # Validate required parameters before API call
-                        origin = intent["params"].get("origin", "")
-                        destination = intent["params"].get("destination", "")
-                        departure_date = intent["params"].get("departure_date", "")
-                        
-                        # Check for missing required parameters
-                        if not origin or not destination:
-                            logger.warning(f"Missing origin or destination: origin={origin}, destination={destination}")
-                            amadeus_data = {"error": "Missing origin or destination. Please provide both origin and destination cities (e.g., 'flights from New York to Paris')."}
-                        elif not departure_date:
-                            logger.warning(f"Missing departure date: departure_date={departure_date}")
-                            amadeus_data = {"error": "Missing departure date. Please provide a departure date (e.g., 'November 3rd' or '11/03/2024')."}
-                        else:
-                            # Check if origin needs airport code conversion and find all airports
-                            origin_airports = []
-                            if not _is_iata_code(origin):
-                                logger.info(f"Converting origin '{origin}' to IATA code(s)")
-                                location_result = amadeus_service.get_airport_city_search(keyword=origin)
-                                if location_result and not location_result.get('error') and location_result.get('locations'):
-                                    airports = [loc for loc in location_result['locations'] if loc.get('type') == 'AIRPORT']
-                                    if airports:
-                                        origin_airports = [a.get('code') for a in airports if a.get('code')]
-                                        logger.info(f"Found {len(origin_airports)} airports for {origin}: {origin_airports}")
-                                    else:
-                                        origin_airports = [location_result['locations'][0].get('code', origin)]
-                            else:
-                                origin_airports = [origin]
-                            
-                            # Check if destination needs airport code conversion and find all airports
-                            dest_airports = []
-                            if not _is_iata_code(destination):
-                                logger.info(f"Converting destination '{destination}' to IATA code(s)")
-                                location_result = amadeus_service.get_airport_city_search(keyword=destination)
-                                if location_result and not location_result.get('error') and location_result.get('locations'):
-                                    airports = [loc for loc in location_result['locations'] if loc.get('type') == 'AIRPORT']
-                                    if airports:
-                                        dest_airports = [a.get('code') for a in airports if a.get('code')]
-                                        logger.info(f"Found {len(dest_airports)} airports for {destination}: {dest_airports}")
-                                    else:
-                                        dest_airports = [location_result['locations'][0].get('code', destination)]
-                            else:
-                                dest_airports = [destination]
-                            
-                            # Search flights from all origin airports to all destination airports
-                            all_flights = []
-                            total_searches = len(origin_airports) * len(dest_airports)
-                            
-                            if total_searches > 1:
-                                logger.info(f"Searching {total_searches} airport combinations in parallel...")
-                                # Use ThreadPoolExecutor for parallel API calls
-                                with ThreadPoolExecutor(max_workers=min(6, total_searches)) as executor:
-                                    future_to_route = {}
-                                    for orig_airport in origin_airports:
-                                        for dest_airport in dest_airports:
-                                            future = executor.submit(
-                                                amadeus_service.search_flights,
-                                                origin=orig_airport,
-                                                destination=dest_airport,
-                                                departure_date=departure_date,
-                                                return_date=intent["params"].get("return_date"),
-                                                adults=intent["params"].get("adults", 1),
-                                                max_price=intent["params"].get("max_price")
-                                            )
-                                            future_to_route[future] = (orig_airport, dest_airport)
-                                    
-                                    for future in as_completed(future_to_route):
-                                        orig_airport, dest_airport = future_to_route[future]
-                                        try:
-                                            airport_flights = future.result()
-                                            if airport_flights and not airport_flights.get('error') and airport_flights.get('flights'):
-                                                # Add airport info to each flight for tracking
-                                                for flight in airport_flights['flights']:
-                                                    flight['_origin_airport'] = orig_airport
-                                                    flight['_destination_airport'] = dest_airport
-                                                all_flights.extend(airport_flights['flights'])
-                                                logger.info(f"Found {len(airport_flights['flights'])} flights from {orig_airport} to {dest_airport}")
-                                            else:
-                                                logger.info(f"No flights found from {orig_airport} to {dest_airport}")
-                                        except Exception as e:
-                                            logger.error(f"Error searching {orig_airport} -> {dest_airport}: {e}")
-                                
-                                # Combine all results
-                                if all_flights:
-                                    amadeus_data = {
-                                        "flights": all_flights,
-                                        "count": len(all_flights),
-                                        "_multi_airport_search": True,
-                                        "_origin_airports": origin_airports,
-                                        "_destination_airports": dest_airports
-                                    }
-                                    # Use first airport codes for display
-                                    origin = origin_airports[0]
-                                    destination = dest_airports[0]
-                                    logger.info(f"Combined results: {len(all_flights)} total flights from {len(origin_airports)} origin(s) to {len(dest_airports)} destination(s)")
-                                else:
-                                    # Fallback to single search if no results
-                                    logger.warning(f"No flights found from any airport combination, using first airports")
-                                    origin = origin_airports[0]
-                                    destination = dest_airports[0]
-                                    amadeus_data = amadeus_service.search_flights(
-                                        origin=origin,
-                                        destination=destination,
-                                        departure_date=departure_date,
-                                        return_date=intent["params"].get("return_date"),
-                                        adults=intent["params"].get("adults", 1),
-                                        max_price=intent["params"].get("max_price")
-                                    )
-                            else:
-                                # Single airport search
-                                origin = origin_airports[0]
-                                destination = dest_airports[0]
-                                amadeus_data = amadeus_service.search_flights(
-                                    origin=origin,
-                                    destination=destination,
-                                    departure_date=departure_date,
-                                    return_date=intent["params"].get("return_date"),
-                                    adults=intent["params"].get("adults", 1),
-                                    max_price=intent["params"].get("max_price")
-                                )
-                            
-                            logger.info(f"Amadeus flight search returned count={(amadeus_data or {}).get('count')} for {origin}->{destination}")
-                    elif intent["type"] == "hotel_search":
-                        logger.info(f"Calling hotel search with params: {intent['params']}")
-                        amadeus_data = amadeus_service.search_hotels(
-                            city_code=intent["params"]["destination"],
-                            check_in=intent["params"]["check_in"],
-                            check_out=intent["params"]["check_out"],
-                            adults=intent["params"].get("adults", 1),
-                            radius=intent["params"].get("radius", 50),
-                            price_range=intent["params"].get("price_range")
-                        )
-                        if amadeus_data and amadeus_data.get('hotels') and req.preferences:
-                            amadeus_data['hotels'] = apply_preference_weights_to_hotels(
-                                amadeus_data['hotels'],
-                                req.preferences,
-                                context_label="chat"
-                            )
-                            amadeus_data['_preference_weights'] = req.preferences
-                        logger.info(f"Amadeus hotel search returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "activity_search":
-                        logger.info(f"Calling activity search with params: {intent['params']}")
-                        # ADD: Log preferences before activity search
-                        logger.info(f"[PREF_TRACE] Activity search detected. Preferences for scoring: {req.preferences}")
-                        if req.preferences:
-                            logger.info(f"[PREF_TRACE] ✅ Preferences will be applied to activities: budget={req.preferences.get('budget', 0):.3f}, quality={req.preferences.get('quality', 0):.3f}, convenience={req.preferences.get('convenience', 0):.3f}")
-                        else:
-                            logger.warning(f"[PREF_TRACE] ⚠️ No preferences available for activity scoring!")
-                        
-                        if "latitude" in intent["params"] and "longitude" in intent["params"]:
-                            # Direct coordinate search
-                            amadeus_data = amadeus_service.search_activities(
-                                latitude=float(intent["params"]["latitude"]),
-                                longitude=float(intent["params"]["longitude"]),
-                                radius=intent["params"].get("radius", 1)
-                            )
-                        elif "destination" in intent["params"]:
-                            # City-based search - convert city name to coordinates
-                            city_name = intent["params"]["destination"]
-                            logger.info(f"[ACTIVITY_SEARCH] Converting city name '{city_name}' to coordinates")
-                            coordinates = amadeus_service.get_city_coordinates(city_name)
-                            
-                            if coordinates:
-                                lat, lon = coordinates
-                                logger.info(f"[ACTIVITY_SEARCH] Found coordinates for {city_name}: {lat}, {lon}")
-                                amadeus_data = amadeus_service.search_activities(
-                                    latitude=lat,
-                                    longitude=lon,
-                                    radius=intent["params"].get("radius", 1)
-                                )
-                            else:
-                                logger.error(f"[ACTIVITY_SEARCH] Could not find coordinates for city: {city_name}")
-                                logger.error(f"[ACTIVITY_SEARCH] Intent params: {intent.get('params')}")
-                                amadeus_data = {"error": f"Could not find location coordinates for {city_name}"}
-                        else:
-                            logger.warning("Activity search requires coordinates or destination city")
-                            amadeus_data = {"error": "Activity search requires location coordinates or a destination city name"}
-                        
-                        # Apply preference filters to activities
-                        if amadeus_data and amadeus_data.get('activities'):
-                            # ADD: Log before passing to scoring function
-                            logger.info(f"[PREF_TRACE] Passing {len(amadeus_data['activities'])} activities to scoring function with preferences: {req.preferences}")
-                            
-                            # Calculate trip duration from dates if available
-                            trip_duration_days = None
-                            
-                            # Try to get dates from intent params (check_in/check_out or departure_date/return_date)
-                            check_in = intent["params"].get("check_in")
-                            check_out = intent["params"].get("check_out")
-                            departure_date = intent["params"].get("departure_date")
-                            return_date = intent["params"].get("return_date")
-                            
-                            try:
-                                if check_in and check_out:
-                                    check_in_dt = datetime.strptime(check_in, "%Y-%m-%d")
-                                    check_out_dt = datetime.strptime(check_out, "%Y-%m-%d")
-                                    trip_duration_days = (check_out_dt - check_in_dt).days
-                                elif departure_date and return_date:
-                                    dep_dt = datetime.strptime(departure_date, "%Y-%m-%d")
-                                    ret_dt = datetime.strptime(return_date, "%Y-%m-%d")
-                                    trip_duration_days = (ret_dt - dep_dt).days
-                            except (ValueError, TypeError) as date_error:
-                                logger.debug(f"[ACTIVITY_FILTER] Could not parse dates for trip duration: {date_error}")
-                            
-                            # Apply filters and scoring
-                            logger.info(f"[ACTIVITY_SEARCH] Applying preference filters. Activities count before: {len(amadeus_data['activities'])}, preferences: {req.preferences}")
-                            amadeus_data['activities'] = apply_preference_filters_to_activities(
-                                amadeus_data['activities'],
-                                preferences=req.preferences,
-                                trip_duration_days=trip_duration_days,
-                                context_label="chat"
-                            )
-                            logger.info(f"[ACTIVITY_SEARCH] After preference filtering. Activities count: {len(amadeus_data['activities'])}")
-                            
-                            if req.preferences:
-                                amadeus_data['_preference_weights'] = req.preferences
-                                logger.info(f"[ACTIVITY_SEARCH] Preference weights saved: {req.preferences}")
-                            else:
-                                logger.warning(f"[ACTIVITY_SEARCH] ⚠️ No preferences in request! req.preferences = {req.preferences}")
-                            if trip_duration_days is not None:
-                                amadeus_data['_trip_duration_days'] = trip_duration_days
-                            
-                            # Generate fixed header template (not from GPT)
-                            destination_city = intent["params"].get("destination", "your destination")
-                            amadeus_data['_header_title'] = f"Top activities in {destination_city}"
-                            amadeus_data['_subtitle'] = "Ranked by how well they match your preferences."
-                        
-                        logger.info(f"Amadeus activity search returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "flight_inspiration":
-                        logger.info(f"Calling flight inspiration with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_flight_inspiration(
-                            origin=intent["params"]["origin"],
-                            max_price=intent["params"].get("max_price"),
-                            departure_date=intent["params"].get("departure_date")
-                        )
-                        logger.info(f"Amadeus flight inspiration returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "location_search":
-                        logger.info(f"Calling location search with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_airport_city_search(
-                            keyword=intent["params"]["keyword"]
-                        )
-                        logger.info(f"Amadeus location search returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "travel_recommendations":
-                        logger.info(f"Calling travel recommendations with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_travel_recommendations(
-                            origin=intent["params"].get("origin", ""),
-                            destination=intent["params"].get("destination")
-                        )
-                        logger.info(f"Amadeus travel recommendations returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "travel_restrictions":
-                        logger.info(f"Calling travel restrictions with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_travel_restrictions(
-                            origin=intent["params"].get("origin", ""),
-                            destination=intent["params"].get("destination", "")
-                        )
-                        logger.info(f"Amadeus travel restrictions returned")
-                    elif intent["type"] == "flight_status":
-                        logger.info(f"Calling flight status with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_on_demand_flight_status(
-                            carrier_code=intent["params"].get("carrier_code", ""),
-                            flight_number=intent["params"].get("flight_number", ""),
-                            scheduled_departure_date=intent["params"].get("scheduled_departure_date", "")
-                        )
-                        logger.info(f"Amadeus flight status returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "airport_performance":
-                        logger.info(f"Calling airport performance with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_airport_on_time_performance(
-                            airport_code=intent["params"].get("airport_code", ""),
-                            date=intent["params"].get("date", "")
-                        )
-                        logger.info(f"Amadeus airport performance returned")
-                    elif intent["type"] == "points_of_interest":
-                        logger.info(f"Calling points of interest with params: {intent['params']}")
-                        # For GENERAL_ACTIVITIES or general activity searches, use activity_search API instead
-                        # This avoids PRIVATE_CAR category restriction and uses the standard activities API
-                        if "latitude" in intent["params"] and "longitude" in intent["params"]:
-                            # Use activity_search API instead of points_of_interest for general activities
-                            amadeus_data = amadeus_service.search_activities(
-                                latitude=float(intent["params"]["latitude"]),
-                                longitude=float(intent["params"]["longitude"]),
-                                radius=intent["params"].get("radius", 1)
-                            )
-                            # Generate fixed header template (use destination if available, otherwise generic)
-                            if amadeus_data and not amadeus_data.get('error'):
-                                destination_city = intent["params"].get("destination", "your destination")
-                                amadeus_data['_header_title'] = f"Top activities in {destination_city}"
-                                amadeus_data['_subtitle'] = "Ranked by how well they match your preferences."
-                            logger.info(f"Using activity_search API instead of points_of_interest (GENERAL_ACTIVITIES)")
-                        elif "destination" in intent["params"]:
-                            # City-based search - convert city name to coordinates
-                            city_name = intent["params"]["destination"]
-                            logger.info(f"Converting city name '{city_name}' to coordinates for activity search")
-                            coordinates = amadeus_service.get_city_coordinates(city_name)
-                            
-                            if coordinates:
-                                lat, lon = coordinates
-                                logger.info(f"Found coordinates for {city_name}: {lat}, {lon}")
-                                amadeus_data = amadeus_service.search_activities(
-                                    latitude=lat,
-                                    longitude=lon,
-                                    radius=intent["params"].get("radius", 1)
-                                )
-                            else:
-                                logger.warning(f"Could not find coordinates for city: {city_name}")
-                                amadeus_data = {"error": f"Could not find location coordinates for {city_name}"}
-                        else:
-                            # Fallback to original points_of_interest API (but exclude PRIVATE_CAR)
-                            categories = intent["params"].get("categories", [])
-                            if isinstance(categories, str):
-                                categories = [c.strip() for c in categories.split(",")]
-                            # Exclude PRIVATE_CAR category
-                            if categories:
-                                categories = [c for c in categories if c.upper() != "PRIVATE_CAR"]
-                        amadeus_data = amadeus_service.get_points_of_interest(
-                            latitude=float(intent["params"].get("latitude", 0)),
-                            longitude=float(intent["params"].get("longitude", 0)),
-                            radius=intent["params"].get("radius", 2),
-                                categories=categories if categories else None
-                        )
-                        logger.info(f"Amadeus activity search returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "most_booked_destinations":
-                        logger.info(f"Calling most booked destinations with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_flight_most_booked_destinations(
-                            origin=intent["params"].get("origin", ""),
-                            period=intent["params"].get("period", "2024")
-                        )
-                        logger.info(f"Amadeus most booked destinations returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "most_traveled_destinations":
-                        logger.info(f"Calling most traveled destinations with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_flight_most_traveled_destinations(
-                            origin=intent["params"].get("origin", ""),
-                            period=intent["params"].get("period", "2024")
-                        )
-                        logger.info(f"Amadeus most traveled destinations returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "busiest_period":
-                        logger.info(f"Calling busiest period with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_flight_busiest_traveling_period(
-                            origin=intent["params"].get("origin", ""),
-                            destination=intent["params"].get("destination", ""),
-                            period=intent["params"].get("period", "2024")
-                        )
-                        logger.info(f"Amadeus busiest period returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "trip_purpose":
-                        logger.info(f"Calling trip purpose prediction with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_trip_purpose_prediction(
-                            origin=intent["params"].get("origin", ""),
-                            destination=intent["params"].get("destination", ""),
-                            departure_date=intent["params"].get("departure_date", "")
-                        )
-                        logger.info(f"Amadeus trip purpose prediction returned")
-                    elif intent["type"] == "airline_lookup":
-                        logger.info(f"Calling airline lookup with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_airline_code_lookup(
-                            airline_code=intent["params"].get("airline_code"),
-                            airline_name=intent["params"].get("airline_name")
-                        )
-                        logger.info(f"Amadeus airline lookup returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "airport_routes":
-                        logger.info(f"Calling airport routes with params: {intent['params']}")
-                        amadeus_data = amadeus_service.get_airport_routes(
-                            airport_code=intent["params"].get("airport_code", "")
-                        )
-                        logger.info(f"Amadeus airport routes returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "hotel_ratings":
-                        logger.info(f"Calling hotel ratings with params: {intent['params']}")
-                        hotel_ids = intent["params"].get("hotel_ids", [])
-                        if isinstance(hotel_ids, str):
-                            hotel_ids = hotel_ids.split(",")
-                        amadeus_data = amadeus_service.get_hotel_ratings(hotel_ids)
-                        logger.info(f"Amadeus hotel ratings returned count={(amadeus_data or {}).get('count')}")
-                    elif intent["type"] == "transfer_search":
-                        logger.info(f"Calling transfer search with params: {intent['params']}")
-                        amadeus_data = amadeus_service.search_transfers(
-                            origin_lat=float(intent["params"].get("origin_lat", 0)),
-                            origin_lon=float(intent["params"].get("origin_lon", 0)),
-                            destination_lat=float(intent["params"].get("destination_lat", 0)),
-                            destination_lon=float(intent["params"].get("destination_lon", 0)),
-                            departure_date=intent["params"].get("departure_date", ""),
-                            adults=intent["params"].get("adults", 1)
-                        )
-                        logger.info(f"Amadeus transfer search returned count={(amadeus_data or {}).get('count')}")
+                    # Call appropriate Amadeus API based on intent (blocking, so off the event loop)
+                    handler = INTENT_HANDLERS.get(itype)
+                    if handler:
+                        amadeus_data = await asyncio.to_thread(handler, params, preferences)
+                        from_intent_handler = True
                     
                     # Cache the response
                     if amadeus_data and not amadeus_data.get('error'):
-                        cache_manager.set(session_id, intent["type"], cache_key_params, amadeus_data)
-                        logger.info(f"Cached {intent['type']} data for session {session_id}")
+                        cache_manager.set(session_id, itype, cache_key_params, amadeus_data)
+                        logger.info("Cached %s data for session %s", itype, session_id)
                         
                 except Exception as e:
-                    logger.error(f"Amadeus API call failed: {e}")
+                    logger.error("Amadeus API call failed: %s", e)
                     amadeus_data = {"error": f"API call failed: {str(e)}"}
                     
         # Add fallback for when no data is fetched but intent was detected
-        elif intent["type"] != "general" and intent["confidence"] > 0.5:
-            logger.warning(f"Intent detected but no API call made: {intent}")
+        elif itype != "general" and intent["confidence"] > 0.5:
+            logger.warning("Intent detected but no API call made: %s", intent)
             # Check for specific missing parameters to provide better error messages
-            params = intent.get("params", {})
-            
-            if intent["type"] == "flight_search":
+            if itype == "flight_search":
                 origin = params.get("origin", "")
                 destination = params.get("destination", "")
                 departure_date = params.get("departure_date", "")
@@ -3573,7 +3791,7 @@ async def chat(req: ChatRequest):
                     amadeus_data = {"error": "Missing departure date. Please provide a departure date (e.g., 'November 3rd' or '11/03/2024')."}
                 else:
                     amadeus_data = {"error": "Unable to fetch real-time flight data. Please try rephrasing your request with specific dates and locations."}
-            elif intent["type"] == "activity_search":
+            elif itype == "activity_search":
                 destination = params.get("destination", "")
                 latitude = params.get("latitude")
                 longitude = params.get("longitude")
@@ -3582,7 +3800,7 @@ async def chat(req: ChatRequest):
                     amadeus_data = {"error": "Missing location. Please provide a city name (e.g., 'activities in Paris' or 'things to do in Barcelona') or coordinates."}
                 else:
                     amadeus_data = {"error": "Unable to fetch activity data. Please try rephrasing your request with a specific city name."}
-            elif intent["type"] == "hotel_search":
+            elif itype == "hotel_search":
                 destination = params.get("destination", "")
                 check_in = params.get("check_in", "")
                 check_out = params.get("check_out", "")
@@ -3602,127 +3820,72 @@ async def chat(req: ChatRequest):
             error_msg = amadeus_data.get('error', 'Unknown error')
             
             # Generate user-friendly error message based on intent type
-            intent_type = intent.get("type", "general")
+            reply = build_error_reply(itype, error_msg)
             
-            if 'Missing' in error_msg or 'missing' in error_msg.lower():
-                if intent_type == "activity_search":
-                    if 'location' in error_msg.lower() or 'city' in error_msg.lower():
-                        reply = "I'd be happy to help you find activities! Please tell me which city you'd like to explore. For example:\n- 'What activities are available in Paris?'\n- 'Things to do in Barcelona'\n- 'Activities in Tokyo'"
-                    else:
-                        reply = f"I need more information to find activities for you. {error_msg.replace('Missing', '').replace('missing', '').strip()}"
-                elif intent_type == "hotel_search":
-                    if 'destination' in error_msg.lower():
-                        reply = "I'd be happy to help you find hotels! Please tell me which city you'd like to stay in. For example:\n- 'Hotels in Paris'\n- 'Accommodations in New York'"
-                    elif 'date' in error_msg.lower():
-                        reply = "I need check-in and check-out dates to search for hotels. For example:\n- 'Hotels in Paris from December 1 to December 5'\n- 'Hotels in New York from November 15 to November 20'"
-                    else:
-                        reply = f"I need more information to find hotels for you. {error_msg.replace('Missing', '').replace('missing', '').strip()}"
-                elif intent_type == "flight_search":
-                    if 'origin' in error_msg.lower() or 'destination' in error_msg.lower():
-                        reply = "I'd be happy to help you find flights! Please provide both your departure and destination cities. For example:\n- 'Flights from New York to Paris'\n- 'Flights from Los Angeles to Tokyo'"
-                    elif 'date' in error_msg.lower():
-                        reply = "I need a departure date to search for flights. For example:\n- 'Flights from New York to Paris on November 15th'\n- 'Flights from LA to Tokyo on December 1'"
-                    else:
-                        reply = f"I need more information to find flights for you. {error_msg.replace('Missing', '').replace('missing', '').strip()}"
-                else:
-                    reply = f"I need more information. {error_msg.replace('Missing', '').replace('missing', '').strip()}"
-            elif 'Invalid' in error_msg or 'invalid' in error_msg.lower():
-                if 'date' in error_msg.lower():
-                    reply = "Please provide dates in a valid format. For example:\n- 'November 15th, 2024'\n- '12/15/2024'\n- 'Dec 15'"
-                else:
-                    reply = f"Please check your input: {error_msg.replace('Invalid', '').replace('invalid', '').strip()}"
-            elif 'API call failed' in error_msg:
-                if intent_type == "activity_search":
-                    reply = "I'm having trouble connecting to the activities database right now. Please try again in a moment, or try asking about a different city."
-                elif intent_type == "hotel_search":
-                    reply = "I'm having trouble connecting to the hotel database right now. Please try again in a moment."
-                else:
-                    reply = "I'm having trouble connecting to the travel database right now. Please check your connection and try again."
-            elif 'Could not find location coordinates' in error_msg:
-                reply = "I couldn't find that location. Please try:\n- Using the full city name (e.g., 'Paris' instead of 'Par')\n- Specifying the city and country (e.g., 'Paris, France')\n- Asking about a different city"
-            elif 'No flights available' in error_msg:
-                reply = "I couldn't find any flights for that route and dates. Please try:\n- Different dates\n- Different destinations\n- A nearby airport"
-            else:
-                # Make error message more friendly and context-aware
-                if intent_type == "activity_search":
-                    reply = f"I couldn't find activities right now. {error_msg}. Please try asking about a specific city, like 'activities in Paris' or 'things to do in Barcelona'."
-                elif intent_type == "hotel_search":
-                    reply = f"I couldn't find hotels right now. {error_msg}. Please try asking with specific dates and a city name."
-                elif intent_type == "flight_search":
-                    reply = f"I couldn't find flights right now. {error_msg}. Please try rephrasing your request with specific dates and locations."
-                else:
-                    reply = f"I encountered an issue: {error_msg}. Please try rephrasing your request."
-            
-            logger.info(f"Returning error message directly: {reply}")
+            logger.info("Returning error message directly: %s", reply)
+        elif from_intent_handler and amadeus_data is not None and itype in LISTING_REPLY_TEMPLATES:
+            # Deterministic listing result: render it directly without calling GPT
+            reply = build_listing_reply(itype, params, amadeus_data)
+
+            logger.info("Returning templated %s reply", itype)
         else:
             # No error, proceed with GPT call
             try:
                 # Create system prompt with context and data
-                system_prompt = create_system_prompt(
-                    req.context, 
+                system_prompt = await preamble_task + build_prompt_data_section(
                     amadeus_data,
                     origin=route_origin,
                     destination=route_destination,
                     departure_date=route_departure_date,
                     return_date=route_return_date
                 )
+                max_tokens = MAX_TOKENS_BY_INTENT.get(itype, DEFAULT_MAX_TOKENS)
                 
-                response = client.chat.completions.create(
+                if req.stream:
+                    meta = {
+                        "session_id": session_id,
+                        "intent_detected": itype,
+                        "data_fetched": amadeus_data is not None and not amadeus_data.get('error'),
+                        "amadeus_data": amadeus_data
+                    }
+                    return StreamingResponse(
+                        _stream_chat_events(meta, system_prompt, req.messages, max_tokens),
+                        media_type="text/event-stream"
+                    )
+                
+                response = await client.chat.completions.create(
                     model="gpt-4o-mini",
                     messages=[
                         {"role": "system", "content": system_prompt},
                         *req.messages
                     ],
                     temperature=0.7,
-                    max_tokens=1000
+                    max_tokens=max_tokens
                 )
                 
                 reply = response.choices[0].message.content
-                logger.info(f"Generated reply: {reply[:100]}...")
+                logger.info("Generated reply: %s...", reply[:100])
                 
                 # Post-process the reply to format place names with bold text (single bold, no underscores)
                 reply = format_place_names(reply)
             except Exception as e:
-                logger.error(f"OpenAI API error: {e}")
-                # If there's an error in amadeus_data, show that error message instead of generic fallback
-                if amadeus_data and amadeus_data.get('error'):
-                    error_msg = amadeus_data.get('error', 'Unknown error')
-                    # Generate user-friendly error message
-                    if 'Missing' in error_msg or 'missing' in error_msg.lower():
-                        if 'origin' in error_msg.lower() or 'destination' in error_msg.lower():
-                            reply = "**Error:** Please provide both origin and destination cities (e.g., 'flights from New York to Paris')."
-                        elif 'date' in error_msg.lower():
-                            reply = "**Error:** Please provide a departure date (e.g., 'November 3rd' or '11/03/2024')."
-                        else:
-                            reply = f"**Error:** {error_msg}"
-                    elif 'Invalid' in error_msg or 'invalid' in error_msg.lower():
-                        if 'date' in error_msg.lower():
-                            reply = "**Error:** Please provide dates in a valid format (e.g., 'November 3rd, 2024', '11/03/2024', or 'Nov 3')."
-                        else:
-                            reply = f"**Error:** {error_msg}"
-                    elif 'API call failed' in error_msg:
-                        reply = "**Error:** Unable to fetch flight data. Please check your connection and try again."
-                    elif 'No flights available' in error_msg:
-                        reply = "**Error:** No flights available for the specified route and dates. Please try different dates or destinations."
-                    else:
-                        reply = f"**Error:** {error_msg}"
-                elif has_flight_keywords and amadeus_data and not amadeus_data.get('error'):
+                logger.error("OpenAI API error: %s", e)
+                if has_flight_keywords and amadeus_data and not amadeus_data.get('error'):
                     # If we have flight data but GPT failed, create a basic response with the data
-                    reply = "I found the following flight options for you:\n\n"
+                    parts = ["I found the following flight options for you:\n\n"]
                     if 'flights' in amadeus_data:
-                        for i, flight in enumerate(amadeus_data['flights'][:5], 1):
-                            price = flight.get('price', 'N/A')
-                            currency = flight.get('currency', 'USD')
-                            reply += f"{i}. Price: {price} {currency}\n"
+                        parts.extend(
+                            f"{i}. Price: {flight.get('price', 'N/A')} {flight.get('currency', 'USD')}\n"
+                            for i, flight in enumerate(amadeus_data['flights'][:5], 1)
+                        )
+                        reply = "".join(parts)
                     elif 'outboundFlights' in amadeus_data:
-                        for i, flight in enumerate(amadeus_data['outboundFlights'][:5], 1):
-                            airline = flight.get('airline', 'Unknown')
-                            flight_num = flight.get('flightNumber', 'N/A')
-                            price = flight.get('price', 'N/A')
-                            departure = flight.get('departure', 'N/A')
-                            arrival = flight.get('arrival', 'N/A')
-                            duration = flight.get('duration', 'N/A')
-                            reply += f"{i}. {airline} {flight_num} - ${price} | Departure: {departure} | Arrival: {arrival} | Duration: {duration}\n"
+                        parts.extend(
+                            f"{i}. {flight.get('airline', 'Unknown')} {flight.get('flightNumber', 'N/A')} - ${flight.get('price', 'N/A')} | "
+                            f"Departure: {flight.get('departure', 'N/A')} | Arrival: {flight.get('arrival', 'N/A')} | Duration: {flight.get('duration', 'N/A')}\n"
+                            for i, flight in enumerate(amadeus_data['outboundFlights'][:5], 1)
+                        )
+                        reply = "".join(parts)
                     else:
                         reply = "I found some great flight options for you! However, I'm having trouble processing the details right now. Please try again."
                 elif has_flight_keywords:
@@ -3733,292 +3896,216 @@ async def chat(req: ChatRequest):
         return {
             "reply": reply,
             "session_id": session_id,
-            "intent_detected": intent["type"],
+            "intent_detected": itype,
             "data_fetched": amadeus_data is not None and not amadeus_data.get('error'),
             "amadeus_data": amadeus_data if amadeus_data is not None else None
         }
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in chat endpoint: {str(e)}")
+        logger.error("Error in chat endpoint: %s", str(e))
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-
-def transform_amadeus_data(raw_data, route_info, departure_date):
-    """Transform Amadeus API data to match frontend dashboard format"""
-    from datetime import datetime, timedelta
-    import random
-    
-    flights = []
-    airlines = ['Delta Airlines', 'United Airlines', 'American Airlines', 'Southwest Airlines', 'JetBlue Airways', 'Spirit Airlines']
-    
-    # Transform each flight offer
-    for i, offer in enumerate(raw_data.get('flights', [])[:6]):  # Limit to 6 flights
-        price = float(offer.get('price', 0))
-        currency = offer.get('currency', 'USD')
-        
-        # Get first itinerary (outbound flight)
-        itinerary = offer.get('itineraries', [{}])[0]
-        segments = itinerary.get('segments', [])
-        
-        if segments:
-            first_segment = segments[0]
-            last_segment = segments[-1]
-            
-            # Format times
-            departure_time = first_segment.get('departure', {}).get('time', '')
-            arrival_time = last_segment.get('arrival', {}).get('time', '')
-            
-            # Convert ISO time to readable format
-            if departure_time:
-                try:
-                    dt = datetime.fromisoformat(departure_time.replace('Z', '+00:00'))
-                    departure_time = dt.strftime('%I:%M %p').lstrip('0')
-                except:
-                    departure_time = f"{random.randint(6, 22):02d}:{random.choice(['00', '15', '30', '45'])}"
-            
-            if arrival_time:
-                try:
-                    dt = datetime.fromisoformat(arrival_time.replace('Z', '+00:00'))
-                    arrival_time = dt.strftime('%I:%M %p').lstrip('0')
-                except:
-                    arrival_time = f"{random.randint(8, 23):02d}:{random.choice(['00', '15', '30', '45'])}"
-            
-            # Calculate duration
-            duration = itinerary.get('duration', 'PT3H30M')
-            if duration.startswith('PT'):
-                duration = duration[2:]
-                hours = 0
-                minutes = 0
-                if 'H' in duration:
-                    hours = int(duration.split('H')[0])
-                    duration = duration.split('H')[1]
-                if 'M' in duration:
-                    minutes = int(duration.split('M')[0])
-                duration = f"{hours}h {minutes}m"
-            
-            # Count stops
-            stops = len(segments) - 1
-            
-            # Get airline name
-            carrier_code = first_segment.get('airline', '')
-            airline_name = airlines[i % len(airlines)]  # Fallback to predefined list
-            
-            flight = {
-                "id": str(i + 1),
-                "airline": airline_name,
-                "flightNumber": f"{carrier_code}{random.randint(1000, 9999)}" if carrier_code else f"FL{random.randint(1000, 9999)}",
-                "departure": departure_time,
-                "arrival": arrival_time,
-                "duration": duration,
-                "price": int(price),
-                "isOptimal": i == 0,  # First flight is optimal
-                "stops": stops,
-                "origin": first_segment.get('departure', {}).get('airport', route_info['departureCode']),
-                "destination": last_segment.get('arrival', {}).get('airport', route_info['destinationCode'])
-            }
-            flights.append(flight)
-    
-    # Generate price data for the next 7 days
-    price_data = []
-    base_price = int(price) if price > 0 else 400
-    base_date = datetime.strptime(departure_date, '%Y-%m-%d')
+    finally:
+        # No-op once awaited; otherwise (error/listing replies, exceptions) drop the unused preamble
+        if preamble_task is not None:
+            preamble_task.cancel()
+
+# Route / date extraction patterns, compiled once at import
+# Improved regex patterns to handle various formats (including dots and special characters)
+# Pattern 1: "flights from X to Y" or "search flights from X to Y"
+_ROUTE_PATTERNS = tuple((re.compile(pattern), name) for pattern, name in (
+    (r'(?:search|find|get|book)\s+flights?\s+from\s+([a-z\s.]+?)\s+to\s+([a-z\s.]+?)(?:\s+from|\s+on|\s+|$)', 'search flights from'),
+    (r'flights?\s+from\s+([a-z\s.]+?)\s+to\s+([a-z\s.]+?)(?:\s+from|\s+on|\s+|$)', 'flights from'),
+    (r'from\s+([a-z\s.]+?)\s+to\s+([a-z\s.]+?)(?:\s+from|\s+on|\s+(?:nov|dec|jan|feb|mar|apr|may|jun|jul|aug|sep|oct)|$)', 'from to'),
+    (r'flights?\s+to\s+([a-z\s.]+?)\s+to\s+([a-z\s.]+?)(?:\s+from|\s+on|\s+|$)', 'flights to to'),
+))
+_ROUTE_FROM_RE = re.compile(r'from\s+')
+_ROUTE_TO_RE = re.compile(r'to\s+')
+_NORMALIZE_PUNCT_RE = re.compile(r'[.\.,]+')
+_NORMALIZE_WS_RE = re.compile(r'\s+')
+
+# Special-cased 4-group formats in extract_dates_from_message
+# Dash format with concatenated month+day: "dec 10-dec17" (same month)
+_DATE_DASH_CONCAT_RE = re.compile(r'(\w+)\s+(\d+)\s*-\s*(\w+)(\d+)')
+# Dash format with no spaces: "dec10-dec17" (same month) - specific month pattern
+_DATE_DASH_NOSPACE_RE = re.compile(r'\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)(\d+)\s*-\s*(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)(\d+)\b')
+# Dash format with spaces: "dec 10-dec 17" (same month)
+_DATE_DASH_SPACED_RE = re.compile(r'(\w+)\s+(\d+)\s*-\s*(\w+)\s+(\d+)')
+
+# Enhanced patterns for various date formats (ordered by specificity)
+_DATE_RANGE_PATTERNS = tuple(re.compile(pattern) if isinstance(pattern, str) else pattern for pattern in (
+    # Pattern with "from" keyword and year: "from January 6th, 2026 to January 11th, 2026" - MOST SPECIFIC FIRST
+    r'from\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?,?\s+(\d{4})\s+to\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?,?\s+(\d{4})',
+    # Pattern with "from" keyword without year: "from January 6th to January 11th"
+    r'from\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?\s+to\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?',
+    # Pattern with year but no "from": "January 6th, 2026 to January 11th, 2026"
+    r'(\w+)\s+(\d+)(?:st|nd|rd|th)?,?\s+(\d{4})\s+to\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?,?\s+(\d{4})',
+    # Dash format without second month: "dec 10-17" (assume same month)
+    r'(\w+)\s+(\d+)\s*-\s*(\d+)',
+    _DATE_DASH_CONCAT_RE,
+    _DATE_DASH_SPACED_RE,
+    _DATE_DASH_NOSPACE_RE,
+    # Full month names with ordinal numbers: "december 1st to december 5th"
+    r'(\w+)\s+(\d+)(?:st|nd|rd|th)?\s+to\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?',
+    # Full month names: "december 1 to december 5"
+    r'(\w+)\s+(\d+)\s+to\s+(\w+)\s+(\d+)',
+    # Dash format with ordinals: "december 1st-december 5th"
+    r'(\w+)\s+(\d+)(?:st|nd|rd|th)?\s*-\s*(\w+)\s*(\d+)(?:st|nd|rd|th)?',
+    # Dash format: "dec 1-dec 5" (same month, different days)
+    r'(\w+)\s+(\d+)\s*-\s*(\w+)\s*(\d+)',
+    # Through format: "december 1 through december 5"
+    r'(\w+)\s+(\d+)\s+through\s+(\w+)\s+(\d+)',
+))
+
+# Any digit (the same \d the range patterns use)
+_DIGIT_RE = re.compile(r'\d')
+
+# All range patterns as one alternation, each wrapped in a named group p<index>. Its leftmost match
+# tells us that some pattern matches at all and which one (lastgroup): patterns after it can never
+# be the first to match, so only those up to and including it need to be tried in priority order.
+_DATE_RANGE_ANY_RE = re.compile('|'.join(f'(?P<p{i}>{pattern.pattern})' for i, pattern in enumerate(_DATE_RANGE_PATTERNS)))
+_ORDINAL_SUFFIX_RE = re.compile(r'(st|nd|rd|th)$')
+MONTH_NUMBERS = MappingProxyType({
+    'jan': 1, 'january': 1, 'feb': 2, 'february': 2, 'mar': 3, 'march': 3,
+    'apr': 4, 'april': 4, 'may': 5, 'jun': 6, 'june': 6,
+    'jul': 7, 'july': 7, 'aug': 8, 'august': 8, 'sep': 9, 'september': 9,
+    'oct': 10, 'october': 10, 'nov': 11, 'november': 11, 'dec': 12, 'december': 12
+})
+
+# Common city names / airport codes -> (airport code, display city name)
+CITY_AIRPORTS = MappingProxyType({
+    'miami': ('MIA', 'Miami'), 'dfw': ('DFW', 'Dallas'), 'dallas': ('DFW', 'Dallas'), 'fort worth': ('DFW', 'Dallas'),
+    'new york': ('JFK', 'New York'), 'nyc': ('JFK', 'New York'), 'jfk': ('JFK', 'New York'), 'lga': ('LGA', 'New York'), 'newyork': ('JFK', 'New York'),
+    'los angeles': ('LAX', 'Los Angeles'), 'lax': ('LAX', 'Los Angeles'), 'la': ('LAX', 'Los Angeles'),
+    'chicago': ('ORD', 'Chicago'), 'ord': ('ORD', 'Chicago'), 'ohare': ('ORD', 'Chicago'),
+    'atlanta': ('ATL', 'Atlanta'), 'atl': ('ATL', 'Atlanta'),
+    'denver': ('DEN', 'Denver'), 'den': ('DEN', 'Denver'),
+    'san francisco': ('SFO', 'San Francisco'), 'sfo': ('SFO', 'San Francisco'), 'sf': ('SFO', 'San Francisco'),
+    'seattle': ('SEA', 'Seattle'), 'sea': ('SEA', 'Seattle'),
+    'boston': ('BOS', 'Boston'), 'bos': ('BOS', 'Boston'),
+    'phoenix': ('PHX', 'Phoenix'), 'phx': ('PHX', 'Phoenix'),
+    'las vegas': ('LAS', 'Las Vegas'), 'las': ('LAS', 'Las Vegas'),
+    'orlando': ('MCO', 'Orlando'), 'mco': ('MCO', 'Orlando'),
+    'washington dc': ('IAD', 'Washington DC'), 'washington d c': ('IAD', 'Washington DC'), 'washington d.c.': ('IAD', 'Washington DC'),
+    'washington': ('IAD', 'Washington DC'), 'dc': ('IAD', 'Washington DC'), 'dca': ('DCA', 'Washington DC'),
+    'ohio': ('CMH', 'Ohio'), 'columbus': ('CMH', 'Ohio'), 'cleveland': ('CLE', 'Ohio'), 'cincinnati': ('CVG', 'Ohio'), 'cmh': ('CMH', 'Ohio'), 'cle': ('CLE', 'Ohio'), 'cvg': ('CVG', 'Ohio'),
+    'houston': ('IAH', 'Houston'), 'iah': ('IAH', 'Houston'),
+    'detroit': ('DTW', 'Detroit'), 'dtw': ('DTW', 'Detroit'),
+    'minneapolis': ('MSP', 'Minneapolis'), 'msp': ('MSP', 'Minneapolis'),
+    'philadelphia': ('PHL', 'Philadelphia'), 'phl': ('PHL', 'Philadelphia'),
+    'baltimore': ('BWI', 'Baltimore'), 'bwi': ('BWI', 'Baltimore'),
+    'barcelona': ('BCN', 'Barcelona'), 'bcn': ('BCN', 'Barcelona'),
+    'madrid': ('MAD', 'Madrid'), 'mad': ('MAD', 'Madrid'),
+    'london': ('LHR', 'London'), 'lhr': ('LHR', 'London'),
+    'paris': ('CDG', 'Paris'), 'cdg': ('CDG', 'Paris'),
+    'rome': ('FCO', 'Rome'), 'fco': ('FCO', 'Rome'),
+    'berlin': ('BER', 'Berlin'), 'ber': ('BER', 'Berlin'),
+    'amsterdam': ('AMS', 'Amsterdam'), 'ams': ('AMS', 'Amsterdam'),
+    'tokyo': ('NRT', 'Tokyo'), 'nrt': ('NRT', 'Tokyo'),
+    'mexico city': ('MEX', 'Mexico City'), 'mex': ('MEX', 'Mexico City'),
+    'istanbul': ('IST', 'Istanbul'), 'ist': ('IST', 'Istanbul')
+})
+
+
+def _normalize_city_name(city_str):
+    """Normalize city name for matching"""
+    # Remove dots, extra spaces, and normalize
+    normalized = _NORMALIZE_PUNCT_RE.sub('', city_str.lower().strip())
+    normalized = _NORMALIZE_WS_RE.sub(' ', normalized)  # Multiple spaces to single
+    return normalized
+
+
+# Single scan for every mapping key in a message. The lookahead reports the longest key starting
+# at each position; the shorter keys matching there are exactly its word-boundary prefixes
+# (e.g. "washington" inside "washington dc"), precomputed below.
+_CITY_ALT = re.compile(
+    r'(?=\b(' + '|'.join(re.escape(k) for k in sorted(CITY_AIRPORTS, key=len, reverse=True)) + r')\b)'
+)
+_CITY_KEY_PREFIXES = {
+    key: tuple(other for other in CITY_AIRPORTS
+               if other != key and re.fullmatch(r'\b' + re.escape(other) + r'\b.*', key, re.DOTALL))
+    for key in CITY_AIRPORTS
+}
+_NORMALIZED_CITY_KEYS = tuple((key, _normalize_city_name(key)) for key in CITY_AIRPORTS)
+# Longest first, so the suffix scan prefers the most specific key and can stop at the length floor
+_CITY_KEY_LENGTHS = tuple(sorted(((key, len(key)) for key in CITY_AIRPORTS), key=lambda item: item[1], reverse=True))
+
+
+def _find_city_key(city_str):
+    """Find a captured city string in CITY_AIRPORTS with fuzzy matching"""
+    normalized = _normalize_city_name(city_str)
+    
+    # Direct match
+    if normalized in CITY_AIRPORTS:
+        return normalized
     
-    for i in range(7):
-        date = (base_date + timedelta(days=i)).strftime("%b %d")
-        price_variation = base_price + random.randint(-50, 100)
-        optimal_price = base_price - 20
-        price_data.append({
-            "date": date,
-            "price": price_variation,
-            "optimal": optimal_price
-        })
+    # Try matching without common suffixes: the key must occur in the string and be at most
+    # 3 characters shorter (keys are longest first, so stop once they get too short)
+    min_len = len(normalized) - 3
+    for key, key_len in _CITY_KEY_LENGTHS:
+        if key_len < min_len:
+            break
+        if key in normalized:
+            return key
     
-    return {
-        "flights": flights,
-        "priceData": price_data,
-        "route": {
-            "departure": route_info['departure'],
-            "destination": route_info['destination'],
-            "departureCode": route_info['departureCode'],
-            "destinationCode": route_info['destinationCode'],
-            "date": base_date.strftime("%b %d, %Y")
-        },
-        "hasRealData": True,
-        "message": f"Here are real flight options from {route_info['departure']} to {route_info['destination']}! Check out the dashboard for detailed information, prices, and booking options."
-    }
+    return None
 
-def get_city_name_from_code(code):
-    """Get city name from airport code"""
-    airport_codes = {
-        'JFK': 'New York', 'LAX': 'Los Angeles', 'ORD': 'Chicago', 'DFW': 'Dallas',
-        'ATL': 'Atlanta', 'DEN': 'Denver', 'SFO': 'San Francisco', 'SEA': 'Seattle',
-        'MIA': 'Miami', 'BOS': 'Boston', 'LAS': 'Las Vegas', 'PHX': 'Phoenix',
-        'IAH': 'Houston', 'MCO': 'Orlando', 'CLT': 'Charlotte', 'DTW': 'Detroit',
-        'MSP': 'Minneapolis', 'PHL': 'Philadelphia', 'LGA': 'New York',
-        'BWI': 'Baltimore', 'DCA': 'Washington', 'IAD': 'Washington'
-    }
-    return airport_codes.get(code, code)
 
 def extract_route_from_message(message):
     """Extract route information from user message using dynamic parsing"""
-    import re
-    
-    # Helper function to normalize city names (remove dots, extra spaces, etc.)
-    def normalize_city_name(city_str):
-        """Normalize city name for matching"""
-        # Remove dots, extra spaces, and normalize
-        normalized = re.sub(r'[.\.,]+', '', city_str.lower().strip())
-        normalized = re.sub(r'\s+', ' ', normalized)  # Multiple spaces to single
-        return normalized
-    
-    # Helper function to find city in mappings
-    def find_city_in_mappings(city_str, mappings):
-        """Find city in mappings with fuzzy matching"""
-        normalized = normalize_city_name(city_str)
-        
-        # Direct match
-        if normalized in mappings:
-            return normalized
-        
-        # Try matching without common suffixes
-        for key in mappings.keys():
-            if normalized.startswith(key) or key in normalized:
-                # Check if it's a reasonable match (not too different)
-                if abs(len(normalized) - len(key)) <= 3:
-                    return key
-        
-        return None
-    
-    # Common airport codes and city mappings
-    airport_mappings = {
-        'miami': 'MIA', 'dfw': 'DFW', 'dallas': 'DFW', 'fort worth': 'DFW',
-        'new york': 'JFK', 'nyc': 'JFK', 'jfk': 'JFK', 'lga': 'LGA', 'newyork': 'JFK',
-        'los angeles': 'LAX', 'lax': 'LAX', 'la': 'LAX',
-        'chicago': 'ORD', 'ord': 'ORD', 'ohare': 'ORD',
-        'atlanta': 'ATL', 'atl': 'ATL',
-        'denver': 'DEN', 'den': 'DEN',
-        'san francisco': 'SFO', 'sfo': 'SFO', 'sf': 'SFO',
-        'seattle': 'SEA', 'sea': 'SEA',
-        'boston': 'BOS', 'bos': 'BOS',
-        'phoenix': 'PHX', 'phx': 'PHX',
-        'las vegas': 'LAS', 'las': 'LAS',
-        'orlando': 'MCO', 'mco': 'MCO',
-        'washington dc': 'IAD', 'washington d c': 'IAD', 'washington d.c.': 'IAD', 
-        'washington': 'IAD', 'dc': 'IAD', 'dca': 'DCA',
-        'ohio': 'CMH', 'columbus': 'CMH', 'cleveland': 'CLE', 'cincinnati': 'CVG', 'cmh': 'CMH', 'cle': 'CLE', 'cvg': 'CVG',
-        'houston': 'IAH', 'iah': 'IAH',
-        'detroit': 'DTW', 'dtw': 'DTW',
-        'minneapolis': 'MSP', 'msp': 'MSP',
-        'philadelphia': 'PHL', 'phl': 'PHL',
-        'baltimore': 'BWI', 'bwi': 'BWI',
-        'barcelona': 'BCN', 'bcn': 'BCN',
-        'madrid': 'MAD', 'mad': 'MAD',
-        'london': 'LHR', 'lhr': 'LHR',
-        'paris': 'CDG', 'cdg': 'CDG',
-        'rome': 'FCO', 'fco': 'FCO',
-        'berlin': 'BER', 'ber': 'BER',
-        'amsterdam': 'AMS', 'ams': 'AMS',
-        'tokyo': 'NRT', 'nrt': 'NRT',
-        'mexico city': 'MEX', 'mex': 'MEX',
-        'istanbul': 'IST', 'ist': 'IST'
-    }
-    
-    city_mappings = {
-        'miami': 'Miami', 'dfw': 'Dallas', 'dallas': 'Dallas', 'fort worth': 'Dallas',
-        'new york': 'New York', 'nyc': 'New York', 'jfk': 'New York', 'lga': 'New York', 'newyork': 'New York',
-        'los angeles': 'Los Angeles', 'lax': 'Los Angeles', 'la': 'Los Angeles',
-        'chicago': 'Chicago', 'ord': 'Chicago', 'ohare': 'Chicago',
-        'atlanta': 'Atlanta', 'atl': 'Atlanta',
-        'denver': 'Denver', 'den': 'Denver',
-        'san francisco': 'San Francisco', 'sfo': 'San Francisco', 'sf': 'San Francisco',
-        'seattle': 'Seattle', 'sea': 'Seattle',
-        'boston': 'Boston', 'bos': 'Boston',
-        'phoenix': 'Phoenix', 'phx': 'Phoenix',
-        'las vegas': 'Las Vegas', 'las': 'Las Vegas',
-        'orlando': 'Orlando', 'mco': 'Orlando',
-        'washington dc': 'Washington DC', 'washington d c': 'Washington DC', 'washington d.c.': 'Washington DC',
-        'washington': 'Washington DC', 'dc': 'Washington DC', 'dca': 'Washington DC',
-        'ohio': 'Ohio', 'columbus': 'Ohio', 'cleveland': 'Ohio', 'cincinnati': 'Ohio', 'cmh': 'Ohio', 'cle': 'Ohio', 'cvg': 'Ohio',
-        'houston': 'Houston', 'iah': 'Houston',
-        'detroit': 'Detroit', 'dtw': 'Detroit',
-        'minneapolis': 'Minneapolis', 'msp': 'Minneapolis',
-        'philadelphia': 'Philadelphia', 'phl': 'Philadelphia',
-        'baltimore': 'Baltimore', 'bwi': 'Baltimore',
-        'barcelona': 'Barcelona', 'bcn': 'Barcelona',
-        'madrid': 'Madrid', 'mad': 'Madrid',
-        'london': 'London', 'lhr': 'London',
-        'paris': 'Paris', 'cdg': 'Paris',
-        'rome': 'Rome', 'fco': 'Rome',
-        'berlin': 'Berlin', 'ber': 'Berlin',
-        'amsterdam': 'Amsterdam', 'ams': 'Amsterdam',
-        'tokyo': 'Tokyo', 'nrt': 'Tokyo',
-        'mexico city': 'Mexico City', 'mex': 'Mexico City',
-        'istanbul': 'Istanbul', 'ist': 'Istanbul'
-    }
-    
     message_lower = message.lower()
-    logger.debug(f"Processing message: '{message_lower}'")
+    logger.debug("Processing message: '%s'", message_lower)
     
     origin_city = None
     destination_city = None
     
-    # Improved regex patterns to handle various formats (including dots and special characters)
-    # Pattern 1: "flights from X to Y" or "search flights from X to Y"
-    patterns = [
-        (r'(?:search|find|get|book)\s+flights?\s+from\s+([a-z\s.]+?)\s+to\s+([a-z\s.]+?)(?:\s+from|\s+on|\s+|$)', 'search flights from'),
-        (r'flights?\s+from\s+([a-z\s.]+?)\s+to\s+([a-z\s.]+?)(?:\s+from|\s+on|\s+|$)', 'flights from'),
-        (r'from\s+([a-z\s.]+?)\s+to\s+([a-z\s.]+?)(?:\s+from|\s+on|\s+(?:nov|dec|jan|feb|mar|apr|may|jun|jul|aug|sep|oct)|$)', 'from to'),
-        (r'flights?\s+to\s+([a-z\s.]+?)\s+to\s+([a-z\s.]+?)(?:\s+from|\s+on|\s+|$)', 'flights to to'),
-    ]
-    
-    for pattern, pattern_name in patterns:
-        match = re.search(pattern, message_lower)
+    for pattern, pattern_name in _ROUTE_PATTERNS:
+        match = pattern.search(message_lower)
         if match:
             origin_city_raw = match.group(1).strip()
             destination_city_raw = match.group(2).strip()
             
             # Normalize and find in mappings
-            origin_key = find_city_in_mappings(origin_city_raw, airport_mappings)
-            dest_key = find_city_in_mappings(destination_city_raw, airport_mappings)
+            origin_key = _find_city_key(origin_city_raw)
+            dest_key = _find_city_key(destination_city_raw)
             
             if origin_key and dest_key:
                 origin_city = origin_key
                 destination_city = dest_key
-                logger.info(f"Pattern '{pattern_name}' matched - origin: '{origin_city_raw}' -> '{origin_city}', destination: '{destination_city_raw}' -> '{destination_city}'")
+                logger.info("Pattern '%s' matched - origin: '%s' -> '%s', destination: '%s' -> '%s'", pattern_name, origin_city_raw, origin_city, destination_city_raw, destination_city)
                 break
     
     # If no pattern matched, try to find cities anywhere in the message
     if not origin_city or not destination_city:
-        # Extract all potential city names from the message
-        found_cities = []
-        for key in airport_mappings.keys():
-            # Check if the key appears in the message (with word boundaries)
-            pattern = r'\b' + re.escape(key) + r'\b'
-            if re.search(pattern, message_lower):
-                found_cities.append(key)
+        # Extract all potential city names from the message (keys appearing with word boundaries)
+        matched_keys = set()
+        for key in _CITY_ALT.findall(message_lower):
+            matched_keys.add(key)
+            matched_keys.update(_CITY_KEY_PREFIXES[key])
+        # Keep mapping order: the first two found become origin / destination
+        found_cities = [key for key in CITY_AIRPORTS if key in matched_keys]
         
         # Also try normalized search for cities with dots/spaces
-        normalized_msg = normalize_city_name(message_lower)
-        for key in airport_mappings.keys():
-            normalized_key = normalize_city_name(key)
-            if normalized_key in normalized_msg and key not in found_cities:
+        normalized_msg = _normalize_city_name(message_lower)
+        for key, normalized_key in _NORMALIZED_CITY_KEYS:
+            if normalized_key in normalized_msg and key not in matched_keys:
                 found_cities.append(key)
         
         if len(found_cities) >= 2:
             origin_city = found_cities[0]
             destination_city = found_cities[1]
-            logger.info(f"Found cities in message - origin: '{origin_city}', destination: '{destination_city}'")
+            logger.info("Found cities in message - origin: '%s', destination: '%s'", origin_city, destination_city)
         elif len(found_cities) == 1:
             # Only one city found, need to determine if it's origin or destination
             # Try to extract from context (e.g., "from X" or "to X")
-            if re.search(r'from\s+', message_lower):
+            if _ROUTE_FROM_RE.search(message_lower):
                 origin_city = found_cities[0]
-            elif re.search(r'to\s+', message_lower):
+            elif _ROUTE_TO_RE.search(message_lower):
                 destination_city = found_cities[0]
     
     # If still no cities found, return None values instead of fallback
     if not origin_city or not destination_city:
-        logger.warning(f"Could not extract route from message: '{message}'")
+        logger.warning("Could not extract route from message: '%s'", message)
         return {
             'departure': None,
             'destination': None,
@@ -4027,10 +4114,13 @@ def extract_route_from_message(message):
         }
     
     # Map cities to airport codes and proper names
-    origin_code = airport_mappings.get(origin_city, 'JFK')
-    destination_code = airport_mappings.get(destination_city, 'BCN')
-    origin_name = city_mappings.get(origin_city, ' '.join(word.capitalize() for word in origin_city.split()))
-    destination_name = city_mappings.get(destination_city, ' '.join(word.capitalize() for word in destination_city.split()))
+    # (Both keys come from the table, so the fallbacks are only a safety net)
+    origin_code, origin_name = CITY_AIRPORTS.get(
+        origin_city, ('JFK', ' '.join(word.capitalize() for word in origin_city.split()))
+    )
+    destination_code, destination_name = CITY_AIRPORTS.get(
+        destination_city, ('BCN', ' '.join(word.capitalize() for word in destination_city.split()))
+    )
     
     return {
         'departure': origin_name,
@@ -4039,133 +4129,42 @@ def extract_route_from_message(message):
         'destinationCode': destination_code
     }
 
-def extract_departure_date(message):
-    """Extract departure date from user message"""
-    import re
-    from datetime import datetime, timedelta
-    
-    message_lower = message.lower()
-    
-    # Look for date patterns like "10/26 to 10/30" or "Oct 26 to Oct 30"
-    date_patterns = [
-        r'(\d{1,2})/(\d{1,2})\s+to\s+(\d{1,2})/(\d{1,2})',  # 10/26 to 10/30
-        r'(oct|nov|dec|jan|feb|mar|apr|may|jun|jul|aug|sep)\s+(\d{1,2})\s+to\s+(oct|nov|dec|jan|feb|mar|apr|may|jun|jul|aug|sep)\s+(\d{1,2})',  # Oct 26 to Oct 30
-        r'(\d{1,2})/(\d{1,2})',  # Single date 10/26
-        r'(oct|nov|dec|jan|feb|mar|apr|may|jun|jul|aug|sep)\s+(\d{1,2})',  # Single date Oct 26
-    ]
-    
-    for pattern in date_patterns:
-        match = re.search(pattern, message_lower)
-        if match:
-            if '/' in pattern:  # MM/DD format
-                if len(match.groups()) == 2:  # Single date
-                    month, day = int(match.group(1)), int(match.group(2))
-                else:  # Date range, use first date
-                    month, day = int(match.group(1)), int(match.group(2))
-                
-                # Assume current year
-                current_year = datetime.now().year
-                try:
-                    return datetime(current_year, month, day).strftime("%Y-%m-%d")
-                except ValueError:
-                    continue
-            else:  # Month name format
-                month_names = {
-                    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
-                    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
-                }
-                if len(match.groups()) == 2:  # Single date
-                    month = month_names.get(match.group(1), 10)
-                    day = int(match.group(2))
-                else:  # Date range, use first date
-                    month = month_names.get(match.group(1), 10)
-                    day = int(match.group(2))
-                
-                current_year = datetime.now().year
-                try:
-                    return datetime(current_year, month, day).strftime("%Y-%m-%d")
-                except ValueError:
-                    continue
-    
-    # Default to 30 days from now if no date found
-    default_date = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
-    logger.debug(f"No date found in message, using default: {default_date}")
-    return default_date
-
 def extract_dates_from_message(message):
     """Extract departure and return dates from user message"""
-    import re
-    from datetime import datetime, timedelta
-    
     message_lower = message.lower()
-    logger.debug(f"Extracting dates from: '{message_lower}'")
+    logger.debug("Extracting dates from: '%s'", message_lower)
     
-    # Enhanced patterns for various date formats (ordered by specificity)
-    date_patterns = [
-        # Pattern with "from" keyword and year: "from January 6th, 2026 to January 11th, 2026" - MOST SPECIFIC FIRST
-        r'from\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?,?\s+(\d{4})\s+to\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?,?\s+(\d{4})',
-        # Pattern with "from" keyword without year: "from January 6th to January 11th"
-        r'from\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?\s+to\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?',
-        # Pattern with year but no "from": "January 6th, 2026 to January 11th, 2026"
-        r'(\w+)\s+(\d+)(?:st|nd|rd|th)?,?\s+(\d{4})\s+to\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?,?\s+(\d{4})',
-        # Dash format without second month: "dec 10-17" (assume same month)
-        r'(\w+)\s+(\d+)\s*-\s*(\d+)',
-        # Dash format with concatenated month+day: "dec 10-dec17" (same month)
-        r'(\w+)\s+(\d+)\s*-\s*(\w+)(\d+)',
-        # Dash format with spaces: "dec 10-dec 17" (same month)
-        r'(\w+)\s+(\d+)\s*-\s*(\w+)\s+(\d+)',
-        # Dash format with no spaces: "dec10-dec17" (same month) - specific month pattern
-        r'\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)(\d+)\s*-\s*(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)(\d+)\b',
-        # Full month names with ordinal numbers: "december 1st to december 5th"
-        r'(\w+)\s+(\d+)(?:st|nd|rd|th)?\s+to\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?',
-        # Full month names: "december 1 to december 5"
-        r'(\w+)\s+(\d+)\s+to\s+(\w+)\s+(\d+)',
-        # Abbreviated months with ordinal: "dec 1st to dec 5th"
-        r'(\w+)\s+(\d+)(?:st|nd|rd|th)?\s+to\s+(\w+)\s+(\d+)(?:st|nd|rd|th)?',
-        # Abbreviated months: "dec 1 to dec 5"
-        r'(\w+)\s+(\d+)\s+to\s+(\w+)\s+(\d+)',
-        # Dash format with ordinals: "december 1st-december 5th"
-        r'(\w+)\s+(\d+)(?:st|nd|rd|th)?\s*-\s*(\w+)\s*(\d+)(?:st|nd|rd|th)?',
-        # Dash format: "dec 1-dec 5" (same month, different days)
-        r'(\w+)\s+(\d+)\s*-\s*(\w+)\s*(\d+)',
-        # Through format: "december 1 through december 5"
-        r'(\w+)\s+(\d+)\s+through\s+(\w+)\s+(\d+)',
-    ]
+    # Every range pattern needs a day number, so most chat messages are rejected by the digit test alone
+    any_match = _DIGIT_RE.search(message_lower) and _DATE_RANGE_ANY_RE.search(message_lower)
+    if not any_match:
+        return {}
     
     match = None
     matched_pattern = None
-    for i, pattern in enumerate(date_patterns):
-        test_match = re.search(pattern, message_lower)
-        if test_match:
-            logger.debug(f"Pattern {i} matched: {pattern} -> {test_match.groups()}")
-            if not match:  # Use first match
-                match = test_match
-                matched_pattern = pattern
+    for i, pattern in enumerate(_DATE_RANGE_PATTERNS[:int(any_match.lastgroup[1:]) + 1]):
+        match = pattern.search(message_lower)
+        if match:  # Use first match
+            logger.debug("Pattern %s matched: %s -> %s", i, pattern.pattern, match.groups())
+            matched_pattern = pattern
+            break
     
     if match:
         groups = match.groups()
-        logger.debug(f"Using pattern: {matched_pattern}")
-        logger.debug(f"Date pattern matched: {groups}")
-        
-        month_names = {
-            'jan': 1, 'january': 1, 'feb': 2, 'february': 2, 'mar': 3, 'march': 3,
-            'apr': 4, 'april': 4, 'may': 5, 'jun': 6, 'june': 6,
-            'jul': 7, 'july': 7, 'aug': 8, 'august': 8, 'sep': 9, 'september': 9,
-            'oct': 10, 'october': 10, 'nov': 11, 'november': 11, 'dec': 12, 'december': 12
-        }
+        logger.debug("Using pattern: %s", matched_pattern.pattern)
+        logger.debug("Date pattern matched: %s", groups)
         
         if len(groups) == 6 or len(groups) == 7:
             # Format with year: "from January 6th, 2026 to January 11th, 2026" or "January 6th, 2026 to January 11th, 2026"
             # Groups: [month1, day1, year1, month2, day2, year2] or [month1, day1, year1, month2, day2, year2, ...]
             month1, day1, year1, month2, day2, year2 = groups[:6]
             # Extract day numbers (remove ordinal suffixes if present)
-            day1 = int(re.sub(r'(st|nd|rd|th)$', '', str(day1)))
-            day2 = int(re.sub(r'(st|nd|rd|th)$', '', str(day2)))
+            day1 = int(_ORDINAL_SUFFIX_RE.sub('', str(day1)))
+            day2 = int(_ORDINAL_SUFFIX_RE.sub('', str(day2)))
             year1 = int(year1)
             year2 = int(year2)
             
-            month1_num = month_names.get(month1.lower(), 1)
-            month2_num = month_names.get(month2.lower(), 1)
+            month1_num = MONTH_NUMBERS.get(month1.lower(), 1)
+            month2_num = MONTH_NUMBERS.get(month2.lower(), 1)
             
             departure_date = datetime(year1, month1_num, day1)
             return_date = datetime(year2, month2_num, day2)
@@ -4173,13 +4172,13 @@ def extract_dates_from_message(message):
             # Format: "dec 10-dec 17" or "december 1 to december 5" or "dec 10-dec17"
             month1, day1, month2, day2 = groups
             # Extract day numbers (remove ordinal suffixes if present)
-            day1 = int(re.sub(r'(st|nd|rd|th)$', '', day1))
-            day2 = int(re.sub(r'(st|nd|rd|th)$', '', day2))
+            day1 = int(_ORDINAL_SUFFIX_RE.sub('', day1))
+            day2 = int(_ORDINAL_SUFFIX_RE.sub('', day2))
             
             # Check if this is one of the special concatenated formats
-            if matched_pattern in [r'(\w+)\s+(\d+)\s*-\s*(\w+)(\d+)', r'\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)(\d+)\s*-\s*(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)(\d+)\b']:
+            if matched_pattern is _DATE_DASH_CONCAT_RE or matched_pattern is _DATE_DASH_NOSPACE_RE:
                 # For "dec 10-dec17" or "dec10-dec17", we need to handle concatenated month+day
-                logger.debug(f"Concatenated format detected: {month1} {day1}-{month2}{day2}")
+                logger.debug("Concatenated format detected: %s %s-%s%s", month1, day1, month2, day2)
                 
                 # Check if month2 starts with month1 (e.g., "dec1" starts with "dec")
                 if month2.lower().startswith(month1.lower()):
@@ -4187,31 +4186,31 @@ def extract_dates_from_message(message):
                     # We need to extract the correct day from the concatenated part
                     remaining_part = month2[len(month1):]  # "1" from "dec1"
                     actual_day2_str = remaining_part + str(day2)  # "1" + "7" = "17"
-                    logger.debug(f"Reconstructed: month1={month1}, day1={day1}, month2={month1}, day2={actual_day2_str}")
+                    logger.debug("Reconstructed: month1=%s, day1=%s, month2=%s, day2=%s", month1, day1, month1, actual_day2_str)
                     
-                    month1_num = month_names.get(month1.lower(), 11)
+                    month1_num = MONTH_NUMBERS.get(month1.lower(), 11)
                     month2_num = month1_num  # Same month
                     day2 = int(actual_day2_str)  # Update day2 with the correct value
                 else:
                     # Regular case where months are different
-                    month1_num = month_names.get(month1.lower(), 11)
-                    month2_num = month_names.get(month2.lower(), 11)
-            elif matched_pattern == r'(\w+)\s+(\d+)\s*-\s*(\w+)\s+(\d+)':
+                    month1_num = MONTH_NUMBERS.get(month1.lower(), 11)
+                    month2_num = MONTH_NUMBERS.get(month2.lower(), 11)
+            elif matched_pattern is _DATE_DASH_SPACED_RE:
                 # For "dec 10-dec 17" format (with spaces)
-                logger.debug(f"Spaced format detected: {month1} {day1}-{month2} {day2}")
+                logger.debug("Spaced format detected: %s %s-%s %s", month1, day1, month2, day2)
                 
                 # Check if both months are the same
                 if month1.lower() == month2.lower():
-                    month1_num = month_names.get(month1.lower(), 11)
+                    month1_num = MONTH_NUMBERS.get(month1.lower(), 11)
                     month2_num = month1_num  # Same month
-                    logger.debug(f"Same month detected: {month1}")
+                    logger.debug("Same month detected: %s", month1)
                 else:
-                    month1_num = month_names.get(month1.lower(), 11)
-                    month2_num = month_names.get(month2.lower(), 11)
+                    month1_num = MONTH_NUMBERS.get(month1.lower(), 11)
+                    month2_num = MONTH_NUMBERS.get(month2.lower(), 11)
             else:
                 # Regular 4-group format
-                month1_num = month_names.get(month1.lower(), 11)
-                month2_num = month_names.get(month2.lower(), 11)
+                month1_num = MONTH_NUMBERS.get(month1.lower(), 11)
+                month2_num = MONTH_NUMBERS.get(month2.lower(), 11)
             
             # Use current year
             current_year = datetime.now().year
@@ -4221,10 +4220,10 @@ def extract_dates_from_message(message):
             # Format: "dec 10-17" (same month, different days)
             month1, day1, day2 = groups
             # Extract day numbers (remove ordinal suffixes if present)
-            day1 = int(re.sub(r'(st|nd|rd|th)$', '', day1))
-            day2 = int(re.sub(r'(st|nd|rd|th)$', '', day2))
+            day1 = int(_ORDINAL_SUFFIX_RE.sub('', day1))
+            day2 = int(_ORDINAL_SUFFIX_RE.sub('', day2))
             
-            month1_num = month_names.get(month1.lower(), 11)
+            month1_num = MONTH_NUMBERS.get(month1.lower(), 11)
             month2_num = month1_num  # Same month for both dates
             
             # Use current year
@@ -4232,197 +4231,45 @@ def extract_dates_from_message(message):
             departure_date = datetime(current_year, month1_num, day1)
             return_date = datetime(current_year, month2_num, day2)
         
-        departure_display = departure_date.strftime("%b %d, %Y")
-        return_display = return_date.strftime("%b %d, %Y")
+        departure_display = _format_display_date(departure_date)
+        return_display = _format_display_date(return_date)
         
         return {
-            'departure_date': departure_date.strftime("%Y-%m-%d"),
-            'return_date': return_date.strftime("%Y-%m-%d"),
+            'departure_date': departure_date.date().isoformat(),
+            'return_date': return_date.date().isoformat(),
             'departure_display': departure_display,
             'return_display': return_display
         }
     
     return {}
 
-def calculate_value_score(flight):
-    """Calculate a value score for a flight (lower is better)"""
-    price = flight.get('price', 1000)
-    duration_str = flight.get('duration', '0h 0m')
-    stops = flight.get('stops', 3)
-    
-    # Parse duration (e.g., "7h 30m" -> 7.5 hours)
-    duration_hours = 0
-    if 'h' in duration_str:
-        hours_part = duration_str.split('h')[0]
-        duration_hours = float(hours_part.strip())
-        if 'm' in duration_str:
-            mins_part = duration_str.split('h')[1].split('m')[0]
-            duration_hours += float(mins_part.strip()) / 60
-    
-    # Value score: price + (duration * 20) + (stops * 50)
-    # Lower score = better value
-    value_score = price + (duration_hours * 20) + (stops * 50)
-    return value_score
-
-def generate_flights_for_route(origin, destination, origin_code, dest_code, date, is_return=False):
-    """Generate flights for a specific route and date"""
-    import random
-    
-    airlines = ['Delta Airlines', 'United Airlines', 'American Airlines', 'Southwest Airlines', 'JetBlue Airways', 'Spirit Airlines', 'Alaska Airlines', 'Frontier Airlines', 'Hawaiian Airlines', 'Virgin America']
-    
-    flights = []
-    for i in range(6):
-        airline = random.choice(airlines)
-        price = random.randint(200, 900)
-        duration_hours = random.randint(2, 8)
-        duration_mins = random.randint(0, 59)
-        duration = f"{duration_hours}h {duration_mins}m"
-        stops = random.randint(0, 2)
-        
-        departure_hour = random.randint(6, 22)
-        departure_min = random.choice(['00', '15', '30', '45'])
-        arrival_hour = (departure_hour + duration_hours) % 24
-        arrival_min = departure_min
-        
-        flight = {
-            "id": f"{'return' if is_return else 'outbound'}_{i + 1}",
-            "airline": airline,
-            "flightNumber": f"{airline.split()[0][:2].upper()}{random.randint(1000, 9999)}",
-            "departure": f"{departure_hour:02d}:{departure_min}",
-            "arrival": f"{arrival_hour:02d}:{arrival_min}",
-            "duration": duration,
-            "price": price,
-            "stops": stops,
-            "origin": origin_code,
-            "destination": dest_code,
-            "isOptimal": False  # Will be set later
-        }
-        flights.append(flight)
-    
-    return flights
+# Three uppercase ASCII letters
+_IATA_CODE_RE = re.compile(r'[A-Z]{3}')
 
-def generate_mock_flight_data(route_info=None, user_message=""):
-    """Generate enhanced mock flight data with separate outbound/return flights and best combinations"""
-    import random
-    from datetime import datetime, timedelta
-    
-    logger.debug(f"generate_mock_flight_data called with route_info: {route_info}")
-    
-    # Extract dates from user message
-    date_info = extract_dates_from_message(user_message)
-    
-    # Use provided dates or generate random dates
-    if route_info and 'departure_date' in route_info:
-        departure_date = route_info['departure_date']
-        return_date = route_info['return_date']
-        departure_display = route_info.get('departure_display', departure_date)
-        return_display = route_info.get('return_display', return_date)
-        print(f"DEBUG: Using provided dates - departure: {departure_date}, return: {return_date}")
-    else:
-        # Generate random dates as fallback
-        base_date = datetime.now() + timedelta(days=random.randint(1, 30))
-        departure_date = base_date.strftime("%Y-%m-%d")
-        return_date = (base_date + timedelta(days=random.randint(1, 7))).strftime("%Y-%m-%d")
-        departure_display = base_date.strftime("%b %d, %Y")
-        return_display = (base_date + timedelta(days=random.randint(1, 7))).strftime("%b %d, %Y")
-        print(f"DEBUG: Using random dates - departure: {departure_date}, return: {return_date}")
-    
-    # Use provided route info or fallback to random route
-    if route_info:
-        route = route_info
-        logger.debug(f"Using provided route: {route}")
-    else:
-        # Fallback route combinations
-        route_combinations = [
-            {"departure": "New York", "destination": "Los Angeles", "departureCode": "JFK", "destinationCode": "LAX"},
-            {"departure": "Chicago", "destination": "Miami", "departureCode": "ORD", "destinationCode": "MIA"},
-            {"departure": "San Francisco", "destination": "New York", "departureCode": "SFO", "destinationCode": "JFK"},
-            {"departure": "Seattle", "destination": "Denver", "departureCode": "SEA", "destinationCode": "DEN"},
-            {"departure": "Boston", "destination": "Las Vegas", "departureCode": "BOS", "destinationCode": "LAS"},
-            {"departure": "Atlanta", "destination": "Phoenix", "departureCode": "ATL", "destinationCode": "PHX"},
-            {"departure": "Dallas", "destination": "Seattle", "departureCode": "DFW", "destinationCode": "SEA"},
-            {"departure": "Miami", "destination": "Chicago", "departureCode": "MIA", "destinationCode": "ORD"}
-        ]
-        route = random.choice(route_combinations)
-    
-    # Generate outbound flights (X to Y)
-    outbound_flights = generate_flights_for_route(
-        route['departure'], route['destination'], 
-        route['departureCode'], route['destinationCode'], 
-        departure_date, is_return=False
-    )
-    
-    # Generate return flights (Y to X)
-    return_flights = generate_flights_for_route(
-        route['destination'], route['departure'], 
-        route['destinationCode'], route['departureCode'], 
-        return_date, is_return=True
-    )
-    
-    # Find best value flights from each direction
-    best_outbound = min(outbound_flights, key=calculate_value_score)
-    best_return = min(return_flights, key=calculate_value_score)
-    
-    # Mark the best value flights as optimal
-    for flight in outbound_flights:
-        flight['isOptimal'] = flight == best_outbound
-    for flight in return_flights:
-        flight['isOptimal'] = flight == best_return
-    
-    # Create best combination
-    total_price = best_outbound['price'] + best_return['price']
-    savings_amount = random.randint(50, 150)
-    best_combination = {
-        'outbound': best_outbound,
-        'return': best_return,
-        'totalPrice': total_price,
-        'savings': f"Save up to 15% when booking together"
-    }
-    
-    # Combine all flights for backward compatibility
-    flights = outbound_flights + return_flights
-    
-    # Generate consistent price data for the next 7 days
-    price_data = []
-    base_price = random.randint(250, 600)  # More varied base price
-    
-    for i in range(7):
-        date = (datetime.now() + timedelta(days=i)).strftime("%b %d")
-        price_variation = random.randint(-50, 100)
-        price = max(200, base_price + price_variation)
-        optimal = max(180, base_price - random.randint(10, 40))
-        price_data.append({
-            "date": date,
-            "price": price,
-            "optimal": optimal
-        })
-    
-    return {
-        "outboundFlights": outbound_flights,
-        "returnFlights": return_flights,
-        "bestCombination": best_combination,
-        "flights": flights,  # Keep for backward compatibility
-        "priceData": price_data,
-        "route": {
-            "departure": route["departure"],
-            "destination": route["destination"], 
-            "departureCode": route["departureCode"],
-            "destinationCode": route["destinationCode"],
-            "date": departure_display,
-            "departure_date": departure_date,
-            "return_date": return_date,
-            "departure_display": departure_display,
-            "return_display": return_display
-        },
-        "hasRealData": False,
-        "message": f"Here are great flight options from {route['departure']} to {route['destination']}! Check out the dashboard for detailed information, prices, and booking options."
-    }
 
 def _is_iata_code(code: str) -> bool:
     """Check if a string is likely an IATA code (3 letters)"""
-    if not code:
-        return False
-    return len(code) == 3 and code.isalpha() and code.isupper()
+    return bool(code) and _IATA_CODE_RE.fullmatch(code) is not None
+
+def _resolve_airport_codes(location: str) -> List[str]:
+    """
+    Resolve a city name or IATA code to the airport code(s) to search.
+    Blocking (Amadeus HTTP call) - run via asyncio.to_thread from async handlers.
+    """
+    if _is_iata_code(location):
+        return [location]
+    
+    logger.info(f"[MAIN] Converting '{location}' to IATA code(s)")
+    location_result = amadeus_service.get_airport_city_search(keyword=location)
+    if location_result and not location_result.get('error') and location_result.get('locations'):
+        airports = [loc for loc in location_result['locations'] if loc.get('type') == 'AIRPORT']
+        if airports:
+            airport_codes = [a.get('code') for a in airports if a.get('code')]
+            logger.info(f"[MAIN] Found {len(airport_codes)} airports for {location}: {airport_codes}")
+            return airport_codes
+        # No airports found, use first location
+        return [location_result['locations'][0].get('code', location)]
+    return []
 
 # Vercel handles port configuration automatically
 
@@ -4430,5 +4277,3 @@ def _is_iata_code(code: str) -> bool:
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
-
-
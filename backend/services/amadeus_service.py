@@ -6,12 +6,23 @@ import httpx
 import requests
 import logging
 import re
+import threading
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 import json
+import copy
+from cachetools import TTLCache
+
+from .geocode_cache import GeocodeCache
+from .singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# City -> (lat, lon) is effectively immutable; cache it for 30 days to cap staleness.
+# Misses are remembered for an hour so unknown strings aren't re-queried every turn.
+CITY_COORDINATES_TTL = 30 * 24 * 3600
+CITY_COORDINATES_MISS_TTL = 3600
+
 
 class AmadeusService:
     """
@@ -34,6 +45,15 @@ class AmadeusService:
         self._access_token = None
         self._token_expires_at = None
         self._client = None  # Initialize lazily to avoid event loop issues
+        
+        # Process-local geocode cache (see get_city_coordinates)
+        self._coordinates_cache = TTLCache(maxsize=4096, ttl=CITY_COORDINATES_TTL)
+        self._coordinates_miss_cache = TTLCache(maxsize=1024, ttl=CITY_COORDINATES_MISS_TTL)
+        self._coordinates_lock = threading.Lock()
+        # Shared across workers/restarts; the in-process TTLCache fronts it
+        self._geocode_store = GeocodeCache(ttl=CITY_COORDINATES_TTL)
+        # Concurrent identical geocode / activity lookups share one upstream call
+        self._inflight = SingleFlight()
     
     def _get_access_token(self) -> str:
         """Get or refresh OAuth2 access token"""
@@ -329,10 +349,21 @@ class AmadeusService:
             radius: Search radius in kilometers (0-20, default 1)
             include_multi_day: If True, include multi-day tours (default: False)
         """
+        radius = min(max(radius, 0), 20)  # Clamp between 0 and 20
+        key = ("activities", round(float(latitude), 6), round(float(longitude), 6), radius, include_multi_day)
+        # The published result is a private copy nobody mutates; every caller (leader included)
+        # gets its own deep copy of it, since the handlers annotate the activity dicts in place
+        # while joiners may still be copying
+        result, _ = self._inflight.do(
+            key, lambda: copy.deepcopy(self._search_activities(latitude, longitude, radius, include_multi_day))
+        )
+        return copy.deepcopy(result)
+    
+    def _search_activities(self, latitude: float, longitude: float, radius: int, include_multi_day: bool) -> Dict[str, Any]:
         params = {
             "latitude": latitude,
             "longitude": longitude,
-            "radius": min(max(radius, 0), 20)  # Clamp between 0 and 20
+            "radius": radius
         }
         
         try:
@@ -397,7 +428,7 @@ class AmadeusService:
     def get_city_coordinates(self, city_name: str) -> Optional[Tuple[float, float]]:
         """
         Get coordinates (latitude, longitude) for a city name
-        Uses the location search API to find city coordinates
+        Uses the location search API to find city coordinates, cached per process
         
         Args:
             city_name: Name of the city
@@ -405,6 +436,36 @@ class AmadeusService:
         Returns:
             Tuple of (latitude, longitude) or None if not found
         """
+        city_key = (city_name or "").strip().casefold()
+        with self._coordinates_lock:
+            cached = self._coordinates_cache.get(city_key)
+            if cached is not None:
+                return cached
+            if city_key in self._coordinates_miss_cache:
+                return None
+        
+        coordinates, _ = self._inflight.do(
+            ("coordinates", city_key), lambda: self._resolve_city_coordinates(city_key, city_name)
+        )
+        return coordinates
+    
+    def _resolve_city_coordinates(self, city_key: str, city_name: str) -> Optional[Tuple[float, float]]:
+        """Fill the process-local caches from the persistent store or a live lookup"""
+        coordinates = self._geocode_store.get(city_key)
+        if coordinates is None:
+            coordinates = self._lookup_city_coordinates(city_name)
+            if coordinates is not None:
+                self._geocode_store.set(city_key, coordinates)
+        
+        with self._coordinates_lock:
+            if coordinates is not None:
+                self._coordinates_cache[city_key] = coordinates
+            else:
+                self._coordinates_miss_cache[city_key] = True
+        return coordinates
+    
+    def _lookup_city_coordinates(self, city_name: str) -> Optional[Tuple[float, float]]:
+        """Resolve city coordinates via Amadeus, falling back to OpenStreetMap"""
         try:
             # Search for the city using location API
             location_data = self.get_airport_city_search(city_name)
@@ -2238,6 +2299,7 @@ class AmadeusService:
             return "LOW"
     
     def close(self):
-        """Close HTTP client"""
+        """Close HTTP client and geocode store"""
         if self._client:
             self._client.close()
+        self._geocode_store.close()
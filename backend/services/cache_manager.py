@@ -12,6 +12,11 @@ class CacheManager:
     Thread-safe cache manager with TTL support for API responses
     """
     
+    # Coordinate-based searches are keyed by a rounded grid cell (~1.1 km at 2 decimals)
+    # so queries that differ by micro-degrees share one cache entry
+    COORDINATE_KEYED_TYPES = frozenset({"activity_search", "points_of_interest"})
+    COORDINATE_PRECISION = 2
+    
     def __init__(self, default_ttl: int = 300):  # 5 minutes default
         self.default_ttl = default_ttl
         self._cache = TTLCache(maxsize=1000, ttl=default_ttl)
@@ -19,11 +24,24 @@ class CacheManager:
     
     def _generate_key(self, session_id: str, api_type: str, params: dict) -> str:
         """Generate cache key from session, API type, and parameters"""
+        if params and api_type in self.COORDINATE_KEYED_TYPES and "latitude" in params and "longitude" in params:
+            params = self._bucket_coordinates(params)
         # Sort params for consistent key generation
         sorted_params = sorted(params.items()) if params else []
         param_str = "|".join(f"{k}={v}" for k, v in sorted_params)
         return f"{session_id}:{api_type}:{param_str}"
     
+    def _bucket_coordinates(self, params: dict) -> dict:
+        """Round latitude/longitude to the grid cell used for cache keys"""
+        try:
+            return {
+                **params,
+                "latitude": round(float(params["latitude"]), self.COORDINATE_PRECISION),
+                "longitude": round(float(params["longitude"]), self.COORDINATE_PRECISION)
+            }
+        except (TypeError, ValueError):
+            return params
+    
     def get(self, session_id: str, api_type: str, params: dict) -> Optional[Any]:
         """Get cached response if available"""
         with self._lock:
@@ -47,7 +65,7 @@ class CacheManager:
     def clear_session(self, session_id: str) -> None:
         """Clear all cached data for a session"""
         with self._lock:
-            keys_to_remove = [key for key in self._cache.keys() if key.startswith(f"{session_id}:")]
+            keys_to_remove = [key for key in self._cache if key.startswith(f"{session_id}:")]
             for key in keys_to_remove:
                 self._cache.pop(key, None)
     
@@ -0,0 +1,77 @@
+"""
+Persistent geocode cache shared across worker processes and restarts
+"""
+import os
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GEOCODE_CACHE_PATH = os.path.join(tempfile.gettempdir(), "geocode_cache.db")
+
+
+class GeocodeCache:
+    """
+    SQLite-backed city -> (lat, lon) store
+    Degrades to a no-op if the database can't be opened (e.g. read-only filesystem)
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: int = 30 * 24 * 3600):
+        self.path = path or os.getenv("GEOCODE_CACHE_PATH", DEFAULT_GEOCODE_CACHE_PATH)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocache ("
+                "city_key TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, fetched_at INTEGER NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+            logger.info(f"[GEOCODE] Persistent geocode cache at {self.path}")
+        except sqlite3.Error as e:
+            logger.warning(f"[GEOCODE] Persistent geocode cache disabled ({self.path}): {e}")
+
+    def get(self, city_key: str) -> Optional[Tuple[float, float]]:
+        """Return cached coordinates if present and not older than the TTL"""
+        try:
+            with self._lock:
+                # Checked under the lock so a concurrent close() can't pull the connection away
+                if self._conn is None:
+                    return None
+                row = self._conn.execute(
+                    "SELECT lat, lon FROM geocache WHERE city_key = ? AND fetched_at > ?",
+                    (city_key, int(time.time()) - self.ttl)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"[GEOCODE] Geocode cache read failed for {city_key}: {e}")
+            return None
+        return (row[0], row[1]) if row else None
+
+    def set(self, city_key: str, coordinates: Tuple[float, float]) -> None:
+        """Store coordinates for a city key"""
+        try:
+            with self._lock:
+                if self._conn is None:
+                    return
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO geocache (city_key, lat, lon, fetched_at) VALUES (?, ?, ?, ?)",
+                    (city_key, coordinates[0], coordinates[1], int(time.time()))
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"[GEOCODE] Geocode cache write failed for {city_key}: {e}")
+
+    def close(self) -> None:
+        """Close the underlying connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
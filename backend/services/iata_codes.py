@@ -3,6 +3,7 @@ IATA Code Lookup for Common Cities
 Provides fast lookup for city names to IATA codes to reduce API calls
 Fixed version with proper Washington DC airport codes
 """
+from functools import lru_cache
 from typing import Dict, Optional, List
 
 # Common city to IATA code mappings
@@ -153,9 +154,11 @@ AIRPORT_CODES: Dict[str, str] = {
     "HND": "Tokyo Haneda",
 }
 
+@lru_cache(maxsize=1024)
 def get_iata_code(city_name: str) -> Optional[str]:
     """
     Get IATA code for a city name
+    Memoized: the tables are static, and misses fall through to a scan of every city
     
     Args:
         city_name: City name (case insensitive)
@@ -4,7 +4,7 @@ Intent Detection Service using GPT for travel query analysis
 import json
 import logging
 from typing import Dict, List, Optional, Any
-from openai import OpenAI
+from openai import AsyncOpenAI
 import os
 from datetime import datetime, timedelta
 import re
@@ -22,7 +22,12 @@ class IntentDetector:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY must be set")
-        self.client = OpenAI(api_key=api_key)
+        # Async client: analyze_message runs on the event loop, so the completion call must not block it
+        self.client = AsyncOpenAI(api_key=api_key)
+    
+    async def aclose(self) -> None:
+        """Close the underlying HTTP connection pool"""
+        await self.client.close()
     
     async def analyze_message(self, message: str, conversation_history: List[Dict[str, str]] = None, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """
@@ -173,7 +178,7 @@ CRITICAL CONTEXT AWARENESS RULES:
 
 Return only the JSON object, no other text."""
 
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a travel intent detection system. Analyze messages and return structured JSON data only."},
@@ -0,0 +1,59 @@
+"""
+Duplicate call suppression for concurrent identical upstream requests
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Go-style singleflight for blocking calls (the Amadeus client is synchronous and
+    runs on worker threads): while a call for a key is in flight, other callers with
+    the same key wait for it and receive its result instead of issuing their own.
+    Nothing is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() once per in-flight key
+
+        Returns:
+            (result, shared) - shared is True for callers that joined another call.
+            Every caller receives the same result object, so callers that mutate it
+            must copy it (the leader included: joiners may still be reading it)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
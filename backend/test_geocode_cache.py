@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent geocode cache (TTL expiry and degraded no-op mode)
+"""
+import os
+import sys
+import tempfile
+import threading
+from unittest import mock
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(__file__))
+
+from services import geocode_cache
+from services.geocode_cache import GeocodeCache
+
+BARCELONA = (41.3874, 2.1686)
+
+
+def test_round_trip_and_persistence():
+    """Stored coordinates survive reopening the database"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "geocode.db")
+        cache = GeocodeCache(path=path, ttl=3600)
+        assert cache.get("barcelona") is None
+        cache.set("barcelona", BARCELONA)
+        assert cache.get("barcelona") == BARCELONA
+        cache.close()
+
+        reopened = GeocodeCache(path=path, ttl=3600)
+        assert reopened.get("barcelona") == BARCELONA
+        reopened.close()
+    print("✅ Coordinates persist across connections")
+
+
+def test_entries_expire_after_ttl():
+    """Entries older than the TTL are not returned"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GeocodeCache(path=os.path.join(tmp, "geocode.db"), ttl=60)
+        with mock.patch.object(geocode_cache.time, "time", return_value=1_000_000):
+            cache.set("barcelona", BARCELONA)
+        with mock.patch.object(geocode_cache.time, "time", return_value=1_000_000 + 59):
+            assert cache.get("barcelona") == BARCELONA
+        with mock.patch.object(geocode_cache.time, "time", return_value=1_000_000 + 61):
+            assert cache.get("barcelona") is None
+        cache.close()
+    print("✅ Entries expire after the TTL")
+
+
+def test_unwritable_path_degrades_to_no_op():
+    """An unopenable database (e.g. read-only filesystem) disables the cache instead of raising"""
+    with tempfile.TemporaryDirectory() as tmp:
+        # The parent directory doesn't exist, so SQLite can't create the file
+        path = os.path.join(tmp, "missing", "geocode.db")
+        with mock.patch.dict(os.environ, {"GEOCODE_CACHE_PATH": path}):
+            cache = GeocodeCache()
+        assert cache.path == path
+        assert cache._conn is None
+        cache.set("barcelona", BARCELONA)
+        assert cache.get("barcelona") is None
+        cache.close()
+        assert not os.path.exists(path)
+    print("✅ Unwritable cache path degrades to a no-op")
+
+
+def test_close_is_idempotent():
+    """close() can be called more than once and later lookups are misses"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GeocodeCache(path=os.path.join(tmp, "geocode.db"))
+        cache.set("barcelona", BARCELONA)
+        cache.close()
+        cache.close()
+        assert cache.get("barcelona") is None
+    print("✅ close() is idempotent")
+
+
+def test_get_and_set_after_close_are_no_ops():
+    """get()/set() after close(), or racing it from other threads, never raise"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GeocodeCache(path=os.path.join(tmp, "geocode.db"))
+        cache.set("barcelona", BARCELONA)
+        cache.close()
+        cache.set("paris", (48.8566, 2.3522))
+        assert cache.get("paris") is None
+        assert cache.get("barcelona") is None
+
+        cache = GeocodeCache(path=os.path.join(tmp, "geocode.db"))
+        errors = []
+        stop = threading.Event()
+
+        def hammer():
+            try:
+                while not stop.is_set():
+                    cache.set("barcelona", BARCELONA)
+                    cache.get("barcelona")
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=hammer) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        cache.close()
+        stop.set()
+        for worker in workers:
+            worker.join(5)
+        assert not errors, errors
+    print("✅ get()/set() after close() are no-ops")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing GeocodeCache")
+    print("=" * 50)
+    test_round_trip_and_persistence()
+    test_entries_expire_after_ttl()
+    test_unwritable_path_degrades_to_no_op()
+    test_close_is_idempotent()
+    test_get_and_set_after_close_are_no_ops()
+    print("\n🎉 GeocodeCache tests completed!")
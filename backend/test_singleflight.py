@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test script for SingleFlight duplicate call suppression
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(__file__))
+
+from services.singleflight import SingleFlight
+
+# Callers started while the leader is still inside fn()
+JOINERS = 8
+
+
+def test_concurrent_callers_share_one_call():
+    """Concurrent callers with one key run fn() once; joiners get shared=True"""
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fn():
+        calls.append(threading.get_ident())
+        release.wait(5)
+        return {"value": 42}
+
+    with ThreadPoolExecutor(max_workers=JOINERS) as pool:
+        futures = [pool.submit(flight.do, "k", fn) for _ in range(JOINERS)]
+        # Let every caller reach the in-flight call before the leader finishes
+        deadline = time.time() + 5
+        while not calls and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1, f"fn() ran {len(calls)} times"
+    assert all(result == {"value": 42} for result, _ in results)
+    shared_flags = [shared for _, shared in results]
+    assert shared_flags.count(False) == 1, "exactly one caller should be the leader"
+    assert shared_flags.count(True) == JOINERS - 1
+    print("✅ Concurrent callers share a single fn() call")
+
+
+def test_leader_exception_reaches_joiners():
+    """An exception raised by the leader is re-raised in every joiner"""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream failed")
+
+    with ThreadPoolExecutor(max_workers=JOINERS) as pool:
+        leader = pool.submit(flight.do, "k", fn)
+        started.wait(5)
+        joiners = [pool.submit(flight.do, "k", fn) for _ in range(JOINERS - 1)]
+        time.sleep(0.2)
+        release.set()
+        errors = [f.exception(5) for f in [leader, *joiners]]
+
+    assert all(isinstance(e, ValueError) and str(e) == "upstream failed" for e in errors), errors
+    print("✅ Leader exception propagates to joiners")
+
+
+def test_key_removed_after_completion():
+    """Finished calls (successful or failed) leave no in-flight entry behind"""
+    flight = SingleFlight()
+    assert flight.do("ok", lambda: 1) == (1, False)
+    assert "ok" not in flight._calls
+
+    try:
+        flight.do("fail", lambda: 1 / 0)
+    except ZeroDivisionError:
+        pass
+    else:
+        raise AssertionError("expected ZeroDivisionError")
+    assert "fail" not in flight._calls
+
+    # A later call for the same key runs fn() again instead of reusing the old result
+    assert flight.do("ok", lambda: 2) == (2, False)
+    print("✅ In-flight keys are removed after completion")
+
+
+def _run_search_activities(fake_search, on_result=None):
+    """
+    Call AmadeusService.search_activities from JOINERS threads at once against fake_search
+    on_result(result) runs in each caller's thread right after its call returns
+    """
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ, {
+        "AMADEUS_API_KEY": "test",
+        "AMADEUS_API_SECRET": "test",
+        "GEOCODE_CACHE_PATH": os.path.join(tmp, "geocode.db"),
+    }):
+        from services.amadeus_service import AmadeusService
+
+        service = AmadeusService()
+        service._search_activities = fake_search
+
+        def call():
+            result = service.search_activities(41.39, 2.17)
+            if on_result:
+                on_result(result)
+            return result
+
+        try:
+            with ThreadPoolExecutor(max_workers=JOINERS) as pool:
+                futures = [pool.submit(call) for _ in range(JOINERS)]
+                return [f.result() for f in futures]
+        finally:
+            service.close()
+
+
+def _blocking_search(calls, release, activity_count=1):
+    """Fake _search_activities that records the call and waits until released"""
+    def fake_search(latitude, longitude, radius, include_multi_day):
+        calls.append((latitude, longitude))
+        release.wait(5)
+        return {
+            "activities": [{"name": f"Tour {i}", "price": {"amount": "10"}} for i in range(activity_count)],
+            "count": activity_count
+        }
+    return fake_search
+
+
+def _release_after_first_call(calls, release):
+    """Release the fake search once the leader is inside it and the joiners have queued up"""
+    def run():
+        deadline = time.time() + 5
+        while not calls and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        release.set()
+    threading.Thread(target=run, daemon=True).start()
+
+
+def test_search_activities_joiners_get_independent_copy():
+    """Every caller of AmadeusService.search_activities gets its own copy of the payload"""
+    calls = []
+    release = threading.Event()
+    _release_after_first_call(calls, release)
+    results = _run_search_activities(_blocking_search(calls, release))
+
+    assert len(calls) == 1, f"upstream searched {len(calls)} times"
+    assert all(result == results[0] for result in results)
+    # Mutating one caller's payload must not leak into another's
+    results[0]["activities"][0]["name"] = "changed"
+    assert sum(result["activities"][0]["name"] == "changed" for result in results) == 1
+    assert len({id(result) for result in results}) == JOINERS
+    print("✅ search_activities callers get independent copies")
+
+
+def test_search_activities_mutation_while_joiners_copy():
+    """Callers annotating their result in place (as the chat handlers do) never disturb the others' copies"""
+    calls = []
+    release = threading.Event()
+    _release_after_first_call(calls, release)
+    activity_count = 2000
+
+    def annotate(result):
+        # Mirror _handle_activity_search / apply_preference_filters_to_activities: add keys,
+        # annotate each activity and replace the list, while other callers may still be copying
+        result["_header_title"] = threading.get_ident()
+        for activity in result["activities"]:
+            activity["_score"] = threading.get_ident()
+        result["activities"] = result["activities"][:10]
+
+    results = _run_search_activities(_blocking_search(calls, release, activity_count), on_result=annotate)
+
+    assert len(calls) == 1, f"upstream searched {len(calls)} times"
+    owners = {result["_header_title"] for result in results}
+    assert len(owners) == JOINERS, "each caller should only see its own annotations"
+    for result in results:
+        assert len(result["activities"]) == 10
+        assert all(activity["_score"] == result["_header_title"] for activity in result["activities"])
+        assert result["count"] == activity_count
+    print("✅ In-place annotation by one caller doesn't affect the others")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing SingleFlight")
+    print("=" * 50)
+    test_concurrent_callers_share_one_call()
+    test_leader_exception_reaches_joiners()
+    test_key_removed_after_completion()
+    test_search_activities_joiners_get_independent_copy()
+    test_search_activities_mutation_while_joiners_copy()
+    print("\n🎉 SingleFlight tests completed!")